@@ -1,12 +1,20 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 from datetime import datetime
+from utils.client_pool import get_openai_client, default_base_url
+from utils.generation import complete_cached, new_stats
+from utils.health import check_credentials
+from utils.metrics import start_metrics_server
+from utils.profiling import start_rerun, profile_phase, profile_section, finish_rerun
+from utils.token_budget import plan_tokens
 
 # Load environment variables
 load_dotenv()
 
+# Opt-in rerun timing (PROFILE_RERUNS=1); each profile_phase() below starts a new span
+start_rerun("app.py", phase="page_config")
+
 # Configure page with custom theme
 st.set_page_config(
     page_title="AI Curriculum Designer",
@@ -15,6 +23,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+profile_phase("css")
+
 # ULTRA-PREMIUM CSS DESIGN SYSTEM (keeping your existing CSS - it's the same)
 st.markdown("""
 <style>
@@ -639,6 +649,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+profile_phase("session_state")
+
 # Initialize session state
 if 'api_key' not in st.session_state:
     st.session_state.api_key = os.getenv("OPENAI_API_KEY", "")
@@ -648,41 +660,61 @@ if 'generated_content' not in st.session_state:
     st.session_state.generated_content = {}
 if 'theme' not in st.session_state:
     st.session_state.theme = 'light'
+# Page of origin recorded with each LLM call in the telemetry store
+st.session_state.page = 'home'
+# Prometheus /metrics listener on METRICS_PORT; a no-op after the first run
+start_metrics_server()
 
 def initialize_openai():
     """Initialize OpenAI client"""
     try:
         if st.session_state.api_key:
-            st.session_state.client = OpenAI(api_key=st.session_state.api_key)
-            # Test the connection with a simple completion
-            test_response = st.session_state.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=5
-            )
+            # Validation is cached per key and shared across sessions, so this
+            # only reaches the API for the first session (or after the TTL)
+            ok, message = check_credentials(st.session_state.api_key, default_base_url())
+            if not ok:
+                st.error(f"Error initializing OpenAI: {message}")
+                return False
+            # Reuse the process-wide pooled client for this key instead of a per-session one
+            st.session_state.client = get_openai_client(st.session_state.api_key, default_base_url())
             return True
     except Exception as e:
         st.error(f"Error initializing OpenAI: {str(e)}")
         return False
     return False
 
-def generate_openai_response(prompt, model="gpt-3.5-turbo", temperature=0.7):
-    """Generate response using OpenAI"""
+APP_SYSTEM_MESSAGE = "You are an expert curriculum designer and educator. Create detailed, professional educational content."
+APP_MAX_TOKENS = 2000
+
+def generate_openai_response(prompt, model="gpt-3.5-turbo", temperature=0.7, kind=None, spec=None):
+    """Generate response using OpenAI, served from the response cache when possible
+
+    With an artifact kind and spec, max_tokens is sized to the expected output
+    and a warning is shown if it cannot fit.
+    """
     try:
-        response = st.session_state.client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert curriculum designer and educator. Create detailed, professional educational content."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,
-            max_tokens=2000
-        )
-        return response.choices[0].message.content
+        max_tokens = APP_MAX_TOKENS
+        if kind:
+            budget = plan_tokens(kind, spec, prompt, model=model, system_message=APP_SYSTEM_MESSAGE)
+            if budget['warning']:
+                st.warning(f"⚠️ {budget['warning']}")
+            max_tokens = budget['max_tokens']
+        # Example courses clicked in several sessions at once share one upstream call
+        stats = new_stats(model)
+        with profile_section("generate", kind=kind):
+            content, cache_status = complete_cached(st.session_state.client, prompt, model=model,
+                                                    temperature=temperature, max_tokens=max_tokens, max_retries=1,
+                                                    system_message=APP_SYSTEM_MESSAGE, stats=stats,
+                                                    labels={'page': 'home', 'kind': kind})
+        st.session_state.last_generation = {'model': model, 'temperature': temperature, 'cache': cache_status,
+                                            **(stats if cache_status == 'miss' else {})}
+        return content
     except Exception as e:
         st.error(f"Error generating response: {str(e)}")
         return None
 
+profile_phase("sidebar")
+
 # Sidebar with enhanced styling
 with st.sidebar:
     st.markdown("""
@@ -769,6 +801,8 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
 
+profile_phase("home")
+
 # Main header
 st.markdown("""
 <div class="main-header">
@@ -899,6 +933,8 @@ else:
                 if st.button(f"👁️ View", key=f"view_{idx}"):
                     st.session_state[f"view_{key}"] = value['content']
 
+profile_phase("footer")
+
 # Footer
 st.markdown("""
 <div class="footer">
@@ -907,6 +943,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+profile_phase("page_body")
+
 # Conditional content based on navigation
 if page == "📝 Course Outline":
     st.markdown("""
@@ -937,10 +975,11 @@ if page == "📝 Course Outline":
                 if all([title, subject, audience]):
                     with st.spinner("Creating outline..."):
                         prompt = f"Create a detailed {level} level course outline for {title} in {subject} for {audience} over {duration} weeks. Additional requirements: {additional}"
-                        response = generate_openai_response(prompt, model=model, temperature=temperature)
+                        response = generate_openai_response(prompt, model=model, temperature=temperature, kind='course',
+                                                            spec={'duration': duration, 'duration_unit': 'weeks'})
                         
                         if response:
-                            st.success("✅ Outline generated!")
+                            st.success(f"✅ Outline generated! (cache: {st.session_state.last_generation['cache']})")
                             # Save to session state
                             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
                             st.session_state.generated_content[f"Outline: {title}"] = {
@@ -984,10 +1023,11 @@ elif page == "📅 Lesson Planner":
                 if all([lesson_title, course, objectives]):
                     with st.spinner("Creating lesson plan..."):
                         prompt = f"Create a detailed {duration} minute lesson plan for {lesson_title} in {course}. Learning objectives: {objectives}. Materials: {materials}"
-                        response = generate_openai_response(prompt, model=model, temperature=temperature)
+                        response = generate_openai_response(prompt, model=model, temperature=temperature, kind='lesson',
+                                                            spec={'duration': duration})
                         
                         if response:
-                            st.success("✅ Lesson plan generated!")
+                            st.success(f"✅ Lesson plan generated! (cache: {st.session_state.last_generation['cache']})")
                             # Save to session state
                             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
                             st.session_state.generated_content[f"Lesson: {lesson_title}"] = {
@@ -1032,10 +1072,11 @@ elif page == "📊 Assessment":
                 if all([topic, grade, objectives]):
                     with st.spinner("Creating assessment..."):
                         prompt = f"Create a {difficulty} level {assessment_type} for {topic} for {grade} with {num_questions} questions. Learning objectives: {objectives}. Include a mix of question types and an answer key."
-                        response = generate_openai_response(prompt, model=model, temperature=temperature)
+                        response = generate_openai_response(prompt, model=model, temperature=temperature, kind='assessment',
+                                                            spec={'num_questions': num_questions})
                         
                         if response:
-                            st.success("✅ Assessment generated!")
+                            st.success(f"✅ Assessment generated! (cache: {st.session_state.last_generation['cache']})")
                             # Save to session state
                             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
                             st.session_state.generated_content[f"Assessment: {topic}"] = {
@@ -1049,4 +1090,6 @@ elif page == "📊 Assessment":
                                 <h2 style="color: #667eea;">{topic} {assessment_type}</h2>
                                 {response}
                             </div>
-                            """, unsafe_allow_html=True)
\ No newline at end of file
+                            """, unsafe_allow_html=True)
+
+finish_rerun()
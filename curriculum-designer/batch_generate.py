@@ -0,0 +1,214 @@
+"""Headless batch generation of course outlines, lesson plans and assessments.
+
+Reads a JSONL or CSV file of specs and generates them concurrently:
+
+    python batch_generate.py specs.jsonl --out build/ --workers 8
+
+Each spec has a `kind` ("course", "lesson" or "assessment"), an optional
+`style` (a key of the matching *_PROMPTS dictionary), an optional `id`, and
+the fields that format_course_outline / format_lesson_plan /
+format_assessment already accept. In CSV files, list-valued fields such as
+`engagement_features` are separated with ";".
+
+One Markdown file is written per spec, plus a manifest.json recording
+per-item status, latency and token usage.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from dotenv import load_dotenv
+from utils.client_pool import get_openai_client, default_base_url
+from utils.generation import GenerationError, new_stats, complete_cached
+from utils.health import check_credentials
+from utils.prompts import build_full_prompt, COURSE_OUTLINE_PROMPTS, LESSON_PLAN_PROMPTS, ASSESSMENT_PROMPTS
+from utils.token_budget import plan_tokens
+
+DEFAULT_STYLES = {
+    'course': 'intermediate',
+    'lesson': 'interactive',
+    'assessment': 'summative',
+}
+STYLE_PROMPTS = {
+    'course': COURSE_OUTLINE_PROMPTS,
+    'lesson': LESSON_PLAN_PROMPTS,
+    'assessment': ASSESSMENT_PROMPTS,
+}
+REQUIRED_FIELDS = {
+    'course': ['title', 'subject', 'audience', 'duration', 'duration_unit', 'level'],
+    'lesson': ['title', 'course', 'duration', 'class_size', 'objectives'],
+    'assessment': ['type', 'topic', 'grade_level', 'num_questions', 'difficulty', 'objectives'],
+}
+LIST_FIELDS = ('engagement_features',)
+
+
+def load_specs(path):
+    """Load specs from a .jsonl or .csv file"""
+    specs = []
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                spec = {key: value for key, value in row.items() if value not in (None, '')}
+                for field in LIST_FIELDS:
+                    if field in spec:
+                        spec[field] = [item.strip() for item in spec[field].split(';') if item.strip()]
+                specs.append(spec)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    specs.append(json.loads(line))
+    return specs
+
+
+def validate_spec(spec):
+    """Return an error message for an unusable spec, or None"""
+    kind = spec.get('kind')
+    if kind not in REQUIRED_FIELDS:
+        return f"unknown kind {kind!r} (expected course, lesson or assessment)"
+    missing = [field for field in REQUIRED_FIELDS[kind] if field not in spec]
+    if missing:
+        return f"missing required fields: {', '.join(missing)}"
+    style = spec.get('style', DEFAULT_STYLES[kind])
+    if style not in STYLE_PROMPTS[kind]:
+        return f"unknown {kind} style {style!r}"
+    return None
+
+
+def spec_title(spec):
+    """Human-readable title for the output document"""
+    if spec['kind'] == 'assessment':
+        return f"{spec['topic']} - {spec['type']}"
+    return spec['title']
+
+
+def output_filename(index, spec):
+    slug = re.sub(r'[^a-z0-9]+', '_', str(spec.get('id') or spec_title(spec)).lower()).strip('_')
+    return f"{index:03d}_{spec['kind']}_{slug or 'item'}.md"
+
+
+def generate_one(client, index, spec, args):
+    """Generate a single spec and write its Markdown; returns a manifest entry"""
+    entry = {
+        'index': index,
+        'id': spec.get('id'),
+        'kind': spec.get('kind'),
+        'status': 'error',
+    }
+    error = validate_spec(spec)
+    if error:
+        entry['error'] = error
+        return entry
+
+    model = spec.get('model', args.model)
+    temperature = float(spec.get('temperature', args.temperature))
+    prompt = build_full_prompt(spec['kind'], spec, spec.get('style', DEFAULT_STYLES[spec['kind']]))
+    budget = plan_tokens(spec['kind'], spec, prompt, model=model)
+    if budget['warning']:
+        entry['warning'] = budget['warning']
+    stats = new_stats(model)
+    started = time.time()
+    try:
+        content, cache_status = complete_cached(client, prompt, model=model, temperature=temperature,
+                                                max_retries=args.max_retries, use_cache=not args.no_cache,
+                                                stats=stats, max_tokens=budget['max_tokens'],
+                                                labels={'page': 'batch_generate', 'kind': spec['kind']})
+    except GenerationError as e:
+        entry['error'] = str(e)
+        entry['latency_ms'] = round((time.time() - started) * 1000, 1)
+        return entry
+
+    if not content:
+        entry['error'] = "empty response"
+        return entry
+
+    path = os.path.join(args.out, output_filename(index, spec))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"# {spec_title(spec)}\n\n{content}\n\n---\n*Generated with OpenAI {model} on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n")
+
+    entry.update({
+        'status': 'ok',
+        'output': os.path.basename(path),
+        'model': model,
+        'cache': cache_status,
+        'max_tokens': budget['max_tokens'],
+        'latency_ms': round((time.time() - started) * 1000, 1),
+        'prompt_tokens': stats['prompt_tokens'],
+        'completion_tokens': stats['completion_tokens'],
+        'retries': stats['retries'],
+        'finish_reason': stats['finish_reason'],
+        'continuations': stats['continuations'],
+    })
+    return entry
+
+
+def run_batch(specs, args):
+    """Generate every spec on a worker pool and return the manifest"""
+    api_key = args.api_key or os.getenv("OPENAI_API_KEY", "")
+    ok, message = check_credentials(api_key, default_base_url())
+    if not ok:
+        raise SystemExit(f"Cannot start batch: {message}")
+    client = get_openai_client(api_key, default_base_url())
+
+    os.makedirs(args.out, exist_ok=True)
+    started = time.time()
+    entries = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(generate_one, client, index, spec, args): index
+                   for index, spec in enumerate(specs, 1)}
+        for future in as_completed(futures):
+            entry = future.result()
+            entries.append(entry)
+            print(f"[{len(entries)}/{len(specs)}] {entry['kind']} #{entry['index']}: {entry['status']}"
+                  + (f" ({entry['error']})" if entry.get('error') else f" in {entry['latency_ms']:.0f} ms"),
+                  file=sys.stderr)
+            if entry.get('warning'):
+                print(f"    warning: {entry['warning']}", file=sys.stderr)
+
+    entries.sort(key=lambda entry: entry['index'])
+    succeeded = [entry for entry in entries if entry['status'] == 'ok']
+    return {
+        'started': datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S'),
+        'wall_time_ms': round((time.time() - started) * 1000, 1),
+        'workers': args.workers,
+        'total': len(entries),
+        'succeeded': len(succeeded),
+        'failed': len(entries) - len(succeeded),
+        'prompt_tokens': sum(entry.get('prompt_tokens') or 0 for entry in succeeded),
+        'completion_tokens': sum(entry.get('completion_tokens') or 0 for entry in succeeded),
+        'items': entries,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate curriculum artifacts in bulk from a JSONL/CSV spec file")
+    parser.add_argument("specs", help="Path to a .jsonl or .csv file of specs")
+    parser.add_argument("--out", default="batch_output", help="Directory for Markdown outputs and manifest.json")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent generations")
+    parser.add_argument("--model", default="gpt-3.5-turbo", help="Default model (specs may override)")
+    parser.add_argument("--temperature", type=float, default=0.7, help="Default temperature (specs may override)")
+    parser.add_argument("--max-retries", type=int, default=3, help="Attempts per spec")
+    parser.add_argument("--api-key", default=None, help="OpenAI API key (defaults to OPENAI_API_KEY)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    specs = load_specs(args.specs)
+    manifest = run_batch(specs, args)
+    with open(os.path.join(args.out, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Generated {manifest['succeeded']}/{manifest['total']} items in {manifest['wall_time_ms'] / 1000:.1f} s "
+          f"with {args.workers} workers -> {args.out}", file=sys.stderr)
+    return 0 if manifest['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Measure how much of each prompt is a prefix shared with the previous request.
+
+Run from the curriculum-designer directory:
+
+    python -m benchmarks.prompt_cache_bench --requests 8
+    python -m benchmarks.prompt_cache_bench --requests 8 --base-url http://localhost:8000/v1 --model local-model
+
+Synthetic course, lesson and assessment specs are turned into prompts in two
+layouts: the current one (static instructions and style block first, request
+fields last) and the old fields-first one. Offline, the script reports the
+prompt tokens each layout shares with the previous request of the same kind,
+which is the most a provider-side prefix cache can reuse. With --base-url it
+also sends the current-layout prompts to an OpenAI-compatible server (a local
+stand-in or the real API) and reports the cached_tokens and latency each call
+returned. OpenAI only caches prompts of 1024 tokens or more.
+"""
+import argparse
+import os
+import random
+import time
+from utils.client_pool import get_openai_client
+from utils.generation import SYSTEM_MESSAGE, complete, new_stats
+from utils.prompts import (
+    format_course_outline, format_lesson_plan, format_assessment, assemble_prompt,
+    COURSE_OUTLINE_PROMPTS, LESSON_PLAN_PROMPTS, ASSESSMENT_PROMPTS,
+    COURSE_OUTLINE_INSTRUCTIONS, LESSON_PLAN_INSTRUCTIONS, ASSESSMENT_INSTRUCTIONS
+)
+from utils.token_budget import count_tokens
+
+KINDS = {
+    'course': (COURSE_OUTLINE_INSTRUCTIONS, COURSE_OUTLINE_PROMPTS['beginner'], format_course_outline),
+    'lesson': (LESSON_PLAN_INSTRUCTIONS, LESSON_PLAN_PROMPTS['interactive'], format_lesson_plan),
+    'assessment': (ASSESSMENT_INSTRUCTIONS, ASSESSMENT_PROMPTS['formative'], format_assessment),
+}
+TOPICS = ("Algebra", "Photosynthesis", "World War I", "Python Programming", "Poetry", "Statistics",
+          "Climate Science", "Microeconomics", "Spanish Verbs", "Cell Biology")
+
+
+def synthetic_spec(kind, rng):
+    """A spec with the fields the format_* builder for kind reads"""
+    topic = rng.choice(TOPICS)
+    if kind == 'course':
+        return {'title': f"Introduction to {topic}", 'subject': topic, 'audience': "High school students",
+                'duration': rng.randint(4, 12), 'duration_unit': 'weeks', 'level': "Beginner"}
+    if kind == 'lesson':
+        return {'title': f"{topic} basics", 'course': topic, 'duration': rng.choice((45, 60, 90)),
+                'class_size': rng.randint(15, 35), 'objectives': f"Students can explain the key ideas of {topic}"}
+    return {'type': "Quiz", 'topic': topic, 'grade_level': str(rng.randint(6, 12)),
+            'num_questions': rng.randint(5, 20), 'difficulty': "Medium", 'time_limit': 45,
+            'objectives': f"Understand {topic}"}
+
+
+def legacy_layout(instructions, style_prompt, specifications):
+    """The old fields-first order, for comparison"""
+    return f"{specifications}\n\n{instructions}\n\n{style_prompt}"
+
+
+def shared_prefix_tokens(previous, prompt):
+    """Tokens at the start of prompt that repeat the previous prompt exactly"""
+    if previous is None:
+        return 0
+    return count_tokens(SYSTEM_MESSAGE + os.path.commonprefix([previous, prompt]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare prompt layouts for provider-side prefix caching")
+    parser.add_argument("--requests", type=int, default=8, help="Requests per artifact kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible server to send the prompts to")
+    parser.add_argument("--api-key", default=None, help="API key (defaults to OPENAI_API_KEY)")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--max-tokens", type=int, default=16, help="Output budget per call; kept small on purpose")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    client = None
+    if args.base_url:
+        client = get_openai_client(args.api_key or os.getenv("OPENAI_API_KEY", "sk-local"), args.base_url)
+
+    print(f"{'kind':>10} {'prompt tok':>10} {'legacy shared':>13} {'prefix shared':>13} "
+          f"{'cached tok':>10} {'latency ms':>10}")
+    for kind, (instructions, style_prompt, build) in KINDS.items():
+        previous_legacy = previous = None
+        totals = {'prompt': 0, 'legacy': 0, 'shared': 0, 'cached': 0, 'latency': 0.0, 'calls': 0}
+        for _ in range(args.requests):
+            specifications = build(synthetic_spec(kind, rng))
+            prompt = assemble_prompt(instructions, style_prompt, specifications)
+            legacy = legacy_layout(instructions, style_prompt, specifications)
+            totals['prompt'] += count_tokens(SYSTEM_MESSAGE + prompt)
+            totals['legacy'] += shared_prefix_tokens(previous_legacy, legacy)
+            totals['shared'] += shared_prefix_tokens(previous, prompt)
+            previous_legacy, previous = legacy, prompt
+            if client is not None:
+                stats = new_stats(args.model)
+                started = time.perf_counter()
+                complete(client, prompt, model=args.model, temperature=0, max_tokens=args.max_tokens,
+                         stats=stats, max_continuations=0)
+                totals['latency'] += (time.perf_counter() - started) * 1000
+                totals['cached'] += stats['cached_tokens'] or 0
+                totals['calls'] += 1
+        cached = f"{totals['cached'] / totals['calls']:>10.0f}" if totals['calls'] else f"{'-':>10}"
+        latency = f"{totals['latency'] / totals['calls']:>10.0f}" if totals['calls'] else f"{'-':>10}"
+        print(f"{kind:>10} {totals['prompt'] / args.requests:>10.0f} {totals['legacy'] / args.requests:>13.0f} "
+              f"{totals['shared'] / args.requests:>13.0f} {cached} {latency}")
+
+
+if __name__ == "__main__":
+    main()
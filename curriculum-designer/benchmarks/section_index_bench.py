@@ -0,0 +1,100 @@
+"""Benchmark the single-pass section indexer against the per-page regex scans it replaced.
+
+Run from the curriculum-designer directory:
+
+    python -m benchmarks.section_index_bench --sizes 12.5 25 50 100 --repeat 5
+
+Synthetic course outlines and lesson plans are generated at each size (in KB).
+For each one the script times the legacy regexes (the DOTALL module pattern,
+the timeline pattern and the five activity patterns), a cold index build, and
+a memoized lookup. Linear scaling shows up as a flat µs/KB column.
+"""
+import argparse
+import random
+import re
+import time
+from utils.section_index import _build_index, index_sections
+
+LEGACY_MODULE_PATTERN = r'(?:Module|Week)\s+(\d+)[:\s]+([^\n]+)(.*?)(?=(?:Module|Week)\s+\d+|$)'
+LEGACY_TIMELINE_PATTERN = r'(\d+)[-–]\s*(\d+)?\s*minutes?[:\s]+([^\n]+)'
+LEGACY_ACTIVITY_PATTERNS = [
+    r'(?:Opening|Hook|Warm-up)[:\s]+([^\n]+)',
+    r'(?:Direct Instruction|Lecture)[:\s]+([^\n]+)',
+    r'(?:Guided Practice)[:\s]+([^\n]+)',
+    r'(?:Independent Practice)[:\s]+([^\n]+)',
+    r'(?:Closing|Exit Ticket)[:\s]+([^\n]+)'
+]
+WORDS = ("students explore variables loops functions recursion data structures practice review "
+         "discussion project feedback examples analysis design testing debugging").split()
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_response(size_kb, seed=0):
+    """Outline-plus-lesson-plan Markdown of roughly size_kb kilobytes"""
+    rng = random.Random(seed)
+    target = int(size_kb * 1024)
+    parts = ["## Course Description", _sentence(rng, 40), "## Course Outline"]
+    length = sum(len(part) for part in parts)
+    number = 0
+    while length < target:
+        number += 1
+        block = "\n".join([
+            f"### Module {number}: {_sentence(rng, 4)}",
+            "#### Key topics",
+            *(f"- {_sentence(rng)}" for _ in range(4)),
+            f"0-10 minutes: Hook {_sentence(rng, 6)}",
+            f"10-30 minutes: Direct Instruction: {_sentence(rng, 8)}",
+            f"- Guided Practice: {_sentence(rng)}",
+            f"- Independent Practice: {_sentence(rng)}",
+            f"- Exit Ticket: {_sentence(rng, 6)}",
+            f"**Estimated time:** {rng.randint(2, 6)} hours",
+            "",
+        ])
+        parts.append(block)
+        length += len(block) + 1
+    parts.append("## Assessment Methods\n- Weekly quizzes")
+    return "\n".join(parts)
+
+
+def legacy_scan(text):
+    """What the outline and lesson planner pages ran on every rerun"""
+    modules = re.findall(r'(?:Module|Week)\s+\d+[:\s]+([^\n]+)', text)
+    detailed = re.findall(LEGACY_MODULE_PATTERN, text, re.DOTALL)
+    timeline = re.findall(LEGACY_TIMELINE_PATTERN, text, re.IGNORECASE)
+    activities = [match for pattern in LEGACY_ACTIVITY_PATTERNS
+                  for match in re.findall(pattern, text, re.IGNORECASE)]
+    return len(modules) + len(detailed) + len(timeline) + len(activities)
+
+
+def best_of(func, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the section indexer on synthetic responses")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[12.5, 25, 50, 100], help="Response sizes in KB")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args(argv)
+
+    print(f"{'size KB':>8} {'modules':>8} {'legacy ms':>10} {'index ms':>9} {'index µs/KB':>12} {'memo µs':>8}")
+    for size_kb in args.sizes:
+        text = synthetic_response(size_kb)
+        actual_kb = len(text) / 1024
+        legacy = best_of(legacy_scan, text, args.repeat)
+        cold = best_of(lambda t: _build_index(t, None), text, args.repeat)
+        index = index_sections(text)
+        memo = best_of(index_sections, text, args.repeat)
+        print(f"{actual_kb:>8.1f} {len(index.modules):>8} {legacy * 1000:>10.2f} {cold * 1000:>9.2f} "
+              f"{cold * 1e6 / actual_kb:>12.1f} {memo * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
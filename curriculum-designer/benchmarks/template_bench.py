@@ -0,0 +1,73 @@
+"""Report the input tokens the compiled prompt templates save over their source strings.
+
+Run from the curriculum-designer directory:
+
+    python -m benchmarks.template_bench
+    TOKEN_COUNTER=tiktoken python -m benchmarks.template_bench --by-template
+
+Every template registered in utils/prompts.py is counted twice: as written
+(the indented triple-quoted string) and as compiled (dedented, trailing
+spaces and repeated blank lines removed). The summary builds a full prompt
+for each artifact kind and style from synthetic specs and reports what each
+request saves; --by-template adds a row per template.
+"""
+import argparse
+import random
+from collections import defaultdict
+from benchmarks.prompt_cache_bench import synthetic_spec
+from utils.prompt_templates import get_template
+from utils.prompts import PROMPT_KINDS
+from utils.token_budget import count_tokens, template_token_counts, prefix_token_counts
+
+# Registry names of each kind's instructions, style prompts and specifications
+TEMPLATE_NAMES = {
+    'course': ('course_outline.instructions', 'course_outline.style', 'course_outline.spec'),
+    'lesson': ('lesson_plan.instructions', 'lesson_plan.style', 'lesson_plan.spec'),
+    'assessment': ('assessment.instructions', 'assessment.style', 'assessment.spec'),
+}
+
+
+def full_prompt(kind, style, spec, compiled):
+    """Instructions, style block and specifications, from the compiled texts or the sources"""
+    instructions, style_prefix, specification = TEMPLATE_NAMES[kind]
+    values = defaultdict(lambda: "None specified", spec)
+    parts = [get_template(instructions), get_template(f"{style_prefix}.{style}"), get_template(specification)]
+    texts = [template.text if compiled else template.source for template in parts]
+    texts[2] = texts[2].format_map(values)
+    return "\n\n".join(texts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Input tokens saved by compiling the prompt templates")
+    parser.add_argument("--requests", type=int, default=20, help="Synthetic requests per kind and style")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--by-template", action="store_true", help="Also report every registered template")
+    args = parser.parse_args(argv)
+
+    if args.by_template:
+        print(f"{'template':<38} {'source tok':>10} {'compiled tok':>12} {'saved':>6}")
+        for name, counts in template_token_counts().items():
+            saved = 1 - counts['tokens'] / counts['source_tokens'] if counts['source_tokens'] else 0
+            print(f"{name:<38} {counts['source_tokens']:>10} {counts['tokens']:>12} {saved:>6.1%}")
+        print()
+
+    rng = random.Random(args.seed)
+    prefixes = prefix_token_counts()
+    print(f"{'kind':<11} {'style':<14} {'prefix tok':>10} {'source tok/req':>14} {'compiled tok/req':>16} {'saved':>6}")
+    total_source = total_compiled = 0
+    for kind, (_, style_prompts) in PROMPT_KINDS.items():
+        for style in style_prompts:
+            source = compiled = 0
+            for _ in range(args.requests):
+                spec = synthetic_spec(kind, rng)
+                source += count_tokens(full_prompt(kind, style, spec, compiled=False))
+                compiled += count_tokens(full_prompt(kind, style, spec, compiled=True))
+            total_source += source
+            total_compiled += compiled
+            print(f"{kind:<11} {style:<14} {prefixes[(kind, style)]:>10} {source / args.requests:>14.0f} "
+                  f"{compiled / args.requests:>16.0f} {1 - compiled / source:>6.1%}")
+    print(f"{'all':<26} {'':>10} {total_source:>14} {total_compiled:>16} {1 - total_compiled / total_source:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
 import streamlit as st
-from utils.openai_helper import generate_content, format_course_outline
-from utils.prompts import COURSE_OUTLINE_PROMPTS
+import re
+from utils.openai_helper import generate_content, telemetry_labels, plan_max_tokens, start_job, start_generation_job, pending_job, follow_job, follow_generation_job, save_artifact, get_artifact, show_background_jobs, cache_status_label, generation_timing_label, cache_stats_summary, MODULE_MAX_TOKENS
+from utils.prompts import COURSE_OUTLINE_PROMPTS, build_full_prompt, format_module_regeneration
+from utils.stream_renderer import StreamRenderer
+from utils.pipeline import CoursePipeline, course_pack_work
+from utils.long_course import LONG_COURSE_THRESHOLD, long_course_work
+from utils.token_budget import module_count, plan_tokens
+from utils.course_model import (
+    JSON_RESPONSE_FORMAT, OutlineFormatError, load_course_outline, parse_module_json, parse_modules, splice_module
+)
+from utils.metrics import start_metrics_server
+from utils.profiling import start_rerun, profile_phase, profile_section, finish_rerun
 
 st.set_page_config(page_title="Course Outline Generator", page_icon="📝")
+st.session_state.page = 'course_outline'
+start_metrics_server()
+start_rerun("pages/1_course_outline.py", phase="css")
 
 # Custom CSS for this page
 st.markdown("""
@@ -72,6 +85,177 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+def queue_course_pack(modules):
+    """Button callback: request course pack generation for modules (None = all)"""
+    st.session_state.course_pack_request = modules
+
+def start_module_edit(module_number):
+    """Button callback: open the regeneration form for one module"""
+    st.session_state.editing_module = module_number
+
+def update_course_pack(course_data, outline):
+    """Point the course pack at a new outline, keeping finished work for unchanged modules"""
+    existing_pack = st.session_state.get('course_pack')
+    new_pack = CoursePipeline(course_data, outline)
+    if existing_pack and existing_pack.pipeline_id == new_pack.pipeline_id:
+        return
+    if existing_pack and existing_pack.course_data == course_data:
+        new_pack.carry_over(existing_pack)
+    st.session_state.course_pack = new_pack
+
+def retry_course_pack():
+    """Button callback: re-run the failed and blocked course pack nodes"""
+    course_pack = st.session_state.course_pack
+    failed_modules = sorted({node['module'] for node in course_pack.nodes.values()
+                             if node['status'] in ('failed', 'blocked')})
+    course_pack.retry_failed()
+    st.session_state.course_pack_request = failed_modules
+
+@st.fragment
+def module_details(saved_outline, course_model):
+    """Module expanders with per-module edit forms; their widgets only rerun this fragment"""
+    course_data = saved_outline['course_data']
+    outline = saved_outline['content']
+    st.markdown("### 📋 Detailed Module Breakdown")
+    
+    if course_model.modules:
+        editing_module = st.session_state.get('editing_module')
+        for module in course_model.modules:
+            module_num = module.number
+            with st.expander(f"Module {module_num}: {module.title}", expanded=editing_module == module_num):
+                st.markdown(module.content if module.content else "No detailed content available")
+                
+                if editing_module == module_num:
+                    # Regenerate just this module from the course header and its current text
+                    with st.form(f"edit_module_form_{module_num}"):
+                        instructions = st.text_area(
+                            "What should change?",
+                            placeholder="e.g., Add a hands-on lab, cover recursion in more depth, shorten to 3 hours",
+                            height=100
+                        )
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            regenerate = st.form_submit_button("🔄 Regenerate Module", type="primary", use_container_width=True)
+                        with col2:
+                            cancelled = st.form_submit_button("Cancel", use_container_width=True)
+                    
+                    if cancelled:
+                        st.session_state.pop('editing_module', None)
+                        st.rerun()
+                    if regenerate:
+                        structured = bool(saved_outline.get('structured'))
+                        module_prompt = format_module_regeneration(
+                            course_data, module.to_markdown(), module_num, instructions, structured=structured
+                        )
+                        new_module = generate_content(
+                            module_prompt,
+                            model=saved_outline['model'],
+                            temperature=saved_outline['temperature'],
+                            max_tokens=MODULE_MAX_TOKENS,
+                            response_format=JSON_RESPONSE_FORMAT if structured else None,
+                            kind='module'
+                        )
+                        new_outline = None
+                        if new_module and structured:
+                            try:
+                                new_model = course_model.replace_module(parse_module_json(new_module, module_num))
+                                new_outline = new_model.to_markdown()
+                                saved_outline['structured'] = new_model.to_json()
+                            except OutlineFormatError as e:
+                                st.error(f"❌ The regenerated module did not match the expected format: {e}")
+                        elif new_module:
+                            span = next((m for m in parse_modules(outline) if m['number'] == module_num), None)
+                            if span is None:
+                                st.error(f"❌ Module {module_num} is no longer in the outline, so the regenerated "
+                                         f"module could not be placed. Please open the module again.")
+                                st.session_state.pop('editing_module', None)
+                                return
+                            new_outline = splice_module(outline, span, new_module)
+                        if new_outline:
+                            saved_outline.update(content=new_outline, cache_status=cache_status_label())
+                            update_course_pack(course_data, new_outline)
+                            st.session_state.pop('editing_module', None)
+                            st.session_state.module_edit_notice = f"✅ Module {module_num} regenerated"
+                            st.rerun()
+                
+                # Add interactive elements
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.button(f"📝 Edit Module {module_num}", key=f"edit_{module_num}",
+                              help="Regenerate only this module",
+                              on_click=start_module_edit, args=(module_num,))
+                with col2:
+                    if st.button(f"📊 Add Assessment {module_num}", key=f"assess_{module_num}",
+                                 help="Generate this module's lesson plan and assessment",
+                                 on_click=queue_course_pack, args=([module_num],)):
+                        # The course pack renders outside this fragment
+                        st.rerun()
+    else:
+        st.info("Detailed module breakdown will appear here")
+
+@st.fragment
+def outline_export(saved_outline, course_model):
+    """Export formats for the outline; download clicks only rerun this fragment"""
+    course_data = saved_outline['course_data']
+    outline = saved_outline['content']
+    st.markdown("### 💾 Export Options")
+    
+    # Prepare different formats
+    markdown_content = f"""# {course_data['title']}
+
+## Course Overview
+- **Subject:** {course_data['subject']}
+- **Level:** {course_data['level']}
+- **Audience:** {course_data['audience']}
+- **Duration:** {course_data['duration']} {course_data['duration_unit']}
+
+{outline}
+
+---
+*Generated with OpenAI {saved_outline['model']} on {st.session_state.get('timestamp', '')}*
+"""
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.download_button(
+            label="📥 Markdown",
+            data=markdown_content,
+            file_name=f"{course_data['title'].lower().replace(' ', '_')}_outline.md",
+            mime="text/markdown",
+            use_container_width=True
+        )
+    
+    with col2:
+        # Convert markdown to plain text
+        plain_text = re.sub(r'[#*`]', '', markdown_content)
+        st.download_button(
+            label="📄 Plain Text",
+            data=plain_text,
+            file_name=f"{course_data['title'].lower().replace(' ', '_')}_outline.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
+    
+    with col3:
+        st.button("📋 Copy to Clipboard", 
+                 use_container_width=True,
+                 on_click=lambda: st.write("📋 Copied!"))
+    
+    with col4:
+        st.button("📧 Email Outline", use_container_width=True)
+    
+    if saved_outline.get('structured'):
+        st.download_button(
+            label="🧾 Structured JSON",
+            data=course_model.to_json(),
+            file_name=f"{course_data['title'].lower().replace(' ', '_')}_outline.json",
+            mime="application/json",
+            use_container_width=True
+        )
+
+profile_phase("form")
+
 # Check if OpenAI client is initialized
 if not st.session_state.get('client'):
     st.warning("⚠️ Please initialize OpenAI in the main page first.")
@@ -132,6 +316,13 @@ with st.form("course_outline_form"):
         with col2:
             include_examples = st.checkbox("Include real-world examples", value=True)
         
+        structured_output = st.checkbox("Structured output (JSON)", value=False,
+                                        help="Return the outline as validated JSON for a reliable module breakdown. Disables streaming.")
+        long_course_mode = st.checkbox("Long-course mode", value=False,
+                                       help=f"Plan a skeleton first, then write the modules in parallel batches. "
+                                            f"Used automatically for more than {LONG_COURSE_THRESHOLD} modules or when "
+                                            f"the outline would not fit in one response.")
+        
         temperature_override = st.slider(
             "Temperature override (optional)",
             min_value=0.0,
@@ -144,6 +335,8 @@ with st.form("course_outline_form"):
     # Submit button with icon
     submitted = st.form_submit_button("🚀 Generate Course Outline", type="primary", use_container_width=True)
 
+profile_phase("generation")
+
 if submitted:
     if not all([title, subject, audience, duration]):
         st.error("❌ Please fill in all required fields (*)")
@@ -160,163 +353,228 @@ if submitted:
         }
         
         # Combine base prompt with style prompt
-        base_prompt = format_course_outline(course_data)
-        style_prompt = COURSE_OUTLINE_PROMPTS[prompt_style]
-        full_prompt = f"{base_prompt}\n\n{style_prompt}"
+        full_prompt = build_full_prompt('course', course_data, prompt_style, structured=structured_output)
+        modules_requested = module_count(course_data)
+        if not long_course_mode and (modules_requested > LONG_COURSE_THRESHOLD
+                                     or not plan_tokens('course', course_data, full_prompt, model=model)['fits']):
+            long_course_mode = True
+            st.info(f"🧩 {modules_requested} modules is too long for a single response, so the outline is generated in long-course mode.")
         
-        if use_streaming:
-            # Streaming generation
-            st.markdown("### 🎨 Generating your course outline...")
-            outline_container = st.empty()
-            full_response = ""
-            
-            with st.spinner("Crafting your course outline..."):
-                for chunk in generate_content(
-                    full_prompt, 
-                    model=model, 
-                    temperature=temperature_override,
-                    
-                ):
-                    if chunk:
-                        full_response += chunk
-                        outline_container.markdown(f"""
-                        <div class="outline-container">
-                            <h2 style="color: #f093fb;">{title}</h2>
-                            <p><strong>Subject:</strong> {subject} | <strong>Level:</strong> {level}</p>
-                            <p><strong>Audience:</strong> {audience} | <strong>Duration:</strong> {duration} {duration_unit}</p>
-                            <hr>
-                            {full_response}
-                        </div>
-                        """, unsafe_allow_html=True)
-            
-            outline = full_response
+        # Generation runs as a background job so a rerun or page switch does not lose it
+        job_meta = {'course_data': course_data, 'structured': structured_output}
+        if long_course_mode:
+            # Map-reduce: one request plans the skeleton, then module batches are expanded in parallel
+            start_job('course_outline', 'long_course', "Course outline",
+                      long_course_work(st.session_state.client, course_data, prompt_style,
+                                       model=model, temperature=temperature_override,
+                                       labels=telemetry_labels('course_outline')),
+                      meta=dict(job_meta, prompt=full_prompt, model=model, temperature=temperature_override,
+                                streaming=False))
         else:
-            # Regular generation
-            with st.spinner("🎨 Crafting your course outline..."):
-                outline = generate_content(
-                    full_prompt, 
-                    model=model, 
-                    temperature=temperature_override
-                )
+            max_tokens = plan_max_tokens('course', course_data, full_prompt, model)
+            # JSON mode needs the whole response to validate it, so it is never streamed
+            start_generation_job(
+                'course_outline',
+                full_prompt,
+                "Course outline",
+                model=model,
+                temperature=temperature_override,
+                max_tokens=max_tokens,
+                response_format=JSON_RESPONSE_FORMAT if structured_output else None,
+                streaming=use_streaming and not structured_output,
+                meta=job_meta
+            )
+
+outline_job = pending_job('course_outline')
+if outline_job:
+    job_data = outline_job['meta']['course_data']
+    renderer = None
+    if outline_job['meta']['streaming']:
+        st.markdown("### 🎨 Generating your course outline...")
+        renderer = StreamRenderer(wrapper_html=(f"""
+        <div class="outline-container">
+            <h2 style="color: #f093fb;">{job_data['title']}</h2>
+            <p><strong>Subject:</strong> {job_data['subject']} | <strong>Level:</strong> {job_data['level']}</p>
+            <p><strong>Audience:</strong> {job_data['audience']} | <strong>Duration:</strong> {job_data['duration']} {job_data['duration_unit']}</p>
+            <p><small>Generating with {outline_job['meta']['model']}...</small></p>
+            <hr>
+            """, """
+        </div>
+        """))
+    
+    with st.spinner("🎨 Crafting your course outline..."):
+        outline_job = follow_generation_job('course_outline', on_output=renderer.write if renderer else None)
+    
+    outline = None
+    if renderer:
+        renderer.close()
+        if outline_job:
+            render_stats = renderer.stats()
+            st.caption(f"Streamed {render_stats['characters']} characters in {render_stats['render_calls']} render updates · {generation_timing_label()}")
+    if outline_job:
+        job_meta, result = outline_job['meta'], outline_job['result']
+        outline, structured_json = result['content'], result.get('structured')
+        if job_meta['structured'] and not structured_json:
+            # JSON mode: validate once into the course model and keep the Markdown rendering as the outline
+            try:
+                outline = load_course_outline(result['content'], structured=True).to_markdown()
+                structured_json = result['content']
+            except OutlineFormatError as e:
+                outline = None
+                st.error(f"❌ The structured outline did not match the expected format: {e}")
+    
+    if outline:
+        st.success("✅ Course outline generated successfully!")
         
-        if outline:
-            st.success("✅ Course outline generated successfully!")
-            
-            # Display outline in styled tabs
-            tab1, tab2, tab3, tab4 = st.tabs(["📄 Outline", "📊 Structure", "📋 Module Details", "💾 Export"])
-            
-            with tab1:
-                st.markdown(f"""
-                <div class="outline-container">
-                    <h2 style="color: #f093fb;">{title}</h2>
-                    <p><strong>Subject:</strong> {subject} | <strong>Level:</strong> {level}</p>
-                    <p><strong>Audience:</strong> {audience} | <strong>Duration:</strong> {duration} {duration_unit}</p>
-                    <p><small>Generated with: {model} | Temperature: {temperature_override}</small></p>
-                    <hr>
-                    {outline}
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with tab2:
-                st.markdown("### 📊 Course Structure Overview")
-                
-                # Extract modules from outline (simplified parsing)
-                import re
-                modules = re.findall(r'(?:Module|Week)\s+\d+[:\s]+([^\n]+)', outline)
-                
-                if modules:
-                    st.markdown("#### Module Distribution")
-                    for i, module in enumerate(modules[:5], 1):
-                        with st.container():
-                            st.markdown(f"""
-                            <div class="module-card">
-                                <strong>Module {i}:</strong> {module}
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
-                    # Visual progress
-                    st.markdown("#### Time Allocation")
-                    progress_data = {
-                        "Foundations": 25,
-                        "Core Concepts": 35,
-                        "Applications": 25,
-                        "Assessment": 15
-                    }
-                    
-                    for phase, percentage in progress_data.items():
-                        st.markdown(f"**{phase}**")
-                        st.progress(percentage / 100, text=f"{percentage}%")
-                else:
-                    st.info("Module breakdown will appear here after generation")
+        # Keep the outline across reruns; the tabs, module edits and course pack all read it from here
+        save_artifact('course_outline', outline, content_id=outline_job['content_id'], course_data=job_data,
+                      model=job_meta['model'], temperature=job_meta['temperature'],
+                      cache_status=cache_status_label(), structured=structured_json)
+        st.session_state.pop('editing_module', None)
+        update_course_pack(job_data, outline)
+        st.session_state.course_pack_settings = {'model': job_meta['model'], 'temperature': job_meta['temperature']}
+
+profile_phase("outline")
+
+saved_outline = get_artifact('course_outline')
+if saved_outline:
+    course_data = saved_outline['course_data']
+    outline = saved_outline['content']
+    # Parsed once per outline text; reruns reuse the cached model
+    with profile_section("parse", characters=len(outline)):
+        if saved_outline.get('structured'):
+            course_model = load_course_outline(saved_outline['structured'], structured=True)
+        else:
+            course_model = load_course_outline(outline)
+    
+    if 'module_edit_notice' in st.session_state:
+        st.success(st.session_state.pop('module_edit_notice'))
+    
+    # Display outline in styled tabs
+    tab1, tab2, tab3, tab4 = st.tabs(["📄 Outline", "📊 Structure", "📋 Module Details", "💾 Export"])
+    
+    with tab1:
+        st.markdown(f"""
+        <div class="outline-container">
+            <h2 style="color: #f093fb;">{course_data['title']}</h2>
+            <p><strong>Subject:</strong> {course_data['subject']} | <strong>Level:</strong> {course_data['level']}</p>
+            <p><strong>Audience:</strong> {course_data['audience']} | <strong>Duration:</strong> {course_data['duration']} {course_data['duration_unit']}</p>
+            <p><small>Generated with: {saved_outline['model']} | Temperature: {saved_outline['temperature']} | Cache: {saved_outline['cache_status']}</small></p>
+            <hr>
+            {outline}
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with tab2:
+        st.markdown("### 📊 Course Structure Overview")
+        
+        if course_model.modules:
+            st.markdown("#### Module Distribution")
+            for module in course_model.modules[:5]:
+                with st.container():
+                    st.markdown(f"""
+                    <div class="module-card">
+                        <strong>Module {module.number}:</strong> {module.title}
+                    </div>
+                    """, unsafe_allow_html=True)
             
-            with tab3:
-                st.markdown("### 📋 Detailed Module Breakdown")
-                
-                # Parse modules for detailed view
-                module_pattern = r'(?:Module|Week)\s+(\d+)[:\s]+([^\n]+)(.*?)(?=(?:Module|Week)\s+\d+|$)'
-                modules_detailed = re.findall(module_pattern, outline, re.DOTALL)
-                
-                if modules_detailed:
-                    for module_num, module_title, module_content in modules_detailed:
-                        with st.expander(f"Module {module_num}: {module_title}", expanded=False):
-                            st.markdown(module_content if module_content else "No detailed content available")
-                            
-                            # Add interactive elements
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.button(f"📝 Edit Module {module_num}", key=f"edit_{module_num}")
-                            with col2:
-                                st.button(f"📊 Add Assessment {module_num}", key=f"assess_{module_num}")
-                else:
-                    st.info("Detailed module breakdown will appear here")
+            # Visual progress
+            st.markdown("#### Time Allocation")
+            if course_model.total_hours:
+                # Real per-module shares when the outline states hours
+                progress_data = {
+                    f"Module {module.number}: {module.title}": round(100 * (module.hours or 0) / course_model.total_hours)
+                    for module in course_model.modules
+                }
+            else:
+                progress_data = {
+                    "Foundations": 25,
+                    "Core Concepts": 35,
+                    "Applications": 25,
+                    "Assessment": 15
+                }
             
-            with tab4:
-                st.markdown("### 💾 Export Options")
-                
-                # Prepare different formats
-                markdown_content = f"""# {title}
+            for phase, percentage in progress_data.items():
+                st.markdown(f"**{phase}**")
+                st.progress(percentage / 100, text=f"{percentage}%")
+        else:
+            st.info("Module breakdown will appear here after generation")
+    
+    with tab3:
+        module_details(saved_outline, course_model)
 
-## Course Overview
-- **Subject:** {subject}
-- **Level:** {level}
-- **Audience:** {audience}
-- **Duration:** {duration} {duration_unit}
+    with tab4:
+        outline_export(saved_outline, course_model)
 
-{outline}
+profile_phase("course_pack")
 
----
-*Generated with OpenAI {model} on {st.session_state.get('timestamp', '')}*
-"""
-                
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.download_button(
-                        label="📥 Markdown",
-                        data=markdown_content,
-                        file_name=f"{title.lower().replace(' ', '_')}_outline.md",
-                        mime="text/markdown",
-                        use_container_width=True
-                    )
-                
-                with col2:
-                    # Convert markdown to plain text
-                    plain_text = re.sub(r'[#*`]', '', markdown_content)
-                    st.download_button(
-                        label="📄 Plain Text",
-                        data=plain_text,
-                        file_name=f"{title.lower().replace(' ', '_')}_outline.txt",
-                        mime="text/plain",
-                        use_container_width=True
-                    )
-                
-                with col3:
-                    st.button("📋 Copy to Clipboard", 
-                             use_container_width=True,
-                             on_click=lambda: st.write("📋 Copied!"))
-                
-                with col4:
-                    st.button("📧 Email Outline", use_container_width=True)
+# Course pack: a lesson plan per module and an assessment per lesson, run as a dependency graph
+course_pack = st.session_state.get('course_pack')
+if course_pack and course_pack.modules:
+    st.markdown("---")
+    st.markdown(f"### 📦 Course Pack: {course_pack.course_data['title']}")
+    st.caption(f"{len(course_pack.modules)} modules → {len(course_pack.nodes)} lesson plans and assessments, generated in parallel")
+    
+    # The pack runs as a background job, so reruns and page switches don't lose in-flight nodes
+    pack_job = pending_job('course_pack')
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("🚀 Generate Full Course Pack", type="primary", use_container_width=True,
+                  disabled=bool(pack_job), on_click=queue_course_pack, args=(None,))
+    with col2:
+        progress_counts = course_pack.progress()
+        st.button("🔁 Retry Failed", use_container_width=True,
+                  disabled=bool(pack_job) or not (progress_counts.get('failed') or progress_counts.get('blocked')),
+                  on_click=retry_course_pack)
+    
+    if 'course_pack_request' in st.session_state:
+        requested_modules = st.session_state.pop('course_pack_request')
+        pack_settings = st.session_state.get('course_pack_settings', {})
+        node_ids = course_pack.select(requested_modules)
+        pending_ids = [node_id for node_id in node_ids if course_pack.nodes[node_id]['status'] != 'done']
+        
+        if pending_ids and not pack_job:
+            work = course_pack_work(course_pack, st.session_state.client, pending_ids,
+                                    model=pack_settings.get('model', model),
+                                    temperature=pack_settings.get('temperature', temperature),
+                                    labels=telemetry_labels())
+            start_job('course_pack', 'course_pack', f"Course pack for {course_pack.course_data['title']}", work)
+            pack_job = pending_job('course_pack')
+    
+    if pack_job:
+        with st.spinner("📦 Generating the course pack..."):
+            pack_job = follow_job('course_pack')
+        # Nodes are updated in place; applying the result covers a pack that was rebuilt meanwhile
+        if pack_job and pack_job['result']['pipeline_id'] == course_pack.pipeline_id:
+            for node_id, node in pack_job['result']['nodes'].items():
+                course_pack.nodes[node_id].update(node)
+    
+    status_icons = {'done': '✅', 'failed': '❌', 'blocked': '⛔', 'running': '⏳', 'pending': '⏸️'}
+    for module in course_pack.modules:
+        lesson_node = course_pack.nodes[f"lesson_{module['number']}"]
+        assessment_node = course_pack.nodes[f"assessment_{module['number']}"]
+        if lesson_node['status'] == 'pending' and assessment_node['status'] == 'pending':
+            continue
+        with st.expander(f"{status_icons[lesson_node['status']]}{status_icons[assessment_node['status']]} Module {module['number']}: {module['title']}"):
+            for node in (lesson_node, assessment_node):
+                st.markdown(f"#### {'📅 Lesson Plan' if node['kind'] == 'lesson' else '📊 Assessment'}")
+                if node['status'] == 'done':
+                    st.markdown(node['content'])
+                elif node['error']:
+                    st.error(node['error'])
+                else:
+                    st.info(f"Status: {node['status']}")
+    
+    if any(node['status'] == 'done' for node in course_pack.nodes.values()):
+        st.download_button(
+            label="📥 Download Course Pack (Markdown)",
+            data=course_pack.to_markdown(),
+            file_name=f"{course_pack.course_data['title'].lower().replace(' ', '_')}_course_pack.md",
+            mime="text/markdown",
+            use_container_width=True
+        )
+
+profile_phase("sidebar")
 
 # Sidebar with enhanced tips
 with st.sidebar:
@@ -338,9 +596,12 @@ with st.sidebar:
     st.info(f"""
     **Model:** {model}
     **Temperature:** {temperature}
-    **Max Tokens:** 4000
+    **Max Tokens:** sized per request
+    **Cache:** {cache_stats_summary()}
     """)
     
+    show_background_jobs()
+    
     st.markdown("### 📚 Example Courses")
     
     example_courses = {
@@ -361,4 +622,6 @@ with st.sidebar:
 if 'example_title' in st.session_state:
     title = st.session_state.example_title
     # Clear after use
-    del st.session_state.example_title
\ No newline at end of file
+    del st.session_state.example_title
+
+finish_rerun()
@@ -1,8 +1,16 @@
 import streamlit as st
-from utils.openai_helper import generate_content, format_lesson_plan
-from utils.prompts import LESSON_PLAN_PROMPTS
+import re
+from utils.openai_helper import plan_max_tokens, start_generation_job, pending_job, follow_generation_job, save_artifact, get_artifact, show_background_jobs, cache_status_label, generation_timing_label, cache_stats_summary
+from utils.prompts import LESSON_PLAN_PROMPTS, build_full_prompt
+from utils.stream_renderer import StreamRenderer
+from utils.section_index import index_sections
+from utils.metrics import start_metrics_server
+from utils.profiling import start_rerun, profile_phase, profile_section, finish_rerun
 
 st.set_page_config(page_title="Lesson Planner", page_icon="📅")
+st.session_state.page = 'lesson_planner'
+start_metrics_server()
+start_rerun("pages/2_lesson_planner.py", phase="css")
 
 # Custom CSS for this page
 st.markdown("""
@@ -79,6 +87,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+profile_phase("form")
+
 # Check if OpenAI client is initialized
 if not st.session_state.get('client'):
     st.warning("⚠️ Please initialize OpenAI in the main page first.")
@@ -95,6 +105,35 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+@st.fragment
+def lesson_export(markdown_content, file_stem):
+    """Download buttons for the lesson plan; clicking them only reruns this fragment"""
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.download_button(
+            label="📥 Download Markdown",
+            data=markdown_content,
+            file_name=f"{file_stem}.md",
+            mime="text/markdown",
+            use_container_width=True
+        )
+    
+    with col2:
+        # Plain text version
+        plain_text = re.sub(r'[#*`]', '', markdown_content)
+        st.download_button(
+            label="📄 Plain Text",
+            data=plain_text,
+            file_name=f"{file_stem}.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
+    
+    with col3:
+        if st.button("📋 Copy to Clipboard", use_container_width=True):
+            st.success("✅ Copied to clipboard!")
+
 # Main form
 with st.form("lesson_plan_form"):
     st.markdown("### 📝 Lesson Information")
@@ -172,6 +211,8 @@ with st.form("lesson_plan_form"):
     
     submitted = st.form_submit_button("🚀 Generate Lesson Plan", type="primary", use_container_width=True)
 
+profile_phase("generation")
+
 if submitted:
     if not all([title, course, duration, objectives]):
         st.error("❌ Please fill in all required fields (*)")
@@ -201,156 +242,154 @@ if submitted:
             'engagement_features': engagement_features
         }
         
-        base_prompt = format_lesson_plan(lesson_data)
-        style_prompt = LESSON_PLAN_PROMPTS[teaching_style]
-        
-        # Add engagement features to prompt
-        if engagement_features:
-            style_prompt += f"\n\n**ENGAGEMENT FEATURES TO INCLUDE:**\n"
-            for feature in engagement_features:
-                style_prompt += f"• {feature}\n"
+        # Base prompt plus teaching style, engagement features and standards
+        full_prompt = build_full_prompt('lesson', lesson_data, teaching_style)
+        max_tokens = plan_max_tokens('lesson', lesson_data, full_prompt, model)
         
-        # Add standards if requested
-        if include_standards:
-            style_prompt += "\n\n**EDUCATIONAL STANDARDS:**\nAlign the lesson with Common Core or relevant educational standards and mention them explicitly."
-        
-        full_prompt = f"{base_prompt}\n\n{style_prompt}"
+        # Generation runs as a background job so a rerun or page switch does not lose it
+        start_generation_job(
+            'lesson_plan',
+            full_prompt,
+            "Lesson plan",
+            model=model,
+            temperature=temperature_override,
+            max_tokens=max_tokens,
+            streaming=use_streaming,
+            meta={'lesson_data': lesson_data, 'teaching_style': teaching_style}
+        )
+
+lesson_job = pending_job('lesson_plan')
+if lesson_job:
+    job_data = lesson_job['meta']['lesson_data']
+    renderer = None
+    if lesson_job['meta']['streaming']:
+        st.markdown("### 🎨 Generating your lesson plan...")
+        renderer = StreamRenderer(wrapper_html=(f"""
+        <div class="outline-container">
+            <h2 style="color: #84fab0;">{job_data['title']}</h2>
+            <p><strong>Course:</strong> {job_data['course']} | <strong>Duration:</strong> {job_data['duration']} minutes</p>
+            <p><strong>Class Size:</strong> {job_data['class_size']} students</p>
+            <p><small>Generating with {lesson_job['meta']['model']}...</small></p>
+            <hr>
+            """, """
+        </div>
+        """))
+    
+    with st.spinner("🎨 Crafting your engaging lesson plan..."):
+        lesson_job = follow_generation_job('lesson_plan', on_output=renderer.write if renderer else None)
+    
+    if renderer:
+        renderer.close()
+        if lesson_job:
+            render_stats = renderer.stats()
+            st.caption(f"Streamed {render_stats['characters']} characters in {render_stats['render_calls']} render updates · {generation_timing_label()}")
+    if lesson_job:
+        job_meta = lesson_job['meta']
+        # Saved with the inputs the job was started with; the form may have changed since
+        save_artifact('lesson_plan', lesson_job['result']['content'], content_id=lesson_job['content_id'],
+                      lesson_data=job_data, teaching_style=job_meta['teaching_style'], model=job_meta['model'],
+                      temperature=job_meta['temperature'], cache_status=cache_status_label())
+        st.success("✅ Lesson plan generated successfully!")
+
+profile_phase("lesson_plan")
+
+# The last lesson plan is rendered from session state, so widget reruns never regenerate it
+saved_lesson = get_artifact('lesson_plan')
+if saved_lesson:
+    lesson_plan = saved_lesson['content']
+    lesson_data = saved_lesson['lesson_data']
+    title, course, duration, class_size = (lesson_data[key] for key in ('title', 'course', 'duration', 'class_size'))
+    objectives, materials, prerequisites = (lesson_data[key] for key in ('objectives', 'materials', 'prerequisites'))
+    engagement_features = lesson_data['engagement_features']
+    teaching_style = saved_lesson['teaching_style']
+    model_used, temperature_used = saved_lesson['model'], saved_lesson['temperature']
+    
+    # Display engagement tags
+    if engagement_features:
+        st.markdown("### ✨ Selected Engagement Features")
+        tags_html = ""
+        for feature in engagement_features:
+            tags_html += f'<span class="engagement-tag">{feature}</span> '
+        st.markdown(f'<div>{tags_html}</div>', unsafe_allow_html=True)
+    
+    # Interactive timeline visualization
+    st.markdown("### ⏱️ Lesson Timeline")
+    
+    cols = st.columns(4)
+    timeline_segments = [
+        ("🎯 Opening", "5-10 min", "Hook & Objectives"),
+        ("📚 Instruction", "15-20 min", "Content Delivery"),
+        ("✋ Practice", "15-20 min", "Guided & Independent"),
+        ("🎉 Closing", "5-10 min", "Review & Assessment")
+    ]
+    
+    for col, (title_seg, duration_seg, desc) in zip(cols, timeline_segments):
+        with col:
+            st.markdown(f"""
+            <div class="timeline-step">
+                <h4>{title_seg}</h4>
+                <p style="font-size: 1.2rem; margin: 0.5rem 0;">{duration_seg}</p>
+                <p style="font-size: 0.9rem; opacity: 0.9;">{desc}</p>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    # Tabs for different views
+    tab1, tab2, tab3, tab4 = st.tabs(["📄 Full Lesson Plan", "⏰ Timeline View", "📋 Activities", "💾 Export"])
+    
+    with tab1:
+        st.markdown(f"""
+        <div class="outline-container">
+            <h2 style="color: #84fab0;">{title}</h2>
+            <p><strong>Course:</strong> {course} | <strong>Duration:</strong> {duration} minutes</p>
+            <p><strong>Class Size:</strong> {class_size} students</p>
+            <p><small>Generated with: {model_used} | Temperature: {temperature_used} | Cache: {saved_lesson['cache_status']}</small></p>
+            <hr>
+            {lesson_plan}
+        </div>
+        """, unsafe_allow_html=True)
+    
+    with tab2:
+        st.markdown("### ⏰ Detailed Timeline")
         
-        if use_streaming:
-            # Streaming generation
-            st.markdown("### 🎨 Generating your lesson plan...")
-            outline_container = st.empty()
-            full_response = ""
-            
-            with st.spinner("Crafting your engaging lesson plan..."):
-                for chunk in generate_content(
-                    full_prompt, 
-                    model=model, 
-                    temperature=temperature_override,
-                    
-                ):
-                    if chunk:
-                        full_response += chunk
-                        outline_container.markdown(f"""
-                        <div class="outline-container">
-                            <h2 style="color: #84fab0;">{title}</h2>
-                            <p><strong>Course:</strong> {course} | <strong>Duration:</strong> {duration} minutes</p>
-                            <p><strong>Class Size:</strong> {class_size} students</p>
-                            <p><small>Generating with {model}...</small></p>
-                            <hr>
-                            {full_response}
-                        </div>
-                        """, unsafe_allow_html=True)
-            
-            lesson_plan = full_response
-        else:
-            # Regular generation
-            with st.spinner("🎨 Crafting your engaging lesson plan..."):
-                lesson_plan = generate_content(
-                    full_prompt, 
-                    model=model, 
-                    temperature=temperature_override
-                )
+        # Timed segments and activities come from one indexing pass over the lesson plan
+        with profile_section("parse", characters=len(lesson_plan)):
+            lesson_index = index_sections(lesson_plan)
         
-        if lesson_plan:
-            st.success("✅ Lesson plan generated successfully!")
-            
-            # Display engagement tags
-            if engagement_features:
-                st.markdown("### ✨ Selected Engagement Features")
-                tags_html = ""
-                for feature in engagement_features:
-                    tags_html += f'<span class="engagement-tag">{feature}</span> '
-                st.markdown(f'<div>{tags_html}</div>', unsafe_allow_html=True)
-            
-            # Interactive timeline visualization
-            st.markdown("### ⏱️ Lesson Timeline")
-            
-            cols = st.columns(4)
-            timeline_segments = [
-                ("🎯 Opening", "5-10 min", "Hook & Objectives"),
-                ("📚 Instruction", "15-20 min", "Content Delivery"),
-                ("✋ Practice", "15-20 min", "Guided & Independent"),
-                ("🎉 Closing", "5-10 min", "Review & Assessment")
-            ]
-            
-            for col, (title_seg, duration_seg, desc) in zip(cols, timeline_segments):
-                with col:
-                    st.markdown(f"""
-                    <div class="timeline-step">
-                        <h4>{title_seg}</h4>
-                        <p style="font-size: 1.2rem; margin: 0.5rem 0;">{duration_seg}</p>
-                        <p style="font-size: 0.9rem; opacity: 0.9;">{desc}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-            
-            # Tabs for different views
-            tab1, tab2, tab3, tab4 = st.tabs(["📄 Full Lesson Plan", "⏰ Timeline View", "📋 Activities", "💾 Export"])
-            
-            with tab1:
+        if lesson_index.timeline:
+            for segment in lesson_index.timeline:
+                start, end = segment['start_minute'], segment['end_minute']
+                duration_text = f"{start}-{end}" if end is not None else start
                 st.markdown(f"""
-                <div class="outline-container">
-                    <h2 style="color: #84fab0;">{title}</h2>
-                    <p><strong>Course:</strong> {course} | <strong>Duration:</strong> {duration} minutes</p>
-                    <p><strong>Class Size:</strong> {class_size} students</p>
-                    <p><small>Generated with: {model} | Temperature: {temperature_override}</small></p>
-                    <hr>
-                    {lesson_plan}
+                <div class="activity-card">
+                    <strong>⏱️ {duration_text} minutes:</strong> {segment['activity']}
                 </div>
                 """, unsafe_allow_html=True)
-            
-            with tab2:
-                st.markdown("### ⏰ Detailed Timeline")
-                
-                # Try to extract timeline from lesson plan
-                import re
-                timeline_pattern = r'(\d+)[-–]\s*(\d+)?\s*minutes?[:\s]+([^\n]+)'
-                timeline_items = re.findall(timeline_pattern, lesson_plan, re.IGNORECASE)
-                
-                if timeline_items:
-                    for start, end, activity in timeline_items:
-                        duration_text = f"{start}-{end}" if end else start
-                        st.markdown(f"""
-                        <div class="activity-card">
-                            <strong>⏱️ {duration_text} minutes:</strong> {activity}
-                        </div>
-                        """, unsafe_allow_html=True)
-                else:
-                    st.info("Timeline details will be extracted from the generated lesson plan")
-            
-            with tab3:
-                st.markdown("### 📋 Activities Breakdown")
-                
-                # Parse activities
-                activity_patterns = [
-                    r'(?:Opening|Hook|Warm-up)[:\s]+([^\n]+)',
-                    r'(?:Direct Instruction|Lecture)[:\s]+([^\n]+)',
-                    r'(?:Guided Practice)[:\s]+([^\n]+)',
-                    r'(?:Independent Practice)[:\s]+([^\n]+)',
-                    r'(?:Closing|Exit Ticket)[:\s]+([^\n]+)'
-                ]
-                
-                for pattern in activity_patterns:
-                    matches = re.findall(pattern, lesson_plan, re.IGNORECASE)
-                    for match in matches:
-                        st.markdown(f"""
-                        <div class="activity-card">
-                            {match}
-                        </div>
-                        """, unsafe_allow_html=True)
-            
-            with tab4:
-                st.markdown("### 💾 Export Options")
-                
-                # Prepare markdown content with metadata
-                markdown_content = f"""# {title}
+        else:
+            st.info("Timeline details will be extracted from the generated lesson plan")
+    
+    with tab3:
+        st.markdown("### 📋 Activities Breakdown")
+        
+        # Activities grouped by lesson phase (opening, instruction, practice, closing)
+        for activity in lesson_index.activities_by_kind():
+            st.markdown(f"""
+            <div class="activity-card">
+                {activity['text']}
+            </div>
+            """, unsafe_allow_html=True)
+    
+    with tab4:
+        st.markdown("### 💾 Export Options")
+        
+        # Prepare markdown content with metadata
+        markdown_content = f"""# {title}
 
 ## Lesson Overview
 - **Course:** {course}
 - **Duration:** {duration} minutes
 - **Class Size:** {class_size} students
 - **Teaching Style:** {teaching_style.replace('_', ' ').title()}
-- **Generated with:** {model} (Temperature: {temperature_override})
+- **Generated with:** {model_used} (Temperature: {temperature_used})
 
 ## Learning Objectives
 {objectives}
@@ -369,34 +408,13 @@ if submitted:
 {lesson_plan}
 
 ---
-*Generated with OpenAI {model} on {st.session_state.get('timestamp', '')}*
+*Generated with OpenAI {model_used} on {st.session_state.get('timestamp', '')}*
 """
-                
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.download_button(
-                        label="📥 Download Markdown",
-                        data=markdown_content,
-                        file_name=f"{title.lower().replace(' ', '_')}_lesson_plan.md",
-                        mime="text/markdown",
-                        use_container_width=True
-                    )
-                
-                with col2:
-                    # Plain text version
-                    plain_text = re.sub(r'[#*`]', '', markdown_content)
-                    st.download_button(
-                        label="📄 Plain Text",
-                        data=plain_text,
-                        file_name=f"{title.lower().replace(' ', '_')}_lesson_plan.txt",
-                        mime="text/plain",
-                        use_container_width=True
-                    )
-                
-                with col3:
-                    if st.button("📋 Copy to Clipboard", use_container_width=True):
-                        st.success("✅ Copied to clipboard!")
+        
+        lesson_export(markdown_content, f"{title.lower().replace(' ', '_')}_lesson_plan")
+
+
+profile_phase("sidebar")
 
 # Sidebar with differentiation strategies and tips
 with st.sidebar:
@@ -412,9 +430,12 @@ with st.sidebar:
     st.info(f"""
     **Model:** {model}
     **Temperature:** {temperature}
-    **Max Tokens:** 4000
+    **Max Tokens:** sized per request
+    **Cache:** {cache_stats_summary()}
     """)
     
+    show_background_jobs()
+    
     with st.expander("📚 For Different Learners"):
         st.markdown("""
         - **Visual learners**: Diagrams, charts, videos, concept maps
@@ -463,4 +484,6 @@ with st.sidebar:
 # Initialize timestamp if not exists
 if 'timestamp' not in st.session_state:
     from datetime import datetime
-    st.session_state.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
\ No newline at end of file
+    st.session_state.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+finish_rerun()
@@ -1,10 +1,17 @@
 import streamlit as st
-from utils.openai_helper import generate_content, format_assessment
-from utils.prompts import ASSESSMENT_PROMPTS
+import hashlib
+from utils.openai_helper import generate_content, generate_content_streaming, generate_content_concurrently, plan_max_tokens, start_generation_job, pending_job, follow_generation_job, save_artifact, get_artifact, show_background_jobs, cache_status_label, generation_timing_label, cache_stats_summary
+from utils.prompts import ASSESSMENT_PROMPTS, build_full_prompt, format_answer_key, format_rubric, format_composite_sections, split_composite
+from utils.stream_renderer import StreamRenderer, DEFAULT_FLUSH_INTERVAL, DEFAULT_FLUSH_BYTES
 import re
 from datetime import datetime
+from utils.metrics import start_metrics_server
+from utils.profiling import start_rerun, profile_phase, profile_section, finish_rerun
 
 st.set_page_config(page_title="Assessment Generator", page_icon="📊")
+st.session_state.page = 'assessment_generator'
+start_metrics_server()
+start_rerun("pages/3_assessment_generator.py", phase="css")
 
 # Custom CSS for this page
 st.markdown("""
@@ -94,6 +101,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+profile_phase("form")
+
 # Check if OpenAI client is initialized
 if not st.session_state.get('client'):
     st.warning("⚠️ Please initialize OpenAI in the main page first.")
@@ -110,6 +119,119 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+DERIVED_PROMPTS = {'answer_key': format_answer_key, 'rubric': format_rubric}
+DERIVED_LABELS = {'answer_key': ("🔑", "answer key"), 'rubric': ("📊", "scoring rubric")}
+DERIVED_HEADERS = {
+    'answer_key': '<h3 style="color: #ff9a9e;">Answer Key</h3>',
+    'rubric': '<h3 style="padding: 1rem; color: #ff9a9e;">Scoring Rubric</h3>'
+}
+
+def derived_artifacts(assessment):
+    """Answer key and rubric generated so far for an assessment, memoized by its content hash"""
+    digest = hashlib.blake2b(assessment.encode('utf-8'), digest_size=16).hexdigest()
+    return st.session_state.setdefault('derived_artifacts', {}).setdefault(digest, {})
+
+def request_derived(name):
+    """Button callback: generate the answer key or rubric on the next run"""
+    st.session_state.setdefault('derived_requests', set()).add(name)
+
+@st.fragment
+def assessment_export(markdown_content, file_stem):
+    """Download buttons for the assessment; clicking them only reruns this fragment"""
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.download_button(
+            label="📥 Download Markdown",
+            data=markdown_content,
+            file_name=f"{file_stem}.md",
+            mime="text/markdown",
+            use_container_width=True
+        )
+    
+    with col2:
+        # Plain text version
+        plain_text = re.sub(r'[#*`]', '', markdown_content)
+        st.download_button(
+            label="📄 Plain Text",
+            data=plain_text,
+            file_name=f"{file_stem}.txt",
+            mime="text/plain",
+            use_container_width=True
+        )
+    
+    with col3:
+        if st.button("📋 Copy to Clipboard", use_container_width=True):
+            st.success("✅ Content copied to clipboard!")
+
+@st.fragment
+def question_bank(level, use_streaming):
+    """Sidebar question generator and saved questions; its widgets only rerun this fragment"""
+    # Quick question generator
+    with st.expander("➕ Add Custom Question", expanded=False):
+        q_topic = st.text_input("Topic", key="q_topic", placeholder="e.g., Algebra")
+        q_type = st.selectbox("Type", ["Multiple Choice", "Short Answer", "Essay", "Problem Solving", "True/False"])
+        q_difficulty = st.select_slider("Difficulty", ["Easy", "Medium", "Hard"])
+        
+        if st.button("Generate Question", use_container_width=True):
+            if q_topic:
+                with st.spinner("Generating..."):
+                    q_prompt = f"""Generate one {q_difficulty} {q_type} question about {q_topic} for {level} level.
+                    
+Include:
+1. The question
+2. If multiple choice, provide 4 options
+3. Indicate the correct answer
+"""
+                    q_max_tokens = plan_max_tokens('question', {}, q_prompt, model)
+                    if use_streaming:
+                        st.info("Question will appear below...")
+                        question_renderer = StreamRenderer()
+                        for chunk in generate_content_streaming(q_prompt, model=model, temperature=0.5, max_tokens=q_max_tokens,
+                                                                kind='question'):
+                            if chunk:
+                                question_renderer.write(chunk)
+                        question = question_renderer.close()
+                    else:
+                        question = generate_content(q_prompt, model=model, temperature=0.5, max_tokens=q_max_tokens,
+                                                    kind='question')
+                    
+                    if question:
+                        st.session_state.question_bank.append({
+                            'question': question,
+                            'topic': q_topic,
+                            'type': q_type,
+                            'difficulty': q_difficulty,
+                            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
+                        })
+                        st.success("✅ Question added to bank!")
+                        st.rerun()
+    
+    # Display question bank
+    if st.session_state.question_bank:
+        st.markdown("### 📌 Saved Questions")
+        for i, q in enumerate(reversed(st.session_state.question_bank[-5:])):
+            with st.container():
+                difficulty_class = q['difficulty'].lower()
+                st.markdown(f"""
+                <div class="question-card" style="padding: 1rem;">
+                    <span class="difficulty-badge {difficulty_class}">{q['difficulty']}</span>
+                    <span style="color: #666; font-size: 0.85rem;">{q['type']}</span>
+                    <p style="margin-top: 0.5rem;"><strong>{q['topic']}</strong></p>
+                    <p style="font-size: 0.85rem; color: #666;">{q['question'][:100]}...</p>
+                    <p style="font-size: 0.75rem; color: #999;">{q.get('timestamp', '')}</p>
+                </div>
+                """, unsafe_allow_html=True)
+        
+        if len(st.session_state.question_bank) > 5:
+            st.caption(f"... and {len(st.session_state.question_bank) - 5} more questions")
+        
+        if st.button("🗑️ Clear Question Bank", use_container_width=True):
+            st.session_state.question_bank = []
+            st.rerun()
+    else:
+        st.info("No questions saved yet. Generate questions above to build your bank.")
+
 # Main form
 with st.form("assessment_form"):
     st.markdown("### 📝 Assessment Details")
@@ -178,8 +300,10 @@ with st.form("assessment_form"):
         with col1:
             use_streaming = st.checkbox("Enable streaming output", value=True,
                                        help="See content as it's being generated")
-            include_answer_key = st.checkbox("Include answer key", value=True)
-            include_rubric = st.checkbox("Include grading rubric", value=True)
+            include_answer_key = st.checkbox("Generate answer key right away", value=False,
+                                             help="Otherwise it is generated when you ask for it in the Answer Key tab")
+            include_rubric = st.checkbox("Generate grading rubric right away", value=False,
+                                         help="Otherwise it is generated when you ask for it in the Rubric tab")
         with col2:
             temperature_override = st.slider(
                 "Temperature override",
@@ -190,9 +314,14 @@ with st.form("assessment_form"):
                 help="Override default temperature for more/less creative questions"
             )
             include_blooms = st.checkbox("Include Bloom's Taxonomy levels", value=False)
+            composite = st.checkbox("Answer key and rubric in the same request", value=False,
+                                    help="One round trip: the answer key and rubric come back with the assessment "
+                                         "and are split into their tabs")
     
     submitted = st.form_submit_button("🚀 Generate Assessment", type="primary", use_container_width=True)
 
+profile_phase("generation")
+
 if submitted:
     if not all([topic, grade_level, objectives]):
         st.error("❌ Please fill in all required fields (*)")
@@ -219,211 +348,228 @@ if submitted:
             'include_blooms': include_blooms if 'include_blooms' in locals() else False
         }
         
-        base_prompt = format_assessment(assessment_data)
-        style_prompt = ASSESSMENT_PROMPTS[assessment_style]
-        full_prompt = f"{base_prompt}\n\n{style_prompt}"
+        full_prompt = build_full_prompt('assessment', assessment_data, assessment_style)
+        if composite:
+            # The assessment context is sent once instead of again for the key and the rubric
+            full_prompt = f"{full_prompt}\n\n{format_composite_sections(assessment_type, topic)}"
+        max_tokens = plan_max_tokens('assessment_bundle' if composite else 'assessment', assessment_data,
+                                     full_prompt, model)
         
-        if use_streaming:
-            # Streaming generation for main assessment
-            st.markdown("### 📝 Generating your assessment...")
-            assessment_container = st.empty()
-            full_response = ""
-            
-            with st.spinner("Creating assessment questions..."):
-                for chunk in generate_content(
-                    full_prompt, 
-                    model=model, 
-                    temperature=temperature_override,
-                    
-                ):
-                    if chunk:
-                        full_response += chunk
-                        assessment_container.markdown(f"""
-                        <div class="outline-container">
-                            <h2 style="color: #ff9a9e;">{topic} - {assessment_type}</h2>
-                            <p><strong>Grade Level:</strong> {grade_level} | <strong>Time:</strong> {time_limit} min</p>
-                            <p><strong>Difficulty:</strong> 
-                                <span class="difficulty-badge {'easy' if difficulty in ['Very Easy', 'Easy'] else 'medium' if difficulty == 'Medium' else 'hard'}">
-                                    {difficulty}
-                                </span>
-                            </p>
-                            <p><small>Generating with {model}...</small></p>
-                            <hr>
-                            {full_response}
-                        </div>
-                        """, unsafe_allow_html=True)
-            
-            assessment = full_response
-        else:
-            # Regular generation
-            with st.spinner("📝 Generating your assessment..."):
-                assessment = generate_content(
-                    full_prompt, 
-                    model=model, 
-                    temperature=temperature_override
-                )
-        
-        if assessment:
-            st.success("✅ Assessment generated successfully!")
-            
-            # Display assessment in styled tabs
-            tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 Assessment", "🔑 Answer Key", "📊 Rubric", "📈 Analysis", "💾 Export"])
-            
-            with tab1:
-                st.markdown(f"""
-                <div class="outline-container">
-                    <h2 style="color: #ff9a9e;">{topic} - {assessment_type}</h2>
-                    <p><strong>Grade Level:</strong> {grade_level} | <strong>Time Limit:</strong> {time_limit} minutes</p>
-                    <p><strong>Difficulty:</strong> 
-                        <span class="difficulty-badge {'easy' if difficulty in ['Very Easy', 'Easy'] else 'medium' if difficulty == 'Medium' else 'hard'}">
-                            {difficulty}
-                        </span>
-                    </p>
-                    <p><small>Generated with: {model} | Temperature: {temperature_override}</small></p>
-                    <hr>
-                    {assessment}
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with tab2:
-                if include_answer_key:
-                    with st.spinner("🔑 Generating answer key..."):
-                        answer_key_prompt = f"""Create a detailed answer key for this {assessment_type} on {topic}:
-
-{assessment}
+        # Generation runs as a background job so a rerun or page switch does not lose it
+        start_generation_job(
+            'assessment',
+            full_prompt,
+            "Assessment",
+            model=model,
+            temperature=temperature_override,
+            max_tokens=max_tokens,
+            streaming=use_streaming,
+            meta={
+                'assessment_data': assessment_data,
+                'requirements': requirements,
+                'question_types': question_types,
+                'include_answer_key': include_answer_key,
+                'include_rubric': include_rubric,
+                'composite': composite,
+            }
+        )
 
-Format the answer key with:
-1. Correct answers for multiple choice, true/false, matching
-2. Model answers/sample responses for short answer and essay questions
-3. Point values for each question
-4. Explanations for correct answers where helpful"""
-                        
-                        if use_streaming:
-                            answer_container = st.empty()
-                            answer_full = ""
-                            for chunk in generate_content(answer_key_prompt, model=model, temperature=0.3):
-                                if chunk:
-                                    answer_full += chunk
-                                    answer_container.markdown(f"""
-                                    <div class="outline-container">
-                                        <h3 style="color: #ff9a9e;">Answer Key</h3>
-                                        {answer_full}
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                            answer_key = answer_full
-                        else:
-                            answer_key = generate_content(answer_key_prompt, model=model, temperature=0.3)
-                            
-                        if answer_key:
-                            st.markdown(f"""
-                            <div class="outline-container">
-                                <h3 style="color: #ff9a9e;">Answer Key</h3>
-                                {answer_key}
-                            </div>
-                            """, unsafe_allow_html=True)
-                else:
-                    st.info("Answer key generation was disabled. Enable it in Advanced Options to include.")
-            
-            with tab3:
-                if include_rubric:
-                    with st.spinner("📊 Generating scoring rubric..."):
-                        rubric_prompt = f"""Create a detailed scoring rubric for this {assessment_type} on {topic}:
+assessment_job = pending_job('assessment')
+if assessment_job:
+    job_data = assessment_job['meta']['assessment_data']
+    renderer = None
+    if assessment_job['meta']['streaming']:
+        # Streaming generation for main assessment
+        st.markdown("### 📝 Generating your assessment...")
+        renderer = StreamRenderer(wrapper_html=(f"""
+        <div class="outline-container">
+            <h2 style="color: #ff9a9e;">{job_data['topic']} - {job_data['type']}</h2>
+            <p><strong>Grade Level:</strong> {job_data['grade_level']} | <strong>Time:</strong> {job_data['time_limit']} min</p>
+            <p><strong>Difficulty:</strong> 
+                <span class="difficulty-badge {'easy' if job_data['difficulty'] in ['Very Easy', 'Easy'] else 'medium' if job_data['difficulty'] == 'Medium' else 'hard'}">
+                    {job_data['difficulty']}
+                </span>
+            </p>
+            <p><small>Generating with {assessment_job['meta']['model']}...</small></p>
+            <hr>
+            """, """
+        </div>
+        """))
+    
+    with st.spinner("📝 Creating assessment questions..."):
+        assessment_job = follow_generation_job('assessment', on_output=renderer.write if renderer else None)
+    
+    if renderer:
+        renderer.close()
+        if assessment_job:
+            render_stats = renderer.stats()
+            st.caption(f"Streamed {render_stats['characters']} characters in {render_stats['render_calls']} render updates · {generation_timing_label()}")
+    if assessment_job:
+        job_meta = assessment_job['meta']
+        assessment = assessment_job['result']['content']
+        if job_meta.get('composite'):
+            with profile_section("parse", characters=len(assessment)):
+                assessment, sections = split_composite(assessment)
+            derived_artifacts(assessment).update(sections)
+            missing = [DERIVED_LABELS[name][1] for name in DERIVED_PROMPTS if name not in sections]
+            if missing:
+                st.warning(f"⚠️ The response did not include the {' or '.join(missing)}; generate them in their tabs.")
+        # Saved with the inputs the job was started with; the form may have changed since
+        save_artifact(
+            'assessment',
+            assessment,
+            content_id=assessment_job['content_id'],
+            assessment_data=job_data,
+            requirements=job_meta['requirements'],
+            question_types=job_meta['question_types'],
+            include_answer_key=job_meta['include_answer_key'],
+            include_rubric=job_meta['include_rubric'],
+            streaming=job_meta['streaming'],
+            model=job_meta['model'],
+            temperature=job_meta['temperature'],
+            cache_status=cache_status_label()
+        )
+        st.success("✅ Assessment generated successfully!")
 
-{assessment}
+profile_phase("assessment")
 
-Include:
-1. Grading criteria for each question type
-2. Point distribution
-3. Performance levels (Excellent, Good, Satisfactory, Needs Improvement)
-4. Specific descriptors for each level
-5. Total points calculation"""
-                        
-                        if use_streaming:
-                            rubric_container = st.empty()
-                            rubric_full = ""
-                            for chunk in generate_content(rubric_prompt, model=model, temperature=0.3):
-                                if chunk:
-                                    rubric_full += chunk
-                                    rubric_container.markdown(f"""
-                                    <div class="rubric-table">
-                                        <h3 style="padding: 1rem; color: #ff9a9e;">Scoring Rubric</h3>
-                                        {rubric_full}
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                            rubric = rubric_full
-                        else:
-                            rubric = generate_content(rubric_prompt, model=model, temperature=0.3)
-                            
-                        if rubric:
-                            st.markdown(f"""
-                            <div class="rubric-table">
-                                <h3 style="padding: 1rem; color: #ff9a9e;">Scoring Rubric</h3>
-                                {rubric}
-                            </div>
-                            """, unsafe_allow_html=True)
-                else:
-                    st.info("Rubric generation was disabled. Enable it in Advanced Options to include.")
+# The last assessment is rendered from session state, so widget reruns never regenerate it
+saved_assessment = get_artifact('assessment')
+if saved_assessment:
+    assessment = saved_assessment['content']
+    assessment_data = saved_assessment['assessment_data']
+    assessment_type, topic, grade_level = assessment_data['type'], assessment_data['topic'], assessment_data['grade_level']
+    num_questions, difficulty, time_limit = (assessment_data[key] for key in ('num_questions', 'difficulty', 'time_limit'))
+    objectives, include_blooms = assessment_data['objectives'], assessment_data['include_blooms']
+    requirements, question_types = saved_assessment['requirements'], saved_assessment['question_types']
+    include_answer_key, include_rubric = saved_assessment['include_answer_key'], saved_assessment['include_rubric']
+    model_used, temperature_used = saved_assessment['model'], saved_assessment['temperature']
+    
+    # Display assessment in styled tabs
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 Assessment", "🔑 Answer Key", "📊 Rubric", "📈 Analysis", "💾 Export"])
+    
+    with tab1:
+        st.markdown(f"""
+        <div class="outline-container">
+            <h2 style="color: #ff9a9e;">{topic} - {assessment_type}</h2>
+            <p><strong>Grade Level:</strong> {grade_level} | <strong>Time Limit:</strong> {time_limit} minutes</p>
+            <p><strong>Difficulty:</strong> 
+                <span class="difficulty-badge {'easy' if difficulty in ['Very Easy', 'Easy'] else 'medium' if difficulty == 'Medium' else 'hard'}">
+                    {difficulty}
+                </span>
+            </p>
+            <p><small>Generated with: {model_used} | Temperature: {temperature_used} | Cache: {saved_assessment['cache_status']}</small></p>
+            <hr>
+            {assessment}
+        </div>
+        """, unsafe_allow_html=True)
+    
+    # Answer key and rubric are only generated when asked for (or up front when
+    # chosen in Advanced Options), concurrently if both are requested, and
+    # memoized by the assessment's content; an empty entry marks a failed attempt
+    derived = derived_artifacts(assessment)
+    derived_requests = st.session_state.pop('derived_requests', set())
+    eager = {'answer_key': include_answer_key, 'rubric': include_rubric}
+    derived_prompts = {}
+    derived_containers = {}
+    
+    for name, tab in (('answer_key', tab2), ('rubric', tab3)):
+        icon, label = DERIVED_LABELS[name]
+        with tab:
+            if derived.get(name):
+                st.markdown(DERIVED_HEADERS[name], unsafe_allow_html=True)
+                st.markdown(derived[name])
+            elif name in derived_requests or (eager[name] and name not in derived):
+                derived_prompts[name] = DERIVED_PROMPTS[name](assessment_type, topic, assessment)
+                derived_containers[name] = st.empty()
+                derived_containers[name].info(f"{icon} Generating {label}...")
+            else:
+                if name in derived:
+                    st.warning(f"⚠️ The {label} could not be generated.")
+                st.button(f"{icon} Generate {label.title()}", key=f"generate_{name}", type="primary",
+                          use_container_width=True, on_click=request_derived, args=(name,))
+    
+    derived_renderers = {}
+    if derived_prompts:
+        use_streaming = saved_assessment['streaming']
+        with st.spinner(f"Generating {' and '.join(DERIVED_LABELS[name][1] for name in derived_prompts)}..."):
+            derived_max_tokens = {name: plan_max_tokens(name, assessment_data, prompt, model_used)
+                                  for name, prompt in derived_prompts.items()}
+            for name, chunk in generate_content_concurrently(derived_prompts, model=model_used, temperature=0.3,
+                                                             max_tokens=derived_max_tokens):
+                if name not in derived_renderers:
+                    derived_renderers[name] = StreamRenderer(
+                        container=derived_containers[name].container(),
+                        header_html=DERIVED_HEADERS[name],
+                        # Without streaming, only render once the artifact is complete
+                        flush_interval=DEFAULT_FLUSH_INTERVAL if use_streaming else float('inf'),
+                        flush_bytes=DEFAULT_FLUSH_BYTES if use_streaming else float('inf')
+                    )
+                if chunk is None:
+                    derived[name] = derived_renderers[name].close()
+                    continue
+                derived_renderers[name].write(chunk)
+    
+    with tab4:
+        st.markdown("### 📈 Assessment Analysis")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("#### Difficulty Distribution")
             
-            with tab4:
-                st.markdown("### 📈 Assessment Analysis")
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("#### Difficulty Distribution")
-                    
-                    # Parse or estimate difficulty distribution
-                    difficulty_map = {
-                        "Very Easy": 20,
-                        "Easy": 20,
-                        "Medium": 30,
-                        "Hard": 20,
-                        "Very Hard": 10
-                    }
-                    
-                    for level, percentage in difficulty_map.items():
-                        st.markdown(f"**{level}**")
-                        st.progress(percentage / 100, text=f"{percentage}%")
-                
-                with col2:
-                    st.markdown("#### Question Type Distribution")
-                    
-                    # Calculate percentages
-                    num_types = len(question_types)
-                    if num_types > 0:
-                        base_percentage = 100 // num_types
-                        remainder = 100 - (base_percentage * num_types)
-                        
-                        for i, q_type in enumerate(question_types):
-                            percentage = base_percentage + (remainder if i == 0 else 0)
-                            st.markdown(f"• {q_type.title()} ({percentage}%)")
-                    
-                    st.markdown(f"**Total Questions:** {num_questions}")
-                    st.markdown(f"**Estimated Time:** {time_limit} minutes")
-                    st.markdown(f"**Questions per minute:** {num_questions/time_limit:.1f}")
-                
-                # Bloom's Taxonomy analysis if requested
-                if include_blooms:
-                    st.markdown("#### 🧠 Bloom's Taxonomy Distribution")
-                    blooms_levels = {
-                        "Remember": 15,
-                        "Understand": 25,
-                        "Apply": 30,
-                        "Analyze": 15,
-                        "Evaluate": 10,
-                        "Create": 5
-                    }
-                    
-                    for level, percentage in blooms_levels.items():
-                        st.markdown(f"**{level}**")
-                        st.progress(percentage / 100, text=f"{percentage}%")
+            # Parse or estimate difficulty distribution
+            difficulty_map = {
+                "Very Easy": 20,
+                "Easy": 20,
+                "Medium": 30,
+                "Hard": 20,
+                "Very Hard": 10
+            }
+            
+            for level, percentage in difficulty_map.items():
+                st.markdown(f"**{level}**")
+                st.progress(percentage / 100, text=f"{percentage}%")
+        
+        with col2:
+            st.markdown("#### Question Type Distribution")
             
-            with tab5:
-                st.markdown("### 💾 Export Options")
+            # Calculate percentages
+            num_types = len(question_types)
+            if num_types > 0:
+                base_percentage = 100 // num_types
+                remainder = 100 - (base_percentage * num_types)
                 
-                # Prepare comprehensive markdown content
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                markdown_content = f"""# {topic} - {assessment_type}
+                for i, q_type in enumerate(question_types):
+                    percentage = base_percentage + (remainder if i == 0 else 0)
+                    st.markdown(f"• {q_type.title()} ({percentage}%)")
+            
+            st.markdown(f"**Total Questions:** {num_questions}")
+            st.markdown(f"**Estimated Time:** {time_limit} minutes")
+            st.markdown(f"**Questions per minute:** {num_questions/time_limit:.1f}")
+        
+        # Bloom's Taxonomy analysis if requested
+        if include_blooms:
+            st.markdown("#### 🧠 Bloom's Taxonomy Distribution")
+            blooms_levels = {
+                "Remember": 15,
+                "Understand": 25,
+                "Apply": 30,
+                "Analyze": 15,
+                "Evaluate": 10,
+                "Create": 5
+            }
+            
+            for level, percentage in blooms_levels.items():
+                st.markdown(f"**{level}**")
+                st.progress(percentage / 100, text=f"{percentage}%")
+    
+    with tab5:
+        st.markdown("### 💾 Export Options")
+        
+        # Prepare comprehensive markdown content
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        markdown_content = f"""# {topic} - {assessment_type}
 
 ## Assessment Overview
 - **Grade Level:** {grade_level}
@@ -443,44 +589,27 @@ Include:
 {assessment}
 
 """
-                
-                if include_answer_key and 'answer_key' in locals():
-                    markdown_content += f"\n## Answer Key\n\n{answer_key}\n"
-                
-                if include_rubric and 'rubric' in locals():
-                    markdown_content += f"\n## Grading Rubric\n\n{rubric}\n"
-                
-                markdown_content += f"""
+        
+        # Only what has been generated is exported; the rest can be generated from its tab first
+        if derived.get('answer_key'):
+            markdown_content += f"\n## Answer Key\n\n{derived['answer_key']}\n"
+        
+        if derived.get('rubric'):
+            markdown_content += f"\n## Grading Rubric\n\n{derived['rubric']}\n"
+        
+        markdown_content += f"""
 ---
-*Generated with OpenAI {model} on {timestamp}*
-*Temperature: {temperature_override}*
+*Generated with OpenAI {model_used} on {timestamp}*
+*Temperature: {temperature_used}*
 """
-                
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.download_button(
-                        label="📥 Download Markdown",
-                        data=markdown_content,
-                        file_name=f"{topic.lower().replace(' ', '_')}_{assessment_type.lower()}.md",
-                        mime="text/markdown",
-                        use_container_width=True
-                    )
-                
-                with col2:
-                    # Plain text version
-                    plain_text = re.sub(r'[#*`]', '', markdown_content)
-                    st.download_button(
-                        label="📄 Plain Text",
-                        data=plain_text,
-                        file_name=f"{topic.lower().replace(' ', '_')}_{assessment_type.lower()}.txt",
-                        mime="text/plain",
-                        use_container_width=True
-                    )
-                
-                with col3:
-                    if st.button("📋 Copy to Clipboard", use_container_width=True):
-                        st.success("✅ Content copied to clipboard!")
+        
+        not_generated = [DERIVED_LABELS[name][1] for name in DERIVED_PROMPTS if not derived.get(name)]
+        if not_generated:
+            st.caption(f"The export leaves out the {' and '.join(not_generated)}; generate them in their tabs to include them.")
+        
+        assessment_export(markdown_content, f"{topic.lower().replace(' ', '_')}_{assessment_type.lower()}")
+
+profile_phase("sidebar")
 
 # Question bank feature in sidebar
 with st.sidebar:
@@ -496,76 +625,19 @@ with st.sidebar:
     st.info(f"""
     **Model:** {model}
     **Temperature:** {temperature}
-    **Max Tokens:** 4000
+    **Max Tokens:** sized per request
+    **Cache:** {cache_stats_summary()}
     """)
     
+    show_background_jobs()
+    
     if 'question_bank' not in st.session_state:
         st.session_state.question_bank = []
     
-    # Quick question generator
-    with st.expander("➕ Add Custom Question", expanded=False):
-        q_topic = st.text_input("Topic", key="q_topic", placeholder="e.g., Algebra")
-        q_type = st.selectbox("Type", ["Multiple Choice", "Short Answer", "Essay", "Problem Solving", "True/False"])
-        q_difficulty = st.select_slider("Difficulty", ["Easy", "Medium", "Hard"])
-        
-        if st.button("Generate Question", use_container_width=True):
-            if q_topic:
-                with st.spinner("Generating..."):
-                    q_prompt = f"""Generate one {q_difficulty} {q_type} question about {q_topic} for {grade_level if 'grade_level' in locals() else 'appropriate'} level.
-                    
-Include:
-1. The question
-2. If multiple choice, provide 4 options
-3. Indicate the correct answer
-"""
-                    if use_streaming:
-                        st.info("Question will appear below...")
-                        question_container = st.empty()
-                        question_full = ""
-                        for chunk in generate_content(q_prompt, model=model, temperature=0.5):
-                            if chunk:
-                                question_full += chunk
-                                question_container.markdown(question_full)
-                        question = question_full
-                    else:
-                        question = generate_content(q_prompt, model=model, temperature=0.5)
-                    
-                    if question:
-                        st.session_state.question_bank.append({
-                            'question': question,
-                            'topic': q_topic,
-                            'type': q_type,
-                            'difficulty': q_difficulty,
-                            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M")
-                        })
-                        st.success("✅ Question added to bank!")
-                        st.rerun()
-    
-    # Display question bank
-    if st.session_state.question_bank:
-        st.markdown("### 📌 Saved Questions")
-        for i, q in enumerate(reversed(st.session_state.question_bank[-5:])):
-            with st.container():
-                difficulty_class = q['difficulty'].lower()
-                st.markdown(f"""
-                <div class="question-card" style="padding: 1rem;">
-                    <span class="difficulty-badge {difficulty_class}">{q['difficulty']}</span>
-                    <span style="color: #666; font-size: 0.85rem;">{q['type']}</span>
-                    <p style="margin-top: 0.5rem;"><strong>{q['topic']}</strong></p>
-                    <p style="font-size: 0.85rem; color: #666;">{q['question'][:100]}...</p>
-                    <p style="font-size: 0.75rem; color: #999;">{q.get('timestamp', '')}</p>
-                </div>
-                """, unsafe_allow_html=True)
-        
-        if len(st.session_state.question_bank) > 5:
-            st.caption(f"... and {len(st.session_state.question_bank) - 5} more questions")
-        
-        if st.button("🗑️ Clear Question Bank", use_container_width=True):
-            st.session_state.question_bank = []
-            st.rerun()
-    else:
-        st.info("No questions saved yet. Generate questions above to build your bank.")
+    question_bank(grade_level or 'appropriate', use_streaming)
 
 # Initialize timestamp if not exists
 if 'timestamp' not in st.session_state:
-    st.session_state.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
\ No newline at end of file
+    st.session_state.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+finish_rerun()
@@ -0,0 +1,168 @@
+import streamlit as st
+import time
+import pandas as pd
+import plotly.express as px
+from utils.telemetry import get_telemetry_store, TELEMETRY_PATH
+from utils.metrics import start_metrics_server
+from utils.profiling import start_rerun, profile_phase, profile_section, finish_rerun
+
+st.set_page_config(page_title="Ops Dashboard", page_icon="📈", layout="wide")
+st.session_state.page = 'ops_dashboard'
+start_metrics_server()
+start_rerun("pages/4_ops_dashboard.py", phase="css")
+
+# Custom CSS for this page
+st.markdown("""
+<style>
+    .ops-header {
+        background: linear-gradient(135deg, #a1c4fd 0%, #c2e9fb 100%);
+        padding: 2rem;
+        border-radius: 20px;
+        color: #2c3e50;
+        text-align: center;
+        margin-bottom: 2rem;
+        box-shadow: 0 10px 30px rgba(161, 196, 253, 0.3);
+    }
+</style>
+""", unsafe_allow_html=True)
+
+# Page header
+st.markdown("""
+<div class="ops-header">
+    <h1>📈 Ops Dashboard</h1>
+    <p>Latency, token usage and errors of every LLM call</p>
+</div>
+""", unsafe_allow_html=True)
+
+# Time window -> (seconds back, resampling bucket)
+TIME_WINDOWS = {
+    "Last hour": (60 * 60, '1min'),
+    "Last 24 hours": (24 * 60 * 60, '15min'),
+    "Last 7 days": (7 * 24 * 60 * 60, '1h'),
+    "All time": (None, '1D'),
+}
+
+with st.sidebar:
+    st.markdown("### 🔎 Filters")
+    window = st.selectbox("Time window", list(TIME_WINDOWS.keys()), index=1)
+    st.caption(f"Events are read from `{TELEMETRY_PATH}`" if TELEMETRY_PATH
+               else "TELEMETRY_PATH is empty, so only this process's events since startup are shown")
+    if st.button("🔄 Refresh", use_container_width=True):
+        st.rerun()
+
+profile_phase("load")
+
+seconds, bucket = TIME_WINDOWS[window]
+with profile_section("parse"):
+    events = get_telemetry_store().read(since=time.time() - seconds if seconds else None)
+if not events:
+    st.info("ℹ️ No LLM calls recorded in this time window yet. Generate something and refresh.")
+    st.stop()
+
+df = pd.DataFrame(events)
+df['time'] = pd.to_datetime(df['ts'], unit='s')
+df['failed'] = df['error'].notna()
+
+with st.sidebar:
+    pages = st.multiselect("Pages", sorted(df['page'].unique()))
+    models = st.multiselect("Models", sorted(df['model'].dropna().unique()))
+if pages:
+    df = df[df['page'].isin(pages)]
+if models:
+    df = df[df['model'].isin(models)]
+if df.empty:
+    st.info("ℹ️ No calls match these filters.")
+    st.stop()
+
+# Latency and tokens only mean something for calls that reached the API
+upstream = df[(df['cache'] == 'miss') & ~df['failed']]
+
+col1, col2, col3, col4, col5 = st.columns(5)
+col1.metric("Calls", f"{len(df):,}")
+col2.metric("Cache hit rate", f"{(df['cache'] != 'miss').mean():.0%}",
+            help="Share of calls served from the response cache or by joining an identical call in flight")
+col3.metric("Error rate", f"{df['failed'].mean():.1%}")
+col4.metric("p50 / p95 latency",
+            f"{upstream['latency_ms'].quantile(0.5) / 1000:.1f} / {upstream['latency_ms'].quantile(0.95) / 1000:.1f} s"
+            if not upstream.empty else "n/a")
+col5.metric("Tokens", f"{int(upstream['prompt_tokens'].fillna(0).sum() + upstream['completion_tokens'].fillna(0).sum()):,}",
+            help="Prompt plus completion tokens of calls that reached the API")
+
+profile_phase("charts")
+
+tab1, tab2, tab3, tab4 = st.tabs(["⏱️ Latency", "🔢 Tokens", "⚠️ Errors", "📋 Calls"])
+
+with tab1:
+    if upstream.empty:
+        st.info("ℹ️ No calls reached the API in this window.")
+    else:
+        latency = (upstream.set_index('time')['latency_ms'].resample(bucket)
+                   .quantile([0.5, 0.95]).unstack().rename(columns={0.5: 'p50', 0.95: 'p95'}) / 1000)
+        fig = px.line(latency.reset_index(), x='time', y=['p50', 'p95'], markers=True,
+                      labels={'value': 'Latency (s)', 'time': '', 'variable': ''},
+                      title="Total latency per call")
+        st.plotly_chart(fig, use_container_width=True)
+
+        streamed = upstream[upstream['streaming'] & upstream['ttft_ms'].notna()]
+        if not streamed.empty:
+            ttft = (streamed.set_index('time')['ttft_ms'].resample(bucket)
+                    .quantile([0.5, 0.95]).unstack().rename(columns={0.5: 'p50', 0.95: 'p95'}))
+            fig = px.line(ttft.reset_index(), x='time', y=['p50', 'p95'], markers=True,
+                          labels={'value': 'Time to first token (ms)', 'time': '', 'variable': ''},
+                          title="Time to first token of streamed calls")
+            st.plotly_chart(fig, use_container_width=True)
+
+with tab2:
+    if upstream.empty:
+        st.info("ℹ️ No calls reached the API in this window.")
+    else:
+        tokens = upstream.groupby('kind')[['prompt_tokens', 'cached_tokens', 'completion_tokens']].sum(min_count=1).fillna(0)
+        tokens['uncached_prompt_tokens'] = tokens['prompt_tokens'] - tokens['cached_tokens']
+        fig = px.bar(tokens.reset_index(), x='kind', y=['uncached_prompt_tokens', 'cached_tokens', 'completion_tokens'],
+                     labels={'value': 'Tokens', 'kind': 'Artifact type', 'variable': ''},
+                     title="Tokens per artifact type")
+        st.plotly_chart(fig, use_container_width=True)
+
+        per_call = upstream.groupby('kind').agg(
+            calls=('kind', 'size'),
+            prompt_tokens=('prompt_tokens', 'mean'),
+            completion_tokens=('completion_tokens', 'mean'),
+            tokens_per_sec=('tokens_per_sec', 'mean'),
+            retries=('retries', 'sum'),
+        ).round(1)
+        st.markdown("#### Average per call")
+        st.dataframe(per_call, use_container_width=True)
+
+with tab3:
+    rates = df.set_index('time').resample(bucket).agg(calls=('failed', 'size'), errors=('failed', 'sum'))
+    rates = rates[rates['calls'] > 0]
+    rates['error_rate'] = rates['errors'] / rates['calls']
+    fig = px.line(rates.reset_index(), x='time', y='error_rate', markers=True,
+                  labels={'error_rate': 'Error rate', 'time': ''}, title="Share of calls that failed")
+    fig.update_yaxes(tickformat='.0%', rangemode='tozero')
+    st.plotly_chart(fig, use_container_width=True)
+
+    retries = df.set_index('time').resample(bucket)[['retries', 'rate_limited']].sum()
+    fig = px.bar(retries.reset_index(), x='time', y=['retries', 'rate_limited'],
+                 labels={'value': 'Count', 'time': '', 'variable': ''}, title="Retries and rate-limit waits")
+    st.plotly_chart(fig, use_container_width=True)
+
+    failures = df[df['failed']].sort_values('time', ascending=False)
+    if not failures.empty:
+        st.markdown("#### Recent errors")
+        st.dataframe(failures[['time', 'page', 'kind', 'model', 'error']].head(50), use_container_width=True,
+                     hide_index=True)
+
+with tab4:
+    columns = ['time', 'page', 'kind', 'model', 'cache', 'streaming', 'prompt_tokens', 'cached_tokens',
+               'completion_tokens', 'ttft_ms', 'latency_ms', 'retries', 'finish_reason', 'error']
+    recent = df.sort_values('time', ascending=False)[columns]
+    st.dataframe(recent.head(500), use_container_width=True, hide_index=True)
+    st.download_button(
+        label="📥 Download CSV",
+        data=recent.to_csv(index=False),
+        file_name="llm_calls.csv",
+        mime="text/csv"
+    )
+
+finish_rerun()
@@ -0,0 +1,53 @@
+import os
+import httpx
+import streamlit as st
+from openai import OpenAI
+
+# Connection pool and timeout settings shared by every session in this process
+POOL_MAX_CONNECTIONS = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", 100))
+POOL_MAX_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", 40))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_POOL_KEEPALIVE_EXPIRY", 60.0))
+
+CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", 10.0))
+READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", 120.0))
+WRITE_TIMEOUT = float(os.getenv("OPENAI_WRITE_TIMEOUT", 30.0))
+POOL_TIMEOUT = float(os.getenv("OPENAI_POOL_TIMEOUT", 30.0))
+
+
+def default_base_url():
+    """Return the configured API base URL, or None for the OpenAI default"""
+    return os.getenv("OPENAI_BASE_URL") or None
+
+
+def _build_http_client():
+    """Create an httpx client with explicit pool limits, keep-alive and timeouts"""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=CONNECT_TIMEOUT,
+            read=READ_TIMEOUT,
+            write=WRITE_TIMEOUT,
+            pool=POOL_TIMEOUT,
+        ),
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_openai_client(api_key, base_url=None):
+    """Return the process-wide OpenAI client for this API key and base URL
+
+    The client (and its warm connection pool) is shared by every browser
+    session using the same credentials instead of being rebuilt per session.
+    """
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=_build_http_client(),
+        # Retries and 429 backoff are coordinated by utils.generation and the
+        # shared rate limiter; SDK-level retries would bypass both
+        max_retries=0,
+    )
@@ -0,0 +1,245 @@
+import json
+import re
+from functools import lru_cache
+from utils.section_index import MODULE_LINE, index_sections
+
+HOURS_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(?:hours?|hrs?)\b', re.IGNORECASE)
+
+# Sent with structured requests so the API only returns syntactically valid JSON
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+MODULE_SCHEMA = {
+    "type": "object",
+    "required": ["number", "title", "topics", "activities", "hours"],
+    "properties": {
+        "number": {"type": "integer"},
+        "title": {"type": "string"},
+        "topics": {"type": "array", "items": {"type": "string"}},
+        "activities": {"type": "array", "items": {"type": "string"}},
+        "hours": {"type": "number"},
+    },
+}
+
+OUTLINE_SCHEMA = {
+    "type": "object",
+    "required": ["description", "objectives", "modules"],
+    "properties": {
+        "description": {"type": "string"},
+        "objectives": {"type": "array", "items": {"type": "string"}},
+        "prerequisites": {"type": "array", "items": {"type": "string"}},
+        "modules": {"type": "array", "items": MODULE_SCHEMA},
+        "assessment": {"type": "array", "items": {"type": "string"}},
+        "materials": {"type": "array", "items": {"type": "string"}},
+        "policies": {"type": "array", "items": {"type": "string"}},
+    },
+}
+
+# Optional list sections of a structured outline and their Markdown headings
+LIST_SECTIONS = (
+    ('objectives', 'Learning Objectives'),
+    ('prerequisites', 'Prerequisites'),
+    ('assessment', 'Assessment Methods'),
+    ('materials', 'Required Materials'),
+    ('policies', 'Course Policies'),
+)
+
+
+class OutlineFormatError(ValueError):
+    """Raised when a structured outline does not match OUTLINE_SCHEMA"""
+
+
+def parse_modules(outline):
+    """Return [{'number', 'title', 'content', 'start', 'end'}] for each module/week in an outline
+
+    start/end delimit the module's full text (heading included) so a single
+    module can be replaced in place with splice_module().
+    """
+    return [{key: module[key] for key in ('number', 'title', 'content', 'start', 'end')}
+            for module in index_sections(outline).modules]
+
+
+def splice_module(outline, module, new_text):
+    """Replace one parsed module's text in the outline, keeping its surrounding spacing"""
+    original = outline[module['start']:module['end']]
+    trailing = original[len(original.rstrip()):]
+    if not trailing and outline[module['end']:].strip():
+        trailing = "\n\n"
+    new_text = new_text.strip()
+    # Keep the module addressable if the model dropped its heading
+    heading = MODULE_LINE.match(new_text)
+    if heading is None or int(heading.group(1)) != module['number']:
+        new_text = original.split('\n', 1)[0].rstrip() + '\n' + new_text
+    return outline[:module['start']] + new_text + trailing + outline[module['end']:]
+
+
+def _strings(data, field, required=False):
+    value = data.get(field)
+    if value is None and not required:
+        return ()
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise OutlineFormatError(f"'{field}' must be a list of strings")
+    return tuple(item.strip() for item in value if item.strip())
+
+
+def _bullets(items):
+    return "\n".join(f"- {item}" for item in items)
+
+
+class Module:
+    """One module/week of a course outline"""
+
+    __slots__ = ('number', 'title', 'topics', 'activities', 'hours', 'content')
+
+    def __init__(self, number, title, topics=(), activities=(), hours=None, content=None):
+        self.number = number
+        self.title = title
+        self.topics = tuple(topics)
+        self.activities = tuple(activities)
+        self.hours = hours
+        self.content = content if content is not None else self._render_body()
+
+    @classmethod
+    def from_dict(cls, data, number=None):
+        """Validate one entry of the schema's modules array"""
+        if not isinstance(data, dict):
+            raise OutlineFormatError("each module must be an object")
+        title = data.get('title')
+        if not isinstance(title, str) or not title.strip():
+            raise OutlineFormatError("each module needs a non-empty 'title'")
+        try:
+            number = int(data.get('number', number))
+            hours = float(data['hours']) if data.get('hours') is not None else None
+        except (TypeError, ValueError):
+            raise OutlineFormatError(f"module '{title}' has a non-numeric 'number' or 'hours'")
+        return cls(number, title.strip(), _strings(data, 'topics', required=True),
+                   _strings(data, 'activities', required=True), hours)
+
+    def _render_body(self):
+        parts = []
+        if self.topics:
+            parts.append(f"**Key topics**\n{_bullets(self.topics)}")
+        if self.activities:
+            parts.append(f"**Learning activities**\n{_bullets(self.activities)}")
+        if self.hours is not None:
+            parts.append(f"**Estimated time:** {self.hours:g} hours")
+        return "\n\n".join(parts)
+
+    def to_dict(self):
+        return {
+            'number': self.number,
+            'title': self.title,
+            'topics': list(self.topics),
+            'activities': list(self.activities),
+            'hours': self.hours,
+        }
+
+    def to_markdown(self):
+        return f"### Module {self.number}: {self.title}\n\n{self.content}".rstrip()
+
+
+class CourseOutline:
+    """Parsed course outline shared by the outline tabs and exports
+
+    Built once per response by load_course_outline(), either from a structured
+    JSON response or, for free-text outlines, from the module headings.
+    """
+
+    __slots__ = ('description', 'objectives', 'prerequisites', 'modules', 'assessment', 'materials', 'policies')
+
+    def __init__(self, description='', objectives=(), prerequisites=(), modules=(), assessment=(),
+                 materials=(), policies=()):
+        self.description = description
+        self.objectives = tuple(objectives)
+        self.prerequisites = tuple(prerequisites)
+        self.modules = tuple(modules)
+        self.assessment = tuple(assessment)
+        self.materials = tuple(materials)
+        self.policies = tuple(policies)
+
+    @classmethod
+    def from_json(cls, text):
+        """Validate a structured outline response against OUTLINE_SCHEMA"""
+        # Tolerate a ```json fence even though JSON mode should not produce one
+        text = text.strip()
+        if text.startswith('```'):
+            text = text.strip('`')
+            text = (text[4:] if text.startswith('json') else text).strip()
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise OutlineFormatError(f"response is not valid JSON ({e})")
+        if not isinstance(data, dict):
+            raise OutlineFormatError("response must be a JSON object")
+        description = data.get('description')
+        if not isinstance(description, str):
+            raise OutlineFormatError("'description' must be a string")
+        if not isinstance(data.get('modules'), list) or not data['modules']:
+            raise OutlineFormatError("'modules' must be a non-empty list")
+        modules = [Module.from_dict(module, number) for number, module in enumerate(data['modules'], 1)]
+        sections = {field: _strings(data, field, required=field == 'objectives') for field, _ in LIST_SECTIONS}
+        return cls(description.strip(), modules=modules, **sections)
+
+    @classmethod
+    def from_markdown(cls, text):
+        """Best-effort model of a free-text outline from its module headings"""
+        modules = []
+        for module in parse_modules(text):
+            hours = HOURS_PATTERN.search(module['title']) or HOURS_PATTERN.search(module['content'])
+            modules.append(Module(module['number'], module['title'],
+                                  hours=float(hours.group(1)) if hours else None, content=module['content']))
+        return cls(modules=modules)
+
+    @property
+    def total_hours(self):
+        return sum(module.hours or 0 for module in self.modules)
+
+    def module(self, number):
+        return next((module for module in self.modules if module.number == number), None)
+
+    def replace_module(self, module):
+        """Return a copy of the outline with one module swapped out"""
+        modules = [module if existing.number == module.number else existing for existing in self.modules]
+        return CourseOutline(self.description, self.objectives, self.prerequisites, modules,
+                             self.assessment, self.materials, self.policies)
+
+    def to_dict(self):
+        data = {'description': self.description, 'modules': [module.to_dict() for module in self.modules]}
+        data.update({field: list(getattr(self, field)) for field, _ in LIST_SECTIONS})
+        return data
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_markdown(self):
+        """Render the outline as Markdown with "Module N: Title" headings"""
+        sections = []
+        if self.description:
+            sections.append(f"## Course Description\n\n{self.description}")
+        for field, heading in LIST_SECTIONS[:2]:
+            if getattr(self, field):
+                sections.append(f"## {heading}\n\n{_bullets(getattr(self, field))}")
+        sections.append("## Course Outline\n\n" + "\n\n".join(module.to_markdown() for module in self.modules))
+        for field, heading in LIST_SECTIONS[2:]:
+            if getattr(self, field):
+                sections.append(f"## {heading}\n\n{_bullets(getattr(self, field))}")
+        return "\n\n".join(sections)
+
+
+@lru_cache(maxsize=64)
+def load_course_outline(text, structured=False):
+    """Parse an outline response once; reruns with the same text reuse the model"""
+    if structured:
+        return CourseOutline.from_json(text)
+    return CourseOutline.from_markdown(text)
+
+
+def parse_module_json(text, number):
+    """Validate a single regenerated module returned in JSON mode"""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise OutlineFormatError(f"response is not valid JSON ({e})")
+    module = Module.from_dict(data, number)
+    # The model may renumber the module; it keeps its place in the outline
+    module.number = number
+    return module
@@ -0,0 +1,444 @@
+import json
+import os
+import time
+from openai import AuthenticationError, RateLimitError
+from utils.cache import get_response_cache, make_cache_key
+from utils.client_pool import default_base_url
+from utils.health import report_auth_failure
+from utils.metrics import STREAMS_IN_FLIGHT
+from utils.prompts import PROMPT_TEMPLATE_VERSION
+from utils.rate_limiter import get_rate_limiter, estimate_tokens
+from utils.single_flight import get_single_flight
+from utils.telemetry import record_call
+
+# Session-free generation core. Nothing here touches st.session_state or
+# renders UI, so it is safe to call from worker threads and scripts; the
+# Streamlit-facing wrappers live in utils/openai_helper.py.
+
+SYSTEM_MESSAGE = "You are an expert curriculum designer and educator. Create detailed, professional, and pedagogically sound educational content."
+DEFAULT_MAX_TOKENS = 4000
+# 429s wait on the shared limiter rather than consuming retries, up to this many times
+RATE_LIMIT_MAX_WAITS = 10
+# Follow-up requests allowed when a response stops at max_tokens (finish_reason "length")
+MAX_CONTINUATIONS = int(os.getenv("OPENAI_MAX_CONTINUATIONS", 2))
+# Characters of the cut-off response sent back as context for a continuation
+CONTINUATION_TAIL_CHARS = 2000
+CONTINUATION_PROMPT = ("Your previous response was cut off at the length limit. Continue exactly where it stops, "
+                       "without repeating any text, adding a preamble or restarting the section.")
+# Continuations sometimes repeat the last few words; overlaps in this range are dropped when stitching
+STITCH_MIN_OVERLAP = 8
+STITCH_MAX_OVERLAP = 400
+# Ask streaming responses for a final usage chunk (exact token counts, including cached
+# prompt tokens); set OPENAI_STREAM_USAGE=0 for servers that reject stream_options
+STREAM_USAGE = os.getenv("OPENAI_STREAM_USAGE", "1") != "0"
+
+
+class GenerationError(Exception):
+    """Raised when a completion could not be produced"""
+
+
+def build_messages(prompt, system_message=SYSTEM_MESSAGE):
+    """Build the chat messages for a single-turn generation"""
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def cache_key_for(prompt, model, temperature, max_tokens=DEFAULT_MAX_TOKENS, system_message=SYSTEM_MESSAGE):
+    """Return the response-cache key for a generation request"""
+    return make_cache_key(model, temperature, system_message, prompt, max_tokens, PROMPT_TEMPLATE_VERSION)
+
+
+def request_key(prompt, model, temperature, max_tokens=DEFAULT_MAX_TOKENS, system_message=SYSTEM_MESSAGE,
+                response_format=None):
+    """Key identical in-flight requests coalesce on: the cache key plus the response format"""
+    key = cache_key_for(prompt, model, temperature, max_tokens=max_tokens, system_message=system_message)
+    if response_format:
+        key += ":" + json.dumps(response_format, sort_keys=True)
+    return key
+
+
+def new_stats(model):
+    """Create the per-call stats record filled in by complete() and stream()"""
+    return {
+        'model': model,
+        'started_at': time.time(),
+        'ttft_ms': None,
+        'latency_ms': None,
+        'prompt_tokens': None,
+        'cached_tokens': None,
+        'completion_tokens': None,
+        'tokens_per_sec': None,
+        'retries': 0,
+        'rate_limited': 0,
+        'rate_limit_wait_ms': 0.0,
+        'finish_reason': None,
+        'continuations': 0,
+        'shared': False,
+    }
+
+
+def _usage_field(record, name):
+    """Read a usage field whether the SDK parsed it into an object or left it a dict"""
+    if isinstance(record, dict):
+        return record.get(name)
+    return getattr(record, name, None)
+
+
+def _record_usage(stats, usage):
+    """Copy prompt and cached-prompt token counts from a response's usage"""
+    stats['prompt_tokens'] = _usage_field(usage, 'prompt_tokens')
+    # Prompt tokens the provider served from its prefix cache; None when it does not report them
+    details = _usage_field(usage, 'prompt_tokens_details')
+    stats['cached_tokens'] = _usage_field(details, 'cached_tokens') if details is not None else None
+
+
+def _finish_stats(stats, request_started, first_token_at, completion_tokens):
+    finished = time.time()
+    stats['latency_ms'] = round((finished - request_started) * 1000, 1)
+    if first_token_at is not None:
+        stats['ttft_ms'] = round((first_token_at - request_started) * 1000, 1)
+    stats['completion_tokens'] = completion_tokens
+    # Throughput is measured over the decode phase, after the first token
+    decode_seconds = finished - (first_token_at or request_started)
+    if completion_tokens and decode_seconds > 0:
+        stats['tokens_per_sec'] = round(completion_tokens / decode_seconds, 1)
+
+
+def _handle_failure(client, error, attempt, max_retries, request_started, stats):
+    """Sleep before the next attempt, or raise GenerationError if there is none"""
+    if isinstance(error, AuthenticationError):
+        # Re-validate the shared credential verdict; a rejected key won't recover by retrying
+        ok, message = report_auth_failure(client.api_key, default_base_url(), failed_at=request_started)
+        if not ok:
+            raise GenerationError(f"Failed to generate content: {message}") from error
+    if attempt >= max_retries - 1:
+        raise GenerationError(f"Failed to generate content after {max_retries} attempts: {str(error)}") from error
+    stats['retries'] += 1
+    if not isinstance(error, AuthenticationError):
+        time.sleep(2 ** attempt)  # Exponential backoff for transient server/network errors
+
+
+def _handle_rate_limit(limiter, error, estimated_tokens, stats):
+    """Hand a 429 to the shared limiter, or raise if waiting cannot help"""
+    headers = error.response.headers if getattr(error, 'response', None) is not None else None
+    limiter.release(estimated_tokens, headers=headers, outcome='rate_limited')
+    if getattr(error, 'code', None) == 'insufficient_quota':
+        raise GenerationError(f"Failed to generate content: {str(error)}") from error
+    stats['rate_limited'] += 1
+    if stats['rate_limited'] > RATE_LIMIT_MAX_WAITS:
+        raise GenerationError(f"Still rate limited after {RATE_LIMIT_MAX_WAITS} waits: {str(error)}") from error
+
+
+def _estimate_request_tokens(messages, max_tokens):
+    """Tokens a request counts against the TPM budget before its usage is known"""
+    return sum(estimate_tokens(message['content']) for message in messages) + max_tokens
+
+
+def continuation_messages(prompt, partial, system_message=SYSTEM_MESSAGE):
+    """Messages asking the model to resume a response that hit the length limit
+
+    Only the tail of the partial response is sent back, so a continuation
+    costs the missing output plus a bounded amount of context.
+    """
+    return build_messages(prompt, system_message) + [
+        {"role": "assistant", "content": partial[-CONTINUATION_TAIL_CHARS:]},
+        {"role": "user", "content": CONTINUATION_PROMPT},
+    ]
+
+
+def _overlap(existing, continuation):
+    """Length of the longest prefix of continuation that repeats the end of existing"""
+    limit = min(len(existing), len(continuation), STITCH_MAX_OVERLAP)
+    for size in range(limit, STITCH_MIN_OVERLAP - 1, -1):
+        if existing.endswith(continuation[:size]):
+            return size
+    return 0
+
+
+def stitch(existing, continuation):
+    """Join a continuation onto the text it continues, dropping any repeated text"""
+    return existing + continuation[_overlap(existing, continuation):]
+
+
+def _merge_round_stats(stats, round_stats):
+    """Fold a continuation round's stats into the stats of the whole generation"""
+    def add(field):
+        if round_stats[field] is not None:
+            stats[field] = (stats[field] or 0) + round_stats[field]
+
+    decode_seconds = 0.0
+    for record in (stats, round_stats):
+        if record['completion_tokens'] and record['tokens_per_sec']:
+            decode_seconds += record['completion_tokens'] / record['tokens_per_sec']
+    for field in ('prompt_tokens', 'cached_tokens', 'completion_tokens', 'latency_ms', 'retries', 'rate_limited', 'rate_limit_wait_ms'):
+        add(field)
+    stats['finish_reason'] = round_stats['finish_reason']
+    stats['continuations'] += 1
+    if stats['completion_tokens'] and decode_seconds > 0:
+        stats['tokens_per_sec'] = round(stats['completion_tokens'] / decode_seconds, 1)
+
+
+def _complete_round(client, messages, model, temperature, max_tokens, max_retries, stats, extra_params):
+    """One blocking request with retries; fills stats for this round"""
+    limiter = get_rate_limiter(model)
+    estimated_tokens = _estimate_request_tokens(messages, max_tokens)
+    attempt = 0
+    while True:
+        stats['rate_limit_wait_ms'] += round(limiter.acquire(estimated_tokens) * 1000, 1)
+        request_started = time.time()
+        try:
+            raw = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **extra_params
+            )
+            response = raw.parse()
+        except RateLimitError as e:
+            _handle_rate_limit(limiter, e, estimated_tokens, stats)
+            continue
+        except Exception as e:
+            limiter.release(estimated_tokens, outcome='error')
+            _handle_failure(client, e, attempt, max_retries, request_started, stats)
+            attempt += 1
+            continue
+        
+        usage = getattr(response, 'usage', None)
+        limiter.release(estimated_tokens, actual_tokens=usage.total_tokens if usage is not None else None,
+                        headers=raw.headers)
+        content = response.choices[0].message.content if response else None
+        if usage is not None:
+            _record_usage(stats, usage)
+        stats['finish_reason'] = response.choices[0].finish_reason if response else None
+        _finish_stats(stats, request_started, None,
+                      usage.completion_tokens if usage is not None else None)
+        # A blocking call delivers everything at once, so TTFT equals total latency
+        stats['ttft_ms'] = stats['latency_ms']
+        return content
+
+
+def complete(client, prompt, model="gpt-3.5-turbo", temperature=0.7, max_tokens=DEFAULT_MAX_TOKENS,
+             max_retries=3, system_message=SYSTEM_MESSAGE, stats=None, response_format=None,
+             max_continuations=MAX_CONTINUATIONS):
+    """Return the full completion for prompt, retrying transient failures
+
+    Requests queue on the shared per-model rate limiter; 429 responses wait for
+    the server's Retry-After instead of consuming retry attempts. Pass
+    response_format={"type": "json_object"} to request JSON output. A response
+    cut off at max_tokens is resumed with up to max_continuations follow-up
+    requests and stitched together. JSON responses are not continued, since
+    each round would be a fresh object that cannot be stitched on; they come
+    back truncated with stats['finish_reason'] == 'length' instead.
+    """
+    stats = stats if stats is not None else new_stats(model)
+    extra_params = {'response_format': response_format} if response_format else {}
+    if response_format:
+        max_continuations = 0
+    content = _complete_round(client, build_messages(prompt, system_message), model, temperature, max_tokens,
+                              max_retries, stats, extra_params)
+    while content and stats['finish_reason'] == 'length' and stats['continuations'] < max_continuations:
+        round_stats = new_stats(model)
+        part = _complete_round(client, continuation_messages(prompt, content, system_message), model,
+                               temperature, max_tokens, max_retries, round_stats, extra_params)
+        _merge_round_stats(stats, round_stats)
+        if not part:
+            break
+        content = stitch(content, part)
+    return content
+
+
+def _stream_round(client, messages, model, temperature, max_tokens, max_retries, stats):
+    """One streaming request; yields deltas and fills stats for this round"""
+    limiter = get_rate_limiter(model)
+    estimated_tokens = _estimate_request_tokens(messages, max_tokens)
+    prompt_tokens = estimated_tokens - max_tokens
+    attempt = 0
+    while True:
+        stats['rate_limit_wait_ms'] += round(limiter.acquire(estimated_tokens) * 1000, 1)
+        request_started = time.time()
+        first_token_at = None
+        deltas = 0
+        headers = None
+        usage = None
+        try:
+            raw = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                **({'extra_body': {'stream_options': {'include_usage': True}}} if STREAM_USAGE else {})
+            )
+            headers = raw.headers
+            for chunk in raw.parse():
+                # With include_usage the last chunk carries the usage and no choices
+                usage = getattr(chunk, 'usage', None) or usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    stats['finish_reason'] = choice.finish_reason
+                if choice.delta.content:
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                    # Each streamed delta carries roughly one token
+                    deltas += 1
+                    yield choice.delta.content
+        except RateLimitError as e:
+            _handle_rate_limit(limiter, e, estimated_tokens, stats)
+            continue
+        except Exception as e:
+            limiter.release(estimated_tokens, actual_tokens=prompt_tokens + deltas, headers=headers, outcome='error')
+            if first_token_at is not None:
+                _finish_stats(stats, request_started, first_token_at, deltas)
+                raise GenerationError(f"Stream interrupted: {str(e)}") from e
+            _handle_failure(client, e, attempt, max_retries, request_started, stats)
+            attempt += 1
+            continue
+        except GeneratorExit:
+            # The consumer stopped reading; give the slot back before closing
+            limiter.release(estimated_tokens, actual_tokens=prompt_tokens + deltas, headers=headers, outcome='error')
+            raise
+        
+        if usage is not None:
+            _record_usage(stats, usage)
+            completion_tokens = _usage_field(usage, 'completion_tokens') or deltas
+        else:
+            stats['prompt_tokens'] = prompt_tokens
+            completion_tokens = deltas
+        limiter.release(estimated_tokens, actual_tokens=(stats['prompt_tokens'] or prompt_tokens) + completion_tokens,
+                        headers=headers)
+        _finish_stats(stats, request_started, first_token_at, completion_tokens)
+        return
+
+
+def stream(client, prompt, model="gpt-3.5-turbo", temperature=0.7, max_tokens=DEFAULT_MAX_TOKENS,
+           max_retries=3, system_message=SYSTEM_MESSAGE, stats=None, max_continuations=MAX_CONTINUATIONS):
+    """Yield content deltas as they arrive, filling `stats` when the stream ends
+
+    Failures before the first token are retried; once output has been yielded
+    a retry would duplicate text, so the error is raised instead. The limiter
+    slot is held for the whole stream. A stream cut off at max_tokens carries
+    on with continuation requests; their first characters are held back until
+    any text repeated from the end of the previous part can be dropped.
+    """
+    stats = stats if stats is not None else new_stats(model)
+    parts = []
+    for delta in _stream_round(client, build_messages(prompt, system_message), model, temperature,
+                               max_tokens, max_retries, stats):
+        parts.append(delta)
+        yield delta
+
+    while stats['finish_reason'] == 'length' and stats['continuations'] < max_continuations:
+        content = "".join(parts)
+        round_stats = new_stats(model)
+        pending = ""  # continuation text held back until its overlap is known
+        for delta in _stream_round(client, continuation_messages(prompt, content, system_message), model,
+                                   temperature, max_tokens, max_retries, round_stats):
+            if pending is None:
+                parts.append(delta)
+                yield delta
+                continue
+            pending += delta
+            if len(pending) >= STITCH_MAX_OVERLAP:
+                pending = pending[_overlap(content, pending):]
+                parts.append(pending)
+                yield pending
+                pending = None
+        if pending:
+            pending = pending[_overlap(content, pending):]
+            parts.append(pending)
+            yield pending
+        _merge_round_stats(stats, round_stats)
+        if round_stats['completion_tokens'] == 0:
+            break
+
+
+def stream_shared(client, prompt, model="gpt-3.5-turbo", temperature=0.7, max_tokens=DEFAULT_MAX_TOKENS,
+                  max_retries=3, system_message=SYSTEM_MESSAGE, stats=None, max_continuations=MAX_CONTINUATIONS,
+                  labels=None):
+    """stream() coalesced with identical streams already in flight
+
+    Every subscriber receives the same deltas from a single upstream call.
+    stats is filled for the caller that started the call; callers that
+    attached to it only get stats['shared'] set. The upstream call is cached
+    and recorded in the telemetry store with labels from the thread that
+    reads it, so it is kept even if every subscriber stops reading early;
+    subscribers that attached to it record a 'shared' event of their own.
+    """
+    stats = stats if stats is not None else new_stats(model)
+    started = []
+
+    def start():
+        started.append(True)
+        return stream(client, prompt, model=model, temperature=temperature, max_tokens=max_tokens,
+                      max_retries=max_retries, system_message=system_message, stats=stats,
+                      max_continuations=max_continuations)
+
+    def on_finish(deltas, error):
+        content = "".join(deltas)
+        if error is None and content:
+            get_response_cache().set(cache_key_for(prompt, model, temperature, max_tokens=max_tokens,
+                                                   system_message=system_message), content)
+        record_call(stats, 'miss', labels, error=error, streaming=True)
+
+    key = request_key(prompt, model, temperature, max_tokens=max_tokens, system_message=system_message)
+    STREAMS_IN_FLIGHT.inc()
+    try:
+        _, shared = yield from get_single_flight().stream(key, start, context=stats, on_finish=on_finish,
+                                                          stopped_error=GenerationError)
+    except GenerationError as e:
+        # The upstream failure itself was recorded by on_finish
+        if not started:
+            record_call(stats, 'shared', labels, error=e, streaming=True)
+        raise
+    finally:
+        STREAMS_IN_FLIGHT.dec()
+    stats['shared'] = shared
+    if shared:
+        record_call(stats, 'shared', labels, streaming=True)
+
+
+def complete_cached(client, prompt, model="gpt-3.5-turbo", temperature=0.7, max_retries=3,
+                    use_cache=True, stats=None, max_tokens=DEFAULT_MAX_TOKENS, response_format=None,
+                    max_continuations=MAX_CONTINUATIONS, system_message=SYSTEM_MESSAGE, labels=None):
+    """complete() behind the shared response cache; returns (content, cache_status)
+
+    Identical requests already in flight are joined rather than sent again;
+    they return a cache_status of 'shared'. Every call, including cache hits
+    and failures, is recorded in the telemetry store with labels.
+    """
+    stats = stats if stats is not None else new_stats(model)
+    cache = get_response_cache()
+    cache_key = cache_key_for(prompt, model, temperature, max_tokens=max_tokens, system_message=system_message)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record_call(stats, 'hit', labels)
+            return cached, 'hit'
+
+    def call():
+        content = complete(client, prompt, model=model, temperature=temperature, max_tokens=max_tokens,
+                           max_retries=max_retries, system_message=system_message, stats=stats,
+                           response_format=response_format, max_continuations=max_continuations)
+        # A truncated JSON response can never parse, so it is not worth serving again
+        if content and not (response_format and stats['finish_reason'] == 'length'):
+            cache.set(cache_key, content)
+        return content
+
+    key = request_key(prompt, model, temperature, max_tokens=max_tokens, system_message=system_message,
+                      response_format=response_format)
+    try:
+        content, _, shared = get_single_flight().do(key, call, context=stats)
+    except GenerationError as e:
+        record_call(stats, 'miss', labels, error=e)
+        raise
+    if shared:
+        stats['shared'] = True
+        record_call(stats, 'shared', labels)
+        return content, 'shared'
+    record_call(stats, 'miss', labels)
+    return content, 'miss'
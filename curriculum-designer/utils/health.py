@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+import time
+from openai import AuthenticationError, PermissionDeniedError
+from utils.client_pool import get_openai_client
+
+# How long a verdict is trusted before the next check re-validates it
+HEALTH_TTL_SECONDS = float(os.getenv("OPENAI_HEALTH_TTL", 15 * 60))
+# Transient failures (network, 5xx) are only remembered briefly
+HEALTH_ERROR_TTL_SECONDS = float(os.getenv("OPENAI_HEALTH_ERROR_TTL", 30))
+
+_verdicts = {}  # credential id -> (checked_at, ok, message, ttl)
+_verdicts_lock = threading.Lock()
+_check_locks = {}
+
+
+def _credential_id(api_key, base_url):
+    """Identify a credential without keeping the raw key as a dict key"""
+    return hashlib.sha256(f"{base_url or ''}|{api_key}".encode('utf-8')).hexdigest()
+
+
+def _lock_for(credential_id):
+    with _verdicts_lock:
+        return _check_locks.setdefault(credential_id, threading.Lock())
+
+
+def _cached_verdict(credential_id):
+    with _verdicts_lock:
+        verdict = _verdicts.get(credential_id)
+    if verdict is None:
+        return None
+    checked_at, ok, message, ttl = verdict
+    if time.time() - checked_at > ttl:
+        return None
+    return ok, message
+
+
+def _validate(api_key, base_url):
+    """Probe the endpoint with a token-free call and classify the outcome"""
+    client = get_openai_client(api_key, base_url)
+    try:
+        # Listing models authenticates the key without spending completion tokens
+        client.models.list()
+        return True, "Credentials verified", HEALTH_TTL_SECONDS
+    except (AuthenticationError, PermissionDeniedError) as e:
+        return False, f"Invalid API key: {str(e)}", HEALTH_TTL_SECONDS
+    except Exception as e:
+        return False, f"Could not reach the OpenAI endpoint: {str(e)}", HEALTH_ERROR_TTL_SECONDS
+
+
+def _store_verdict(credential_id, ok, message, ttl):
+    with _verdicts_lock:
+        _verdicts[credential_id] = (time.time(), ok, message, ttl)
+
+
+def check_credentials(api_key, base_url=None, force=False):
+    """Return (ok, message) for a credential, validating at most once per TTL
+
+    Verdicts are shared by every session in the process, and concurrent
+    callers for the same credential wait on a single validation request.
+    """
+    if not api_key:
+        return False, "No API key provided"
+
+    credential_id = _credential_id(api_key, base_url)
+    if not force:
+        verdict = _cached_verdict(credential_id)
+        if verdict is not None:
+            return verdict
+
+    with _lock_for(credential_id):
+        # Another session may have finished validating while we waited
+        if not force:
+            verdict = _cached_verdict(credential_id)
+            if verdict is not None:
+                return verdict
+        ok, message, ttl = _validate(api_key, base_url)
+        _store_verdict(credential_id, ok, message, ttl)
+        return ok, message
+
+
+def report_auth_failure(api_key, base_url=None, failed_at=None):
+    """Re-validate a credential after a real request was rejected as unauthorized
+
+    Only the first failure re-validates: verdicts recorded after the failed
+    request was sent are reused by every other session that hit the same error.
+    """
+    failed_at = failed_at or time.time()
+    credential_id = _credential_id(api_key, base_url)
+    with _lock_for(credential_id):
+        with _verdicts_lock:
+            verdict = _verdicts.get(credential_id)
+        if verdict is not None and verdict[0] >= failed_at:
+            return verdict[1], verdict[2]
+        ok, message, ttl = _validate(api_key, base_url)
+        _store_verdict(credential_id, ok, message, ttl)
+        return ok, message
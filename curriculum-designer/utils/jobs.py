@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.rate_limiter import MAX_CONCURRENCY
+
+# Background jobs outlive the script run that started them: a rerun or page
+# switch only drops the page's view of a job, while the worker keeps going
+# and its result is kept in memory for the page to pick up later. Pages only
+# hold job IDs in session state, which a restart loses anyway, so jobs are
+# not written to disk.
+
+# Shared by every session; the rate limiter already caps concurrent API calls,
+# so by default there is one worker per call it can let through
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", MAX_CONCURRENCY))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 24 * 60 * 60))
+FINISHED_STATUSES = ('done', 'failed')
+
+
+class JobContext:
+    """Handed to a job's work function to report output and progress from the worker thread"""
+
+    __slots__ = ('_runner', '_job_id')
+
+    def __init__(self, runner, job_id):
+        self._runner = runner
+        self._job_id = job_id
+
+    def write(self, text):
+        """Append streamed output that pages can show before the job finishes"""
+        self._runner._update(self._job_id, chunk=text)
+
+    def progress(self, fraction, text=""):
+        self._runner._update(self._job_id, progress=[round(fraction, 3), text])
+
+    def notice(self, message):
+        """Record a warning for the page to show when it collects the job"""
+        self._runner._update(self._job_id, notice=message)
+
+
+class JobRunner:
+    """Thread-pool job executor that keeps finished jobs for the retention period"""
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, retention_seconds=JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._chunks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, label, work, meta=None):
+        """Queue work(context) and return the new job's ID
+
+        work runs on a worker thread and must not touch Streamlit; its return
+        value becomes the job's result.
+        """
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'label': label,
+            'status': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'progress': None,
+            'notices': [],
+            'result': None,
+            'error': None,
+            'meta': meta or {},
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._chunks[job_id] = []
+        self._executor.submit(self._run, job_id, work)
+        return job_id
+
+    def get(self, job_id, since=0):
+        """Snapshot of a job, or None if it is unknown
+
+        'output' holds the streamed text written after the first `since`
+        chunks and 'chunks' the total written so far, so callers can poll
+        incrementally.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            chunks = self._chunks.get(job_id, [])
+            snapshot = dict(job, notices=list(job['notices']))
+            snapshot['output'] = "".join(chunks[since:])
+            snapshot['chunks'] = len(chunks)
+            return snapshot
+
+    def _run(self, job_id, work):
+        self._update(job_id, status='running', started_at=time.time())
+        try:
+            result = work(JobContext(self, job_id))
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e) or type(e).__name__, finished_at=time.time())
+        else:
+            self._update(job_id, status='done', result=result, finished_at=time.time())
+
+    def _update(self, job_id, chunk=None, notice=None, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if chunk:
+                self._chunks[job_id].append(chunk)
+            if notice:
+                job['notices'].append(notice)
+            job.update(fields)
+
+    def _prune(self):
+        """Forget finished jobs past the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['status'] in FINISHED_STATUSES and job['finished_at'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+                del self._chunks[job_id]
+
+
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """Return the process-wide job runner, creating it on first use"""
+    global _job_runner
+    if _job_runner is None:
+        with _job_runner_lock:
+            if _job_runner is None:
+                _job_runner = JobRunner()
+    return _job_runner
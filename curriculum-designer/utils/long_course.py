@@ -0,0 +1,146 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.course_model import JSON_RESPONSE_FORMAT, CourseOutline, Module, OutlineFormatError, LIST_SECTIONS
+from utils.generation import GenerationError, new_stats, complete_cached
+from utils.prompts import format_course_skeleton, format_module_expansion
+from utils.token_budget import plan_tokens, module_count
+
+# Long courses are generated as a compact skeleton, then expanded a few modules per request
+MODULES_PER_BATCH = int(os.getenv("LONG_COURSE_MODULES_PER_BATCH", 4))
+# Expansion batches in flight at once; the shared rate limiter still governs actual concurrency
+MAX_WORKERS = int(os.getenv("LONG_COURSE_MAX_WORKERS", 16))
+# Courses with more modules than this are generated in long-course mode automatically
+LONG_COURSE_THRESHOLD = 12
+
+
+def parse_skeleton(text, expected_modules):
+    """Validate a skeleton response: course sections plus numbered module titles and objectives"""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise OutlineFormatError(f"skeleton is not valid JSON ({e})")
+    if not isinstance(data, dict) or not isinstance(data.get('modules'), list) or not data['modules']:
+        raise OutlineFormatError("skeleton must be an object with a non-empty 'modules' list")
+    modules = []
+    for number, module in enumerate(data['modules'][:expected_modules], 1):
+        if not isinstance(module, dict) or not str(module.get('title') or '').strip():
+            raise OutlineFormatError(f"skeleton module {number} needs a 'title'")
+        objectives = module.get('objectives') or []
+        modules.append({
+            'number': number,
+            'title': str(module['title']).strip(),
+            'objectives': [str(objective) for objective in objectives] if isinstance(objectives, list) else [],
+        })
+    data['modules'] = modules
+    return data
+
+
+def _expand_batch(client, course_data, style, skeleton, batch, model, temperature, use_cache, labels=None):
+    """Expand one batch of skeleton modules; returns (modules, stats, error)"""
+    prompt = format_module_expansion(course_data, style, skeleton, batch)
+    budget = plan_tokens('expansion', {'modules': len(batch)}, prompt, model=model)
+    stats = new_stats(model)
+    try:
+        content, _ = complete_cached(client, prompt, model=model, temperature=temperature, use_cache=use_cache,
+                                     stats=stats, max_tokens=budget['max_tokens'],
+                                     response_format=JSON_RESPONSE_FORMAT, labels=labels)
+        returned = json.loads(content or '{}').get('modules')
+        if not isinstance(returned, list):
+            raise OutlineFormatError("expansion must be an object with a 'modules' list")
+        expanded = {}
+        for entry in returned:
+            module = Module.from_dict(entry)
+            expanded[module.number] = module
+    except (GenerationError, OutlineFormatError, ValueError, AttributeError) as e:
+        return [], stats, str(e)
+
+    modules, missing = [], []
+    for planned in batch:
+        module = expanded.get(planned['number'])
+        if module is None:
+            missing.append(planned['number'])
+            continue
+        # Keep the skeleton's title so the merged outline matches the plan
+        modules.append(Module(planned['number'], planned['title'], module.topics, module.activities, module.hours))
+    error = f"no expansion returned for module(s) {', '.join(map(str, missing))}" if missing else None
+    return modules, stats, error
+
+
+def _skeleton_module(planned):
+    """Fallback for a module whose expansion failed: its skeleton objectives as topics"""
+    return Module(planned['number'], planned['title'], topics=planned['objectives'])
+
+
+def generate_long_course(client, course_data, style, model="gpt-3.5-turbo", temperature=0.7,
+                         batch_size=MODULES_PER_BATCH, max_workers=MAX_WORKERS, use_cache=True, labels=None):
+    """Generate a long course outline map-reduce style, yielding progress events
+
+    One request produces a skeleton of module titles and objectives; the
+    modules are then expanded in parallel batches and merged into a
+    CourseOutline with the sections COURSE_OUTLINE_INSTRUCTIONS asks for. Wall time
+    is the skeleton plus the slowest batch rather than the whole course.
+
+    Events are dicts with a 'stage' of 'skeleton', 'batch' (one per finished
+    batch, with its modules and any error) and finally 'done' with the outline.
+    Raises GenerationError or OutlineFormatError if the skeleton fails.
+    labels are recorded with every call in the telemetry store.
+    """
+    count = module_count(course_data)
+    prompt = format_course_skeleton(course_data, style, count)
+    budget = plan_tokens('skeleton', course_data, prompt, model=model)
+    skeleton_text, _ = complete_cached(client, prompt, model=model, temperature=temperature, use_cache=use_cache,
+                                       max_tokens=budget['max_tokens'], response_format=JSON_RESPONSE_FORMAT,
+                                       labels=labels)
+    skeleton = parse_skeleton(skeleton_text or '', count)
+    planned = skeleton['modules']
+    yield {'stage': 'skeleton', 'skeleton': skeleton}
+
+    batches = [planned[start:start + batch_size] for start in range(0, len(planned), batch_size)]
+    expanded = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = {executor.submit(_expand_batch, client, course_data, style, skeleton, batch, model,
+                                   temperature, use_cache, labels): batch
+                   for batch in batches}
+        for finished, future in enumerate(as_completed(futures), 1):
+            batch = futures[future]
+            modules, stats, error = future.result()
+            expanded.update((module.number, module) for module in modules)
+            yield {'stage': 'batch', 'completed': finished, 'total': len(batches),
+                   'modules': [module['number'] for module in batch], 'error': error, 'stats': stats}
+
+    sections = {field: [str(item) for item in skeleton[field] if str(item).strip()]
+                for field, _ in LIST_SECTIONS if isinstance(skeleton.get(field), list)}
+    outline = CourseOutline(
+        str(skeleton.get('description') or '').strip(),
+        modules=[expanded.get(module['number']) or _skeleton_module(module) for module in planned],
+        **sections
+    )
+    yield {'stage': 'done', 'outline': outline,
+           'missing': [module['number'] for module in planned if module['number'] not in expanded]}
+
+
+def long_course_work(client, course_data, style, model="gpt-3.5-turbo", temperature=0.7, labels=None):
+    """Background job body for generate_long_course(), reporting progress per batch
+
+    The result has the outline's Markdown as 'content' and its JSON as 'structured'.
+    """
+    def work(job):
+        job.progress(0.0, "🗺️ Planning the course skeleton...")
+        outline = None
+        for event in generate_long_course(client, course_data, style, model=model, temperature=temperature,
+                                          labels=labels):
+            if event['stage'] == 'skeleton':
+                job.progress(0.1, f"✍️ Expanding {len(event['skeleton']['modules'])} modules...")
+            elif event['stage'] == 'batch':
+                job.progress(0.1 + 0.9 * event['completed'] / event['total'],
+                             f"✍️ Expanded {event['completed']} of {event['total']} module batches")
+                if event['error']:
+                    job.notice(f"Modules {event['modules'][0]}-{event['modules'][-1]}: {event['error']}")
+            else:
+                outline = event['outline']
+                if event['missing']:
+                    job.notice(f"These modules only have their skeleton objectives: "
+                               f"{', '.join(map(str, event['missing']))}. Use their Edit buttons to regenerate them.")
+        return {'content': outline.to_markdown(), 'structured': outline.to_json(), 'cache_status': 'miss', 'stats': None}
+    return work
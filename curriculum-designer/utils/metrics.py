@@ -0,0 +1,239 @@
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.cache import get_response_cache
+from utils.single_flight import get_single_flight
+
+# Prometheus metrics for the generation layer, served in the text exposition
+# format by a small HTTP listener on a side port. Samples are kept in memory
+# and updated from record_call() in utils/telemetry.py, so a scrape only
+# formats counters that already exist and never touches the API or disk.
+
+# Set METRICS_PORT="" (or 0) to disable the listener
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464) or 0)
+# Loopback only by default; set METRICS_HOST=0.0.0.0 to let a scraper on another host in
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Scrapes within this many seconds of each other share one rendering
+METRICS_RENDER_TTL = float(os.getenv("METRICS_RENDER_TTL", 1.0))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    """A sample value or bucket bound; floats keep full precision"""
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_format_value(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names
+
+    Pass read= to report a value another component already keeps, computed
+    at scrape time, instead of counting with inc().
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=(), read=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._read = read
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        if self._read is not None:
+            return [(self.name, "", self._read())]
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in values]
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        samples = []
+        for key, values in series:
+            for bound, count in zip(self.buckets, values):
+                samples.append((f"{self.name}_bucket", _format_labels(self.labels, key, [('le', bound)]), count))
+            samples.append((f"{self.name}_bucket", _format_labels(self.labels, key, [('le', math.inf)]), values[-2]))
+            samples.append((f"{self.name}_count", _format_labels(self.labels, key), values[-2]))
+            samples.append((f"{self.name}_sum", _format_labels(self.labels, key), values[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """The metrics of one process, rendered in the Prometheus text format"""
+
+    def __init__(self, render_ttl=METRICS_RENDER_TTL):
+        self.render_ttl = render_ttl
+        self._metrics = []
+        self._rendered = (0.0, b"")
+        self._render_lock = threading.Lock()
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """The exposition text, re-rendered at most once per render_ttl seconds"""
+        with self._render_lock:
+            rendered_at, body = self._rendered
+            now = time.monotonic()
+            if now - rendered_at < self.render_ttl and body:
+                return body
+            lines = []
+            for metric in self._metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples())
+            body = ("\n".join(lines) + "\n").encode('utf-8')
+            self._rendered = (now, body)
+            return body
+
+
+REGISTRY = MetricsRegistry()
+REQUESTS = REGISTRY.add(Counter(
+    "llm_requests_total", "LLM generation calls by cache outcome (hit, miss, shared) and status (ok, error)",
+    ('model', 'kind', 'cache', 'status')))
+LATENCY = REGISTRY.add(Histogram(
+    "llm_request_latency_seconds", "Total latency of LLM calls that reached the API", LATENCY_BUCKETS, ('model',)))
+TTFT = REGISTRY.add(Histogram(
+    "llm_time_to_first_token_seconds", "Time to first token of streamed LLM calls", TTFT_BUCKETS, ('model',)))
+PROMPT_TOKENS = REGISTRY.add(Counter("llm_prompt_tokens_total", "Prompt tokens sent", ('model', 'kind')))
+CACHED_TOKENS = REGISTRY.add(Counter(
+    "llm_cached_prompt_tokens_total", "Prompt tokens served from the provider's prompt cache", ('model', 'kind')))
+COMPLETION_TOKENS = REGISTRY.add(Counter("llm_completion_tokens_total", "Completion tokens received", ('model', 'kind')))
+RETRIES = REGISTRY.add(Counter("llm_retries_total", "Retried attempts after transient API errors", ('model',)))
+RATE_LIMIT_WAITS = REGISTRY.add(Counter("llm_rate_limit_waits_total", "429 responses that were waited out", ('model',)))
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.add(Counter(
+    "llm_rate_limit_wait_seconds_total", "Time spent waiting on the shared rate limiter before sending", ('model',)))
+STREAMS_IN_FLIGHT = REGISTRY.add(Gauge("llm_streams_in_flight", "Streams currently being read by a caller"))
+REGISTRY.add(Gauge("llm_upstream_calls_in_flight", "Distinct upstream calls in flight after coalescing",
+                   read=lambda: get_single_flight().in_flight()))
+REGISTRY.add(Counter("llm_coalesced_requests_total", "Requests that joined an identical call already in flight",
+                   read=lambda: get_single_flight().coalesced))
+REGISTRY.add(Counter("llm_response_cache_hits_total", "Response cache hits, in memory or on disk",
+                   read=lambda: get_response_cache().stats()['hits']))
+REGISTRY.add(Counter("llm_response_cache_misses_total", "Response cache misses",
+                   read=lambda: get_response_cache().stats()['misses']))
+REGISTRY.add(Gauge("llm_response_cache_entries", "Responses currently cached in memory",
+                   read=lambda: get_response_cache().stats()['entries']))
+
+
+def observe_call(event):
+    """Update the metrics from one telemetry event (see record_call)"""
+    model, kind = event.get('model') or 'unknown', event.get('kind') or 'other'
+    REQUESTS.inc(model=model, kind=kind, cache=event['cache'], status='error' if event.get('error') else 'ok')
+    if event.get('latency_ms') is not None and not event.get('error'):
+        LATENCY.observe(event['latency_ms'] / 1000, model=model)
+    if event.get('streaming') and event.get('ttft_ms') is not None:
+        TTFT.observe(event['ttft_ms'] / 1000, model=model)
+    for counter, field in ((PROMPT_TOKENS, 'prompt_tokens'), (CACHED_TOKENS, 'cached_tokens'),
+                           (COMPLETION_TOKENS, 'completion_tokens')):
+        if event.get(field):
+            counter.inc(event[field], model=model, kind=kind)
+    if event.get('retries'):
+        RETRIES.inc(event['retries'], model=model)
+    if event.get('rate_limited'):
+        RATE_LIMIT_WAITS.inc(event['rate_limited'], model=model)
+    if event.get('rate_limit_wait_ms'):
+        RATE_LIMIT_WAIT_SECONDS.inc(event['rate_limit_wait_ms'] / 1000, model=model)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would otherwise log a line each to stderr
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on a daemon thread, once per process; returns the port or None
+
+    Safe to call on every script run. If the port is taken (e.g. by another
+    app process on the same host) the listener is skipped and None returned.
+    """
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                _server = False
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server.server_address[1] if _server else None
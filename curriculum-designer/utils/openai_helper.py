@@ -1,337 +1,402 @@
 import streamlit as st
-from openai import OpenAI
+import queue
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from utils.cache import get_response_cache
+from utils.client_pool import get_openai_client, default_base_url
+from utils.generation import (
+    DEFAULT_MAX_TOKENS, GenerationError, cache_key_for, new_stats, complete_cached, stream_shared
+)
+from utils.health import check_credentials
+from utils.jobs import FINISHED_STATUSES, get_job_runner
+from utils.single_flight import get_single_flight
+from utils.telemetry import record_call
+from utils.token_budget import plan_tokens
 
-def generate_content(prompt, model="gpt-3.5-turbo", temperature=0.7, max_retries=3):
-    """Generate content using OpenAI with retry logic"""
+# Per-call stats copied into the session history alongside each artifact
+STATS_FIELDS = ('ttft_ms', 'latency_ms', 'prompt_tokens', 'cached_tokens', 'completion_tokens', 'tokens_per_sec', 'retries', 'continuations', 'finish_reason')
+# A single module is a small slice of an outline, so it gets a much smaller output budget
+MODULE_MAX_TOKENS = 1000
+# Seconds between checks while a page follows a background job
+JOB_POLL_INTERVAL = 0.2
+
+def _prompt_preview(prompt, length=100):
+    """Start of a prompt's per-request part; the static prefix before it is the same for every request"""
+    text = " ".join(prompt.rpartition("specifications:")[2].split())
+    return text[:length] + '...' if len(text) > length else text
+
+def record_generation(prompt, content, model, temperature, cache_status, stats=None):
+    """Save generated content and its metadata to session state"""
+    content_id = f"Content_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    metadata = {
+        'content': content,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'prompt': _prompt_preview(prompt),
+        'model': model,
+        'temperature': temperature,
+        'cache': cache_status
+    }
+    if stats:
+        metadata.update({field: stats.get(field) for field in STATS_FIELDS})
+    st.session_state.generated_content[content_id] = metadata
+    st.session_state.last_generation = metadata
+    return content_id
+
+def telemetry_labels(kind=None):
+    """Labels recorded with each LLM call: the artifact kind and the page it was made from"""
+    return {'page': st.session_state.get('page', 'home'), 'kind': kind}
+
+def _record_streamed(prompt, content, model, temperature, stats):
+    """Record a finished stream; one that joined another caller's stream has no stats of its own"""
+    if stats['shared']:
+        record_generation(prompt, content, model, temperature, cache_status='shared')
+        return
+    record_generation(prompt, content, model, temperature, cache_status='miss', stats=stats)
+    _warn_if_truncated(stats)
+
+def generate_content(prompt, model="gpt-3.5-turbo", temperature=0.7, max_retries=3, use_cache=True,
+                     max_tokens=DEFAULT_MAX_TOKENS, response_format=None, kind=None):
+    """Generate content using OpenAI with retry logic and response caching
+
+    kind names the artifact in telemetry (e.g. 'module' or 'question').
+    """
     
     if not st.session_state.client:
         st.error("OpenAI client not initialized. Please check your API key.")
         return None
     
-    for attempt in range(max_retries):
-        try:
-            with st.spinner(f"Generating content... (Attempt {attempt + 1}/{max_retries})"):
-                response = st.session_state.client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": "You are an expert curriculum designer and educator. Create detailed, professional, and pedagogically sound educational content."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=temperature,
-                    max_tokens=4000
-                )
-                
-                if response and response.choices[0].message.content:
-                    content = response.choices[0].message.content
-                    
-                    # Save to session state
-                    content_id = f"Content_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                    st.session_state.generated_content[content_id] = {
-                        'content': content,
-                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        'prompt': prompt[:100] + '...' if len(prompt) > 100 else prompt,
-                        'model': model,
-                        'temperature': temperature
-                    }
-                    return content
-                
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(2 ** attempt)  # Exponential backoff
-                continue
-            else:
-                st.error(f"Failed to generate content after {max_retries} attempts: {str(e)}")
-                return None
+    stats = new_stats(model)
+    try:
+        with st.spinner("Generating content..."):
+            content, cache_status = complete_cached(st.session_state.client, prompt, model=model,
+                                                    temperature=temperature, max_retries=max_retries,
+                                                    use_cache=use_cache, stats=stats, max_tokens=max_tokens,
+                                                    response_format=response_format, labels=telemetry_labels(kind))
+    except GenerationError as e:
+        st.error(str(e))
+        return None
     
+    if content:
+        record_generation(prompt, content, model, temperature, cache_status,
+                           stats=stats if cache_status == 'miss' else None)
+        _warn_if_truncated(stats)
+        return content
     return None
 
-def generate_content_streaming(prompt, model="gpt-3.5-turbo", temperature=0.7):
-    """Generate content using OpenAI with streaming response"""
+def generate_content_streaming(prompt, model="gpt-3.5-turbo", temperature=0.7, max_retries=3, use_cache=True,
+                               max_tokens=DEFAULT_MAX_TOKENS, kind=None):
+    """Stream content deltas from OpenAI as they are generated
+
+    Shares caching, retries and session-history bookkeeping with generate_content,
+    and records time-to-first-token, tokens/sec and total latency for the call.
+    """
     
     if not st.session_state.client:
         st.error("OpenAI client not initialized. Please check your API key.")
-        return None
+        return
+    
+    labels = telemetry_labels(kind)
+    cache = get_response_cache()
+    cache_key = cache_key_for(prompt, model, temperature, max_tokens=max_tokens)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record_call(new_stats(model), 'hit', labels, streaming=True)
+            record_generation(prompt, cached, model, temperature, cache_status='hit')
+            yield cached
+            return
+    
+    stats = new_stats(model)
+    parts = []
+    try:
+        # An identical stream already in flight (another session, a double submit) is joined, not repeated
+        for delta in stream_shared(st.session_state.client, prompt, model=model, temperature=temperature,
+                                   max_tokens=max_tokens, max_retries=max_retries, stats=stats, labels=labels):
+            parts.append(delta)
+            yield delta
+    except GenerationError as e:
+        st.error(str(e))
+        return
+    
+    # Save to session state after complete response; stream_shared has already cached it
+    content = "".join(parts)
+    if content:
+        _record_streamed(prompt, content, model, temperature, stats)
+
+def generate_content_concurrently(prompts, model="gpt-3.5-turbo", temperature=0.7, max_retries=3,
+                                  max_tokens=DEFAULT_MAX_TOKENS):
+    """Generate several prompts in parallel, yielding (name, chunk) as chunks arrive
+
+    A final (name, None) event marks each prompt as finished. Worker threads only
+    talk to the API; cache, session state and UI updates stay on the script thread.
+    max_tokens may be a single value or a dict keyed like prompts.
+    """
     
+    if not st.session_state.client:
+        st.error("OpenAI client not initialized. Please check your API key.")
+        return
+    
+    client = st.session_state.client
+    labels = telemetry_labels()
+    cache = get_response_cache()
+    events = queue.Queue()
+    pending = {}
+    
+    limits = max_tokens if isinstance(max_tokens, dict) else {}
+    for name, prompt in prompts.items():
+        limit = limits.get(name, DEFAULT_MAX_TOKENS) if limits else max_tokens
+        cache_key = cache_key_for(prompt, model, temperature, max_tokens=limit)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record_call(new_stats(model), 'hit', dict(labels, kind=name), streaming=True)
+            record_generation(prompt, cached, model, temperature, cache_status='hit')
+            yield name, cached
+            yield name, None
+        else:
+            pending[name] = (prompt, limit)
+    
+    if not pending:
+        return
+    
+    def worker(name, prompt, limit):
+        stats = new_stats(model)
+        try:
+            for delta in stream_shared(client, prompt, model=model, temperature=temperature, max_tokens=limit,
+                                       max_retries=max_retries, stats=stats, labels=dict(labels, kind=name)):
+                events.put((name, delta, None, None))
+        except GenerationError as e:
+            events.put((name, None, e, stats))
+            return
+        events.put((name, None, None, stats))
+    
+    parts = {name: [] for name in pending}
+    executor = ThreadPoolExecutor(max_workers=len(pending))
     try:
-        stream = st.session_state.client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert curriculum designer and educator. Create detailed, professional, and pedagogically sound educational content."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,
-            max_tokens=4000,
-            stream=True
-        )
-        
-        full_response = ""
-        for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                full_response += chunk.choices[0].delta.content
-                yield chunk.choices[0].delta.content
+        for name, (prompt, limit) in pending.items():
+            executor.submit(worker, name, prompt, limit)
         
-        # Save to session state after complete response
-        if full_response:
-            content_id = f"Content_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            st.session_state.generated_content[content_id] = {
-                'content': full_response,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'prompt': prompt[:100] + '...' if len(prompt) > 100 else prompt,
-                'model': model,
-                'temperature': temperature
-            }
+        remaining = len(pending)
+        while remaining:
+            name, chunk, error, stats = events.get()
+            if chunk is not None:
+                parts[name].append(chunk)
+                yield name, chunk
+                continue
             
-    except Exception as e:
-        st.error(f"Error in streaming generation: {str(e)}")
-        return None
+            remaining -= 1
+            prompt, _ = pending[name]
+            content = "".join(parts[name])
+            if error is not None:
+                st.error(f"Failed to generate {name.replace('_', ' ')}: {str(error)}")
+            elif content:
+                _record_streamed(prompt, content, model, temperature, stats)
+            yield name, None
+    finally:
+        # A rerun that interrupts the page must not wait for the streams still in flight
+        executor.shutdown(wait=False)
 
-def format_course_outline(course_data):
-    """Format course outline data for prompt"""
-    return f"""
-    Create a comprehensive course outline with the following specifications:
-    
-    Course Title: {course_data['title']}
-    Subject Area: {course_data['subject']}
-    Target Audience: {course_data['audience']}
-    Duration: {course_data['duration']} {course_data['duration_unit']}
-    Level: {course_data['level']}
-    
-    Additional Requirements:
-    - {course_data.get('additional_reqs', 'None specified')}
-    
-    Please structure the response with clear headings and formatting:
-    
-    1. COURSE DESCRIPTION
-    Write a compelling overview of the course (2-3 paragraphs)
-    
-    2. LEARNING OBJECTIVES
-    List 5-7 specific, measurable learning objectives
-    
-    3. PREREQUISITES
-    List any required prior knowledge or skills
-    
-    4. COURSE OUTLINE
-    For each module/week, include:
-    - Module title
-    - Key topics covered (bullet points)
-    - Learning activities
-    - Estimated time commitment
-    
-    5. ASSESSMENT METHODS
-    Describe how student learning will be evaluated:
-    - Formative assessments
-    - Summative assessments
-    - Grading criteria
-    
-    6. REQUIRED MATERIALS
-    List textbooks, software, or other resources needed
-    
-    7. COURSE POLICIES
-    Include attendance, late work, academic integrity policies
-    """
+def _generation_work(client, prompt, model, temperature, max_tokens, response_format, streaming, use_cache, labels):
+    """Job body for one generation; it runs on a worker thread, so it only uses the session-free core"""
+    def work(job):
+        stats = new_stats(model)
+        if not streaming:
+            content, cache_status = complete_cached(client, prompt, model=model, temperature=temperature,
+                                                    use_cache=use_cache, stats=stats, max_tokens=max_tokens,
+                                                    response_format=response_format, labels=labels)
+            return {'content': content, 'cache_status': cache_status, 'stats': stats}
+        
+        cache = get_response_cache()
+        cache_key = cache_key_for(prompt, model, temperature, max_tokens=max_tokens)
+        cached = cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            record_call(stats, 'hit', labels, streaming=True)
+            job.write(cached)
+            return {'content': cached, 'cache_status': 'hit', 'stats': stats}
+        parts = []
+        for delta in stream_shared(client, prompt, model=model, temperature=temperature, max_tokens=max_tokens,
+                                   stats=stats, labels=labels):
+            parts.append(delta)
+            job.write(delta)
+        return {'content': "".join(parts), 'cache_status': 'shared' if stats['shared'] else 'miss', 'stats': stats}
+    return work
 
-def format_lesson_plan(lesson_data):
-    """Format lesson plan data for prompt"""
-    return f"""
-    Create a detailed lesson plan with the following specifications:
-    
-    Lesson Title: {lesson_data['title']}
-    Course: {lesson_data['course']}
-    Duration: {lesson_data['duration']} minutes
-    Class Size: {lesson_data['class_size']} students
-    
-    Learning Objectives:
-    {lesson_data['objectives']}
-    
-    Materials Needed:
-    {lesson_data.get('materials', 'Standard classroom materials')}
-    
-    Prior Knowledge Required:
-    {lesson_data.get('prerequisites', 'None specified')}
-    
-    Teaching Strategies:
-    {lesson_data.get('teaching_strategies', 'Mix of direct instruction and active learning')}
-    
-    Please structure the lesson plan with detailed timing and activities:
-    
-    1. LESSON OVERVIEW
-    Brief summary of the lesson (2-3 sentences)
-    
-    2. LEARNING OBJECTIVES
-    Restate the specific objectives for this lesson
-    
-    3. LESSON PROCEDURE (with timestamps)
-    
-    A. Opening (5-10 minutes)
-    - Hook/Attention grabber
-    - Review of prior learning
-    - Lesson objectives introduction
-    
-    B. Direct Instruction (15-20 minutes)
-    - Key concepts presentation
-    - Visual aids/Examples
-    - Check for understanding questions
-    
-    C. Guided Practice (15-20 minutes)
-    - Step-by-step activities
-    - Teacher scaffolding
-    - Group/Partner work instructions
-    
-    D. Independent Practice (10-15 minutes)
-    - Individual student work
-    - Application of learning
-    - Teacher monitoring strategies
-    
-    E. Closing (5-10 minutes)
-    - Summary of key points
-    - Exit ticket/Formative assessment
-    - Preview of next lesson
-    
-    4. DIFFERENTIATION STRATEGIES
-    - For struggling learners
-    - For English language learners
-    - For advanced students
-    
-    5. ASSESSMENT
-    - Formative checks throughout
-    - Success criteria
-    - Feedback methods
-    
-    6. EXTENSION ACTIVITIES
-    Ideas for early finishers or homework
-    
-    7. TEACHER REFLECTION
-    Space for notes on lesson effectiveness
+def start_job(slot, kind, label, work, meta=None):
+    """Submit work to the background job runner and remember it as this session's job for slot"""
+    job_id = get_job_runner().submit(kind, label, work, meta)
+    st.session_state.setdefault('jobs', {})[slot] = job_id
+    return job_id
+
+def start_generation_job(slot, prompt, label, model="gpt-3.5-turbo", temperature=0.7, max_tokens=DEFAULT_MAX_TOKENS,
+                         response_format=None, streaming=True, use_cache=True, meta=None):
+    """Run a generation as a background job that survives reruns and page switches
+
+    Collect it with follow_generation_job(slot); meta is handed back with
+    the finished job so the page can render it without the original form.
     """
+    if not st.session_state.client:
+        st.error("OpenAI client not initialized. Please check your API key.")
+        return None
+    work = _generation_work(st.session_state.client, prompt, model, temperature, max_tokens, response_format,
+                            streaming, use_cache, telemetry_labels(slot))
+    meta = dict(meta or {}, prompt=prompt, model=model, temperature=temperature, streaming=streaming)
+    return start_job(slot, 'generation', label, work, meta)
 
-def format_assessment(assessment_data):
-    """Format assessment data for prompt"""
-    return f"""
-    Create a comprehensive assessment with the following specifications:
-    
-    Assessment Type: {assessment_data['type']}
-    Subject/Topic: {assessment_data['topic']}
-    Grade Level: {assessment_data['grade_level']}
-    Number of Questions: {assessment_data['num_questions']}
-    Difficulty Level: {assessment_data['difficulty']}
-    
-    Learning Objectives Tested:
-    {assessment_data['objectives']}
-    
-    Question Types to Include:
-    {assessment_data.get('question_types', 'Multiple choice, short answer, and essay')}
-    
-    Additional Requirements:
-    - {assessment_data.get('requirements', 'Include a variety of question types and clear instructions')}
-    
-    Please structure the assessment professionally:
-    
-    1. ASSESSMENT TITLE AND HEADER
-    - Assessment name
-    - Total points possible
-    - Time allowed
-    - Instructions for students
-    
-    2. SECTION 1: MULTIPLE CHOICE assessment_data.get('num_mcq', assessment_data.get('num_questions', 9)//3)
-    For each question:
-    - Clear question stem
-    - 4 options (A-D)
-    - Indicate correct answer in key
-    
-    3. SECTION 2: SHORT ANSWER assessment_data.get('num_mcq', assessment_data.get('num_questions', 9)//3)
-    For each question:
-    - Clear prompt
-    - Expected response length
-    - Key points to include
-    
-    4. SECTION 3: ESSAY/EXTENDED RESPONSE ({assessment_data.get('num_essay', 1)} questions)
-    For each prompt:
-    - Detailed question
-    - Rubric/Grading criteria
-    - Expected length
-    
-    5. ANSWER KEY
-    - Correct answers for multiple choice
-    - Sample answers/model responses
-    - Grading rubric with point values
-    
-    6. ASSESSMENT ANALYSIS
-    - Skills assessed
-    - Difficulty distribution
-    - Recommendations for remediation
+def pending_job(slot):
+    """Snapshot of this session's unfinished or uncollected job for slot, if any"""
+    job_id = st.session_state.get('jobs', {}).get(slot)
+    return get_job_runner().get(job_id) if job_id else None
+
+def follow_job(slot, on_output=None):
+    """Wait for this session's job in slot, showing its progress; returns the finished job or None
+
+    on_output(text) receives streamed output as it arrives, starting from the
+    beginning, so a page that is opened again mid-job replays what it missed.
+    If the script is interrupted (a rerun or page switch) the job carries on
+    and the next run of the page picks it up.
     """
+    job_id = st.session_state.get('jobs', {}).get(slot)
+    if not job_id:
+        return None
+    runner = get_job_runner()
+    progress_bar = None
+    read = 0
+    while True:
+        job = runner.get(job_id, since=read)
+        if job is None:
+            st.session_state.jobs.pop(slot, None)
+            st.warning("⚠️ A background generation was lost before it finished. Please generate it again.")
+            return None
+        if job['output'] and on_output:
+            on_output(job['output'])
+        read = job['chunks']
+        if job['progress']:
+            progress_bar = progress_bar or st.progress(0.0)
+            progress_bar.progress(job['progress'][0], text=job['progress'][1])
+        if job['status'] in FINISHED_STATUSES:
+            break
+        time.sleep(JOB_POLL_INTERVAL)
+    
+    if progress_bar:
+        progress_bar.empty()
+    st.session_state.jobs.pop(slot, None)
+    for notice in job['notices']:
+        st.warning(f"⚠️ {notice}")
+    if job['status'] == 'failed':
+        st.error(f"❌ {job['label']} failed: {job['error']}")
+        return None
+    return job
 
-def format_project_based_learning(pbl_data):
-    """Format project-based learning activity data for prompt"""
-    return f"""
-    Create a detailed project-based learning activity with the following specifications:
-    
-    Project Title: {pbl_data['title']}
-    Subject Area: {pbl_data['subject']}
-    Grade Level: {pbl_data['grade_level']}
-    Duration: {pbl_data['duration']} {pbl_data['duration_unit']}
-    Group Size: {pbl_data['group_size']}
-    
-    Driving Question:
-    {pbl_data['driving_question']}
-    
-    Learning Objectives:
-    {pbl_data['objectives']}
-    
-    21st Century Skills Focus:
-    {pbl_data.get('skills', 'Critical thinking, collaboration, communication, creativity')}
-    
-    Please structure the PBL activity with:
-    
-    1. PROJECT OVERVIEW
-    - Real-world context
-    - Authentic audience
-    - Final product description
-    
-    2. ENTRY EVENT
-    - Hook to launch the project
-    - Initial questions to explore
-    
-    3. SCAFFOLDED ACTIVITIES
-    Week-by-week breakdown of:
-    - Research activities
-    - Skill-building lessons
-    - Checkpoints and milestones
-    
-    4. RESOURCES
-    - Materials needed
-    - Expert contacts/Community partners
-    - Digital tools and resources
-    
-    5. STUDENT SUPPORT
-    - Differentiation strategies
-    - Scaffolding for diverse learners
-    - Extension challenges
-    
-    6. ASSESSMENT
-    - Formative checkpoints
-    - Rubric for final product
-    - Peer and self-assessment forms
-    
-    7. PRESENTATION
-    - Presentation format
-    - Audience engagement strategies
-    - Reflection prompts
+def follow_generation_job(slot, on_output=None):
+    """follow_job() for generation jobs, recording the result in the session history"""
+    job = follow_job(slot, on_output)
+    if job is None or not job['result'].get('content'):
+        return None
+    meta, result = job['meta'], job['result']
+    stats = result.get('stats') if result['cache_status'] == 'miss' else None
+    job['content_id'] = record_generation(meta['prompt'], result['content'], meta['model'], meta['temperature'],
+                                          result['cache_status'], stats=stats)
+    if stats:
+        _warn_if_truncated(stats)
+    return job
+
+def show_background_jobs():
+    """List this session's background jobs so work started on another page stays visible"""
+    jobs = st.session_state.get('jobs')
+    if not jobs:
+        return
+    st.markdown("### ⏳ Background Jobs")
+    runner = get_job_runner()
+    for job_id in list(jobs.values()):
+        job = runner.get(job_id)
+        if job is None:
+            continue
+        if job['status'] == 'done':
+            st.caption(f"✅ {job['label']} is ready. Open its page to view it.")
+        elif job['status'] == 'failed':
+            st.caption(f"❌ {job['label']} failed. Open its page for details.")
+        elif job['progress']:
+            st.caption(f"🔄 {job['label']}: {job['progress'][1]}")
+        else:
+            st.caption(f"🔄 {job['label']}: {len(job['output']):,} characters so far")
+
+def save_artifact(slot, content, content_id=None, **fields):
+    """Keep a page's latest result in session state so reruns render it instead of regenerating
+
+    Artifacts are keyed by slot ('course_outline', 'lesson_plan', ...);
+    content_id links back to the entry in the generation history.
     """
+    artifact = dict(fields, id=content_id, content=content)
+    st.session_state.setdefault('artifacts', {})[slot] = artifact
+    return artifact
+
+def get_artifact(slot):
+    """The latest saved result for slot, or None"""
+    return st.session_state.get('artifacts', {}).get(slot)
+
+def plan_max_tokens(kind, data, prompt, model="gpt-3.5-turbo"):
+    """Size max_tokens for a request, warning on the page if the output cannot fit"""
+    budget = plan_tokens(kind, data, prompt, model=model)
+    if budget['warning']:
+        st.warning(f"⚠️ {budget['warning']}")
+    return budget['max_tokens']
+
+def cache_status_label():
+    """Describe the cache outcome of the most recent generation for display"""
+    last = st.session_state.get('last_generation')
+    if not last:
+        return "n/a"
+    return {'hit': "⚡ hit", 'shared': "🔗 shared"}.get(last.get('cache'), "miss")
+
+def generation_timing_label():
+    """Describe the timing of the most recent generation for display"""
+    last = st.session_state.get('last_generation')
+    if not last:
+        return ""
+    if last.get('cache') == 'hit':
+        return "served from cache"
+    if last.get('cache') == 'shared':
+        return "joined an identical request already in flight"
+    parts = []
+    if last.get('ttft_ms') is not None:
+        parts.append(f"first token in {last['ttft_ms']:.0f} ms")
+    if last.get('tokens_per_sec'):
+        parts.append(f"{last['tokens_per_sec']:.1f} tok/s")
+    if last.get('latency_ms') is not None:
+        parts.append(f"{last['latency_ms'] / 1000:.1f} s total")
+    if last.get('continuations'):
+        parts.append(f"{last['continuations']} continuation{'s' if last['continuations'] > 1 else ''}")
+    if last.get('cached_tokens'):
+        parts.append(f"{last['cached_tokens']:,} of {last['prompt_tokens']:,} prompt tokens cached")
+    return " · ".join(parts)
+
+def _warn_if_truncated(stats):
+    """Tell the user when a response is still cut off after all continuation rounds"""
+    if stats.get('finish_reason') != 'length':
+        return
+    if stats.get('continuations'):
+        st.warning(f"⚠️ The response was still cut off at the length limit after {stats['continuations']} "
+                   f"continuation(s); the end may be missing.")
+    else:
+        st.warning("⚠️ The response was cut off at the length limit; the end may be missing.")
+
+def cache_stats_summary():
+    """Summarize process-wide cache counters for display"""
+    stats = get_response_cache().stats()
+    summary = f"{stats['hits']} hits / {stats['misses']} misses ({stats['entries']} cached)"
+    coalesced = get_single_flight().coalesced
+    if coalesced:
+        summary += f" · {coalesced} duplicate request{'s' if coalesced > 1 else ''} coalesced"
+    return summary
 
 def initialize_openai_client(api_key):
     """Initialize OpenAI client with error handling"""
     try:
-        client = OpenAI(api_key=api_key)
-        # Test the connection with a simple completion
-        test_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": "test"}],
-            max_tokens=5
-        )
-        return client
+        ok, message = check_credentials(api_key, default_base_url())
+        if not ok:
+            st.error(f"Failed to initialize OpenAI client: {message}")
+            return None
+        return get_openai_client(api_key, default_base_url())
     except Exception as e:
         st.error(f"Failed to initialize OpenAI client: {str(e)}")
         return None
\ No newline at end of file
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.course_model import parse_modules
+from utils.generation import GenerationError, new_stats, complete_cached
+from utils.prompts import build_full_prompt
+from utils.token_budget import plan_tokens
+
+# Optional on-disk checkpoints; without it checkpoints live on the pipeline object
+CHECKPOINT_DIR = os.getenv("PIPELINE_CHECKPOINT_DIR") or None
+DEFAULT_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", 4))
+
+# Keep derived prompts bounded when modules or lesson plans are long
+MAX_CONTEXT_CHARS = 1500
+
+DIFFICULTY_BY_LEVEL = {
+    'Beginner': 'Easy',
+    'Intermediate': 'Medium',
+    'Advanced': 'Hard',
+    'All Levels': 'Medium',
+}
+
+
+def _clip(text, limit=MAX_CONTEXT_CHARS):
+    return text if len(text) <= limit else text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+class CoursePipeline:
+    """Course → lesson → assessment generation graph for one outline
+
+    Every module gets a lesson-plan node, and every lesson an assessment node
+    that depends on it. Independent nodes run in parallel; each finished node
+    is checkpointed so failed nodes can be retried without regenerating the rest.
+    """
+
+    def __init__(self, course_data, outline, lesson_style='interactive', assessment_style='formative',
+                 lesson_minutes=60, class_size=25, questions_per_assessment=5, checkpoint_dir=CHECKPOINT_DIR):
+        self.course_data = course_data
+        self.outline = outline
+        self.lesson_style = lesson_style
+        self.assessment_style = assessment_style
+        self.lesson_minutes = lesson_minutes
+        self.class_size = class_size
+        self.questions_per_assessment = questions_per_assessment
+        self.modules = parse_modules(outline)
+        self.pipeline_id = hashlib.sha256(
+            json.dumps([course_data, outline, lesson_style, assessment_style], sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:16]
+        self.checkpoint_dir = os.path.join(checkpoint_dir, self.pipeline_id) if checkpoint_dir else None
+        self._lock = threading.Lock()
+
+        self.nodes = OrderedDict()
+        for module in self.modules:
+            lesson_id = f"lesson_{module['number']}"
+            self.nodes[lesson_id] = self._new_node(lesson_id, 'lesson', module, deps=[])
+            assessment_id = f"assessment_{module['number']}"
+            self.nodes[assessment_id] = self._new_node(assessment_id, 'assessment', module, deps=[lesson_id])
+        self._load_checkpoints()
+
+    @staticmethod
+    def _new_node(node_id, kind, module, deps):
+        return {
+            'id': node_id,
+            'kind': kind,
+            'module': module['number'],
+            'title': module['title'],
+            'deps': deps,
+            'status': 'pending',
+            'content': None,
+            'error': None,
+            'stats': None,
+        }
+
+    def carry_over(self, previous):
+        """Reuse finished nodes from an earlier pipeline for modules whose text is unchanged"""
+        if previous is None:
+            return
+        previous_modules = {m['number']: m for m in previous.modules}
+        for module in self.modules:
+            old = previous_modules.get(module['number'])
+            if old is None or (old['title'], old['content']) != (module['title'], module['content']):
+                continue
+            for kind in ('lesson', 'assessment'):
+                node_id = f"{kind}_{module['number']}"
+                old_node = previous.nodes.get(node_id)
+                if old_node and old_node['status'] == 'done':
+                    self.nodes[node_id].update(status='done', content=old_node['content'], stats=old_node['stats'])
+
+    def lesson_data(self, module):
+        """Lesson-plan spec for a module, in the shape format_lesson_plan accepts"""
+        previous = [m['title'] for m in self.modules if m['number'] < module['number']]
+        return {
+            'title': module['title'],
+            'course': self.course_data['title'],
+            'duration': self.lesson_minutes,
+            'class_size': self.class_size,
+            'objectives': _clip(module['content']) or f"Cover the key topics of {module['title']}",
+            'materials': '',
+            'prerequisites': previous[-1] if previous else self.course_data.get('prerequisites', 'None specified'),
+            'engagement_features': [],
+            'include_standards': False,
+        }
+
+    def assessment_data(self, module, lesson_plan):
+        """Assessment spec for a module, grounded in its generated lesson plan"""
+        return {
+            'type': 'Quiz',
+            'topic': module['title'],
+            'grade_level': self.course_data.get('audience', ''),
+            'num_questions': self.questions_per_assessment,
+            'difficulty': DIFFICULTY_BY_LEVEL.get(self.course_data.get('level'), 'Medium'),
+            'objectives': _clip(module['content']) or module['title'],
+            'requirements': f"Assess what this lesson plan teaches:\n{_clip(lesson_plan)}",
+        }
+
+    def node_spec(self, node):
+        """Artifact spec for a node, built from its module and finished dependencies"""
+        module = next(m for m in self.modules if m['number'] == node['module'])
+        if node['kind'] == 'lesson':
+            return self.lesson_data(module)
+        return self.assessment_data(module, self.nodes[node['deps'][0]]['content'])
+
+    def node_prompt(self, node):
+        """Render the prompt for a node"""
+        style = self.lesson_style if node['kind'] == 'lesson' else self.assessment_style
+        return build_full_prompt(node['kind'], self.node_spec(node), style)
+
+    def select(self, modules=None):
+        """Node ids for the given module numbers (all modules when None)"""
+        return [node_id for node_id, node in self.nodes.items()
+                if modules is None or node['module'] in modules]
+
+    def retry_failed(self):
+        """Reset failed and blocked nodes so the next run picks them up"""
+        with self._lock:
+            for node in self.nodes.values():
+                if node['status'] in ('failed', 'blocked'):
+                    node['status'] = 'pending'
+                    node['error'] = None
+
+    def progress(self):
+        """Count nodes per status"""
+        counts = {}
+        for node in self.nodes.values():
+            counts[node['status']] = counts.get(node['status'], 0) + 1
+        return counts
+
+    def run(self, client, model="gpt-3.5-turbo", temperature=0.7, max_workers=DEFAULT_MAX_WORKERS,
+            node_ids=None, use_cache=True, labels=None):
+        """Execute pending nodes as a dependency graph, yielding nodes as their status changes
+
+        Nodes run as soon as their dependencies are done, up to max_workers at a
+        time. A failed node blocks its dependents; everything else keeps going.
+        Calls are recorded in the telemetry store with labels and the node's kind.
+        """
+        # Nodes left 'running' by an interrupted run (e.g. a Streamlit rerun) start over
+        for node in self.nodes.values():
+            if node['status'] == 'running':
+                node['status'] = 'pending'
+
+        wanted = set(node_ids) if node_ids is not None else set(self.nodes)
+        # Dependencies of the requested nodes have to run too
+        for node_id in list(wanted):
+            wanted.update(self.nodes[node_id]['deps'])
+
+        def runnable(node):
+            return (node['id'] in wanted and node['status'] == 'pending'
+                    and all(self.nodes[dep]['status'] == 'done' for dep in node['deps']))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            while True:
+                for node in self.nodes.values():
+                    if runnable(node):
+                        node['status'] = 'running'
+                        prompt = self.node_prompt(node)
+                        budget = plan_tokens(node['kind'], self.node_spec(node), prompt, model=model)
+                        future = executor.submit(self._execute, client, prompt, model, temperature, use_cache,
+                                                 budget['max_tokens'], dict(labels or {}, kind=node['kind']))
+                        running[future] = node['id']
+                        yield node
+                if not running:
+                    break
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = self.nodes[running.pop(future)]
+                    content, stats, error = future.result()
+                    with self._lock:
+                        node['stats'] = stats
+                        if error is None and content:
+                            node['status'], node['content'], node['error'] = 'done', content, None
+                        else:
+                            node['status'], node['error'] = 'failed', error or "empty response"
+                            self._block_dependents(node['id'])
+                    self._save_checkpoint(node)
+                    yield node
+
+    @staticmethod
+    def _execute(client, prompt, model, temperature, use_cache, max_tokens, labels=None):
+        stats = new_stats(model)
+        started = time.time()
+        try:
+            content, cache_status = complete_cached(client, prompt, model=model, temperature=temperature,
+                                                    use_cache=use_cache, stats=stats, max_tokens=max_tokens,
+                                                    labels=labels)
+        except GenerationError as e:
+            stats['latency_ms'] = round((time.time() - started) * 1000, 1)
+            return None, stats, str(e)
+        stats['cache'] = cache_status
+        return content, stats, None
+
+    def _block_dependents(self, node_id):
+        for node in self.nodes.values():
+            if node_id in node['deps'] and node['status'] == 'pending':
+                node['status'] = 'blocked'
+                node['error'] = f"{node_id} failed"
+                self._block_dependents(node['id'])
+
+    def _save_checkpoint(self, node):
+        if not self.checkpoint_dir or node['status'] != 'done':
+            return
+        path = os.path.join(self.checkpoint_dir, f"{node['id']}.json")
+        try:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(node, f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            # A checkpoint only saves work on retry; a full or read-only disk must not fail the pack
+            pass
+
+    def _load_checkpoints(self):
+        if not self.checkpoint_dir or not os.path.isdir(self.checkpoint_dir):
+            return
+        for node_id, node in self.nodes.items():
+            path = os.path.join(self.checkpoint_dir, f"{node_id}.json")
+            try:
+                with open(path, encoding='utf-8') as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if saved.get('status') == 'done' and saved.get('content'):
+                node.update(status='done', content=saved['content'], stats=saved.get('stats'))
+
+    def to_markdown(self):
+        """Combine the outline and every finished node into one course pack document"""
+        sections = [f"# {self.course_data['title']} — Course Pack", "## Course Outline", self.outline]
+        for module in self.modules:
+            lesson = self.nodes[f"lesson_{module['number']}"]
+            assessment = self.nodes[f"assessment_{module['number']}"]
+            if lesson['status'] != 'done' and assessment['status'] != 'done':
+                continue
+            sections.append(f"## Module {module['number']}: {module['title']}")
+            if lesson['status'] == 'done':
+                sections.extend(["### Lesson Plan", lesson['content']])
+            if assessment['status'] == 'done':
+                sections.extend(["### Assessment", assessment['content']])
+        return "\n\n".join(sections)
+
+
+def course_pack_work(pipeline, client, node_ids, model="gpt-3.5-turbo", temperature=0.7, labels=None):
+    """Background job body for CoursePipeline.run(), reporting progress per finished node
+
+    The pipeline's nodes are updated in place as they finish; the result also
+    carries every node that is no longer pending, keyed by node id, so a page
+    can apply them to its pipeline after the job is collected.
+    """
+    def work(job):
+        job.progress(0.0, "Starting course pack generation...")
+        finished = 0
+        for node in pipeline.run(client, model=model, temperature=temperature, node_ids=node_ids, labels=labels):
+            if node['status'] in ('done', 'failed'):
+                finished += 1
+                job.progress(min(finished / len(node_ids), 1.0),
+                             f"{node['kind'].title()} for Module {node['module']}: {node['status']} "
+                             f"({finished}/{len(node_ids)})")
+        nodes = {node_id: dict(node) for node_id, node in pipeline.nodes.items() if node['status'] != 'pending'}
+        return {'pipeline_id': pipeline.pipeline_id, 'nodes': nodes}
+    return work
@@ -0,0 +1,191 @@
+import cProfile
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+import streamlit as st
+
+# Opt-in timing of Streamlit reruns. Every widget interaction re-executes the
+# whole script, so a script calls start_rerun() at the top, profile_phase()
+# at each top-level stage (CSS, sidebar, page body...) and finish_rerun() at
+# the end; code anywhere below can add nested spans with profile_section().
+# Each session gets a Chrome trace file (open it in chrome://tracing or
+# https://ui.perfetto.dev) and cProfile dumps of its slowest reruns.
+
+# Set PROFILE_RERUNS=1 to turn profiling on; everything here is a no-op otherwise
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "curriculum-designer-profiles"))
+# cProfile dumps kept per session, for its slowest reruns; 0 disables cProfile
+PROFILE_SLOWEST = int(os.getenv("PROFILE_SLOWEST", 3))
+# Trace events kept per session; the oldest reruns are dropped first
+PROFILE_MAX_EVENTS = int(os.getenv("PROFILE_MAX_EVENTS", 20000))
+
+# perf_counter() is precise but has no fixed origin; trace timestamps are wall-clock microseconds
+_EPOCH = time.time() - time.perf_counter()
+_local = threading.local()
+
+
+def _timestamp_us(perf):
+    return round((_EPOCH + perf) * 1_000_000)
+
+
+class RerunProfile:
+    """Spans of one script run, in Chrome trace event format"""
+
+    def __init__(self, script, number, use_cprofile):
+        self.script = script
+        self.number = number
+        self.thread = threading.get_ident()
+        self.started = self.last_seen = time.perf_counter()
+        self.events = []
+        self.finished = False
+        self._phase = None
+        self.profiler = None
+        if use_cprofile:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self.profiler = profiler
+            except ValueError:
+                pass  # another profiler is already active on this thread
+
+    def _span(self, name, started, ended, category, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': _timestamp_us(started),
+                 'dur': round((ended - started) * 1_000_000, 1), 'pid': os.getpid(), 'tid': self.thread}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+        self.last_seen = max(self.last_seen, ended)
+
+    def phase(self, name):
+        """End the current top-level phase and start the next one"""
+        now = time.perf_counter()
+        if self._phase is not None:
+            self._span(self._phase[0], self._phase[1], now, 'phase')
+        self._phase = (name, now) if name else None
+
+    @contextmanager
+    def section(self, name, **args):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._span(name, started, time.perf_counter(), 'section', args)
+
+    def finish(self, status='ok'):
+        """Close the open phase and add the span covering the whole rerun; returns its duration"""
+        if status == 'ok':
+            self.phase(None)
+        elif self._phase is not None:
+            # Stopped by st.stop() or st.rerun(): the open phase ends at the last recorded activity
+            self._span(self._phase[0], self._phase[1], self.last_seen, 'phase')
+            self._phase = None
+        ended = time.perf_counter() if status == 'ok' else self.last_seen
+        if self.profiler is not None:
+            self.profiler.disable()
+        self._span(f"rerun {self.script}", self.started, ended, 'rerun',
+                   {'rerun': self.number, 'status': status})
+        self.events.insert(0, self.events.pop())  # the enclosing span first, as trace viewers expect
+        self.finished = True
+        return ended - self.started
+
+
+class SessionProfile:
+    """Trace events and slowest-rerun dumps of one browser session"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.reruns = 0
+        self.events = []
+        self.slowest = []  # (seconds, dump path), slowest first
+        self.current = None
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    @property
+    def trace_path(self):
+        return os.path.join(PROFILE_DIR, f"session-{self.id}.trace.json")
+
+    def start(self, script):
+        if self.current is not None and not self.current.finished:
+            self.end(status='interrupted')
+        self.reruns += 1
+        self.current = RerunProfile(script, self.reruns, use_cprofile=PROFILE_SLOWEST > 0)
+        return self.current
+
+    def end(self, status='ok'):
+        rerun = self.current
+        seconds = rerun.finish(status)
+        self.events.extend(rerun.events)
+        if len(self.events) > PROFILE_MAX_EVENTS:
+            del self.events[:len(self.events) - PROFILE_MAX_EVENTS]
+        # Interrupted reruns only ran part of the script, so their cProfile data is not kept
+        if status == 'ok' and rerun.profiler is not None:
+            self._keep_if_slowest(seconds, rerun)
+        self._write_trace()
+
+    def _keep_if_slowest(self, seconds, rerun):
+        if len(self.slowest) >= PROFILE_SLOWEST and seconds <= self.slowest[-1][0]:
+            return
+        path = os.path.join(PROFILE_DIR, f"session-{self.id}-rerun-{rerun.number}.prof")
+        try:
+            rerun.profiler.dump_stats(path)
+        except OSError:
+            return
+        self.slowest.append((seconds, path))
+        self.slowest.sort(reverse=True)
+        for _, evicted in self.slowest[PROFILE_SLOWEST:]:
+            try:
+                os.remove(evicted)
+            except OSError:
+                pass
+        del self.slowest[PROFILE_SLOWEST:]
+
+    def _write_trace(self):
+        trace = {'traceEvents': self.events, 'displayTimeUnit': 'ms',
+                 'otherData': {'session': self.id, 'reruns': self.reruns}}
+        temp_path = f"{self.trace_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(trace, f)
+            os.replace(temp_path, self.trace_path)
+        except OSError:
+            # Profiling must never break the app
+            pass
+
+
+def start_rerun(script, phase="setup"):
+    """Begin timing this script run, starting with the given phase"""
+    if not PROFILE_RERUNS:
+        return
+    if 'rerun_profile' not in st.session_state:
+        st.session_state.rerun_profile = SessionProfile()
+    _local.rerun = st.session_state.rerun_profile.start(script)
+    _local.rerun.phase(phase)
+
+
+def profile_phase(name):
+    """End the current top-level phase of this rerun and start the next one"""
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is not None and not rerun.finished:
+        rerun.phase(name)
+
+
+def profile_section(name, **args):
+    """Context manager that records a nested span; args are shown with it in the trace"""
+    rerun = getattr(_local, 'rerun', None)
+    # Sections outside a profiled rerun (worker threads, profiling off) record nothing
+    if rerun is None or rerun.finished:
+        return nullcontext()
+    return rerun.section(name, **args)
+
+
+def finish_rerun():
+    """Stop timing this script run and write the session's trace file"""
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is None or rerun.finished:
+        return
+    st.session_state.rerun_profile.end()
+    _local.rerun = None
@@ -0,0 +1,71 @@
+import hashlib
+import re
+import textwrap
+
+# Prompt templates are written as indented triple-quoted strings so they read
+# well in the source. Every request would otherwise pay input tokens for that
+# indentation, so each template is compiled once at import: dedented, with
+# trailing spaces and repeated blank lines removed. The registry also hashes
+# the compiled texts into a version that response-cache keys include.
+
+BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def minify(text):
+    """Dedent text and drop trailing whitespace, leading/trailing blank lines and runs of blank lines"""
+    lines = [line.rstrip() for line in textwrap.dedent(text).splitlines()]
+    return BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+
+class PromptTemplate:
+    """A registered template: its source as written and the compiled text that is sent"""
+
+    __slots__ = ('name', 'source', 'text')
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.text = minify(source)
+
+    def render(self, values=None, **defaults):
+        """Fill the template's {fields} from values, falling back to defaults for missing keys"""
+        return self.text.format_map({**defaults, **(values or {})})
+
+
+_templates = {}
+_version = None
+
+
+def register(name, source):
+    """Compile source and add it to the registry under name; returns the PromptTemplate"""
+    global _version
+    if name in _templates:
+        raise ValueError(f"Prompt template already registered: {name}")
+    template = _templates[name] = PromptTemplate(name, source)
+    _version = None
+    return template
+
+
+def register_styles(kind, prompts):
+    """Register a dictionary of style prompts; returns it with the compiled texts"""
+    return {style: register(f"{kind}.style.{style}", prompt).text for style, prompt in prompts.items()}
+
+
+def get_template(name):
+    return _templates[name]
+
+
+def registered_templates():
+    """All registered templates by name, in registration order"""
+    return dict(_templates)
+
+
+def template_version():
+    """Short hash of every compiled template; changes whenever any template does"""
+    global _version
+    if _version is None:
+        digest = hashlib.blake2b(digest_size=8)
+        for name in sorted(_templates):
+            digest.update(f"{name}\0{_templates[name].text}\0".encode('utf-8'))
+        _version = digest.hexdigest()
+    return _version
@@ -1,4 +1,13 @@
-# Pre-defined prompts for different educational scenarios
+import json
+import re
+from utils.course_model import OUTLINE_SCHEMA, MODULE_SCHEMA
+from utils.prompt_templates import register, register_styles, template_version
+
+# Pre-defined prompts for different educational scenarios. Every prompt is
+# registered with utils/prompt_templates.py, which compiles it once at import.
+
+# The module schema as literal text inside templates that are filled with str.format
+MODULE_SCHEMA_TEXT = json.dumps(MODULE_SCHEMA).replace('{', '{{').replace('}', '}}')
 
 COURSE_OUTLINE_PROMPTS = {
     "beginner": """
@@ -76,4 +85,547 @@ ASSESSMENT_PROMPTS = {
     - Guide instruction planning
     - Are low-stakes
     """
-}
\ No newline at end of file
+}
+
+COURSE_OUTLINE_PROMPTS = register_styles('course_outline', COURSE_OUTLINE_PROMPTS)
+LESSON_PLAN_PROMPTS = register_styles('lesson_plan', LESSON_PLAN_PROMPTS)
+ASSESSMENT_PROMPTS = register_styles('assessment', ASSESSMENT_PROMPTS)
+
+# Prompts are laid out as a static prefix (the instructions for the artifact kind, then
+# its style block) followed by the per-request specifications, so every request of a
+# kind and style shares a prefix the provider's prompt cache can reuse. Keep anything
+# that varies per request out of the *_INSTRUCTIONS below.
+
+COURSE_OUTLINE_INSTRUCTIONS = register('course_outline.instructions', """
+    Create a comprehensive course outline for the course specified at the end of this prompt.
+    
+    Please structure the response with clear headings and formatting:
+    
+    1. COURSE DESCRIPTION
+    Write a compelling overview of the course (2-3 paragraphs)
+    
+    2. LEARNING OBJECTIVES
+    List 5-7 specific, measurable learning objectives
+    
+    3. PREREQUISITES
+    List any required prior knowledge or skills
+    
+    4. COURSE OUTLINE
+    For each module/week, include:
+    - Module title
+    - Key topics covered (bullet points)
+    - Learning activities
+    - Estimated time commitment
+    
+    5. ASSESSMENT METHODS
+    Describe how student learning will be evaluated:
+    - Formative assessments
+    - Summative assessments
+    - Grading criteria
+    
+    6. REQUIRED MATERIALS
+    List textbooks, software, or other resources needed
+    
+    7. COURSE POLICIES
+    Include attendance, late work, academic integrity policies
+    """).text
+
+# The structured variant asks for JSON matching OUTLINE_SCHEMA instead of free-form Markdown
+COURSE_OUTLINE_JSON_INSTRUCTIONS = register('course_outline.json_instructions', f"""
+    Create a comprehensive course outline for the course specified at the end of this prompt.
+    
+    Respond with a single JSON object, without Markdown or commentary, that matches this JSON schema:
+    {json.dumps(OUTLINE_SCHEMA)}
+    
+    - description: a compelling overview of the course (2-3 paragraphs)
+    - objectives: 5-7 specific, measurable learning objectives
+    - prerequisites: required prior knowledge or skills
+    - modules: one entry per module/week, numbered from 1, with its key topics, learning activities and estimated hours
+    - assessment: formative and summative assessments and grading criteria
+    - materials: textbooks, software or other resources needed
+    - policies: attendance, late work and academic integrity policies
+    """).text
+
+LESSON_PLAN_INSTRUCTIONS = register('lesson_plan.instructions', """
+    Create a detailed lesson plan for the lesson specified at the end of this prompt.
+    
+    Please structure the lesson plan with detailed timing and activities:
+    
+    1. LESSON OVERVIEW
+    Brief summary of the lesson (2-3 sentences)
+    
+    2. LEARNING OBJECTIVES
+    Restate the specific objectives for this lesson
+    
+    3. LESSON PROCEDURE (with timestamps)
+    
+    A. Opening (5-10 minutes)
+    - Hook/Attention grabber
+    - Review of prior learning
+    - Lesson objectives introduction
+    
+    B. Direct Instruction (15-20 minutes)
+    - Key concepts presentation
+    - Visual aids/Examples
+    - Check for understanding questions
+    
+    C. Guided Practice (15-20 minutes)
+    - Step-by-step activities
+    - Teacher scaffolding
+    - Group/Partner work instructions
+    
+    D. Independent Practice (10-15 minutes)
+    - Individual student work
+    - Application of learning
+    - Teacher monitoring strategies
+    
+    E. Closing (5-10 minutes)
+    - Summary of key points
+    - Exit ticket/Formative assessment
+    - Preview of next lesson
+    
+    4. DIFFERENTIATION STRATEGIES
+    - For struggling learners
+    - For English language learners
+    - For advanced students
+    
+    5. ASSESSMENT
+    - Formative checks throughout
+    - Success criteria
+    - Feedback methods
+    
+    6. EXTENSION ACTIVITIES
+    Ideas for early finishers or homework
+    
+    7. TEACHER REFLECTION
+    Space for notes on lesson effectiveness
+    """).text
+
+ASSESSMENT_INSTRUCTIONS = register('assessment.instructions', """
+    Create a comprehensive assessment for the specifications at the end of this prompt.
+    
+    Please structure the assessment professionally:
+    
+    1. ASSESSMENT TITLE AND HEADER
+    - Assessment name
+    - Total points possible
+    - Time allowed
+    - Instructions for students
+    
+    2. SECTION 1: MULTIPLE CHOICE assessment_data.get('num_mcq', assessment_data.get('num_questions', 9)//3)
+    For each question:
+    - Clear question stem
+    - 4 options (A-D)
+    - Indicate correct answer in key
+    
+    3. SECTION 2: SHORT ANSWER assessment_data.get('num_mcq', assessment_data.get('num_questions', 9)//3)
+    For each question:
+    - Clear prompt
+    - Expected response length
+    - Key points to include
+    
+    4. SECTION 3: ESSAY/EXTENDED RESPONSE (see Number of Essay Questions below)
+    For each prompt:
+    - Detailed question
+    - Rubric/Grading criteria
+    - Expected length
+    
+    5. ANSWER KEY
+    - Correct answers for multiple choice
+    - Sample answers/model responses
+    - Grading rubric with point values
+    
+    6. ASSESSMENT ANALYSIS
+    - Skills assessed
+    - Difficulty distribution
+    - Recommendations for remediation
+    """).text
+
+# Per-request specifications, filled in by the format_* builders below
+
+COURSE_OUTLINE_SPEC = register('course_outline.spec', """
+    Course specifications:
+    
+    Course Title: {title}
+    Subject Area: {subject}
+    Target Audience: {audience}
+    Duration: {duration} {duration_unit}
+    Level: {level}
+    
+    Additional Requirements:
+    - {additional_reqs}
+    """)
+
+LESSON_PLAN_SPEC = register('lesson_plan.spec', """
+    Lesson specifications:
+    
+    Lesson Title: {title}
+    Course: {course}
+    Duration: {duration} minutes
+    Class Size: {class_size} students
+    
+    Learning Objectives:
+    {objectives}
+    
+    Materials Needed:
+    {materials}
+    
+    Prior Knowledge Required:
+    {prerequisites}
+    
+    Teaching Strategies:
+    {teaching_strategies}
+    """)
+
+ASSESSMENT_SPEC = register('assessment.spec', """
+    Assessment specifications:
+    
+    Assessment Type: {type}
+    Subject/Topic: {topic}
+    Grade Level: {grade_level}
+    Number of Questions: {num_questions}
+    Number of Essay Questions: {num_essay}
+    Difficulty Level: {difficulty}
+    
+    Learning Objectives Tested:
+    {objectives}
+    
+    Question Types to Include:
+    {question_types}
+    
+    Additional Requirements:
+    - {requirements}
+    """)
+
+# Answer key and rubric, requested separately or together with the assessment
+
+ANSWER_KEY_CONTENTS = """
+    1. Correct answers for multiple choice, true/false, matching
+    2. Model answers/sample responses for short answer and essay questions
+    3. Point values for each question
+    4. Explanations for correct answers where helpful"""
+RUBRIC_CONTENTS = """
+    1. Grading criteria for each question type
+    2. Point distribution
+    3. Performance levels (Excellent, Good, Satisfactory, Needs Improvement)
+    4. Specific descriptors for each level
+    5. Total points calculation"""
+
+ANSWER_KEY_TEMPLATE = register('answer_key', """
+    Create a detailed answer key for this {assessment_type} on {topic}:
+    
+    {assessment}
+    
+    Format the answer key with:""" + ANSWER_KEY_CONTENTS)
+
+RUBRIC_TEMPLATE = register('rubric', """
+    Create a detailed scoring rubric for this {assessment_type} on {topic}:
+    
+    {assessment}
+    
+    Include:""" + RUBRIC_CONTENTS)
+
+COMPOSITE_TEMPLATE = register('assessment.composite_sections', """
+    Do not put the answer key or grading rubric inside the assessment. After the assessment,
+    add these two parts, each starting with its marker line exactly as shown:
+    
+    === ANSWER KEY ===
+    A detailed answer key for this {assessment_type} on {topic}, with:""" + ANSWER_KEY_CONTENTS + """
+    
+    === SCORING RUBRIC ===
+    A detailed scoring rubric for this {assessment_type} on {topic}, including:""" + RUBRIC_CONTENTS)
+
+# Single-module edits and long-course generation
+
+MODULE_REGENERATION_TEMPLATE = register('module_regeneration', """
+    Revise one module of an existing course outline. Only this module is being changed.
+    
+    Course Title: {title}
+    Subject Area: {subject}
+    Target Audience: {audience}
+    Duration: {duration} {duration_unit}
+    Level: {level}
+    
+    Current module:
+    {module_text}
+    
+    Requested changes:
+    - {instructions}
+    
+    {output_format}
+    Do not include any other modules or course sections.
+    """)
+
+MODULE_MARKDOWN_FORMAT = register('module_regeneration.markdown_format', """
+    Return ONLY the revised module, starting with the heading "Module {module_number}: <title>".
+    For the module, include:
+    - Key topics covered (bullet points)
+    - Learning activities
+    - Estimated time commitment
+    """)
+
+MODULE_JSON_FORMAT = register('module_regeneration.json_format', f"""
+    Respond with a single JSON object for the revised module, without Markdown or commentary, that matches this JSON schema:
+    {MODULE_SCHEMA_TEXT}
+    Use {{module_number}} as the module number.
+    """)
+
+COURSE_SKELETON_TEMPLATE = register('long_course.skeleton', """
+    Plan a long course. Only produce a compact skeleton; each module will be expanded separately later.
+    
+    Course Title: {title}
+    Subject Area: {subject}
+    Target Audience: {audience}
+    Duration: {duration} {duration_unit}
+    Level: {level}
+    
+    Additional Requirements:
+    - {additional_reqs}
+    
+    {style_prompt}
+    
+    Respond with a single JSON object, without Markdown or commentary, with these keys:
+    - description: a compelling overview of the course (2-3 paragraphs)
+    - objectives: 5-7 specific, measurable learning objectives
+    - prerequisites: required prior knowledge or skills
+    - modules: exactly {module_count} entries in teaching order, each {{"number": <1-{module_count}>, "title": "<short title>", "objectives": ["<1-2 objectives>"]}}
+    - assessment: formative and summative assessments and grading criteria
+    - materials: textbooks, software or other resources needed
+    - policies: attendance, late work and academic integrity policies
+    Keep module entries brief.
+    """)
+
+MODULE_EXPANSION_TEMPLATE = register('long_course.expansion', f"""
+    Expand part of a long course outline. The full module plan is given for context only.
+    
+    Course Title: {{title}}
+    Subject Area: {{subject}}
+    Target Audience: {{audience}}
+    Level: {{level}}
+    
+    {{style_prompt}}
+    
+    Full module plan:
+    {{plan}}
+    
+    Modules to expand:
+    {{batch}}
+    
+    Respond with a single JSON object, without Markdown or commentary, of the form {{{{"modules": [...]}}}}.
+    Each entry must match this JSON schema and keep its module number:
+    {MODULE_SCHEMA_TEXT}
+    Include only the modules listed under "Modules to expand".
+    """)
+
+PROJECT_BASED_LEARNING_TEMPLATE = register('project_based_learning', """
+    Create a detailed project-based learning activity with the following specifications:
+    
+    Project Title: {title}
+    Subject Area: {subject}
+    Grade Level: {grade_level}
+    Duration: {duration} {duration_unit}
+    Group Size: {group_size}
+    
+    Driving Question:
+    {driving_question}
+    
+    Learning Objectives:
+    {objectives}
+    
+    21st Century Skills Focus:
+    {skills}
+    
+    Please structure the PBL activity with:
+    
+    1. PROJECT OVERVIEW
+    - Real-world context
+    - Authentic audience
+    - Final product description
+    
+    2. ENTRY EVENT
+    - Hook to launch the project
+    - Initial questions to explore
+    
+    3. SCAFFOLDED ACTIVITIES
+    Week-by-week breakdown of:
+    - Research activities
+    - Skill-building lessons
+    - Checkpoints and milestones
+    
+    4. RESOURCES
+    - Materials needed
+    - Expert contacts/Community partners
+    - Digital tools and resources
+    
+    5. STUDENT SUPPORT
+    - Differentiation strategies
+    - Scaffolding for diverse learners
+    - Extension challenges
+    
+    6. ASSESSMENT
+    - Formative checkpoints
+    - Rubric for final product
+    - Peer and self-assessment forms
+    
+    7. PRESENTATION
+    - Presentation format
+    - Audience engagement strategies
+    - Reflection prompts
+    """)
+
+# Instructions and style prompts for each artifact kind build_full_prompt() accepts
+PROMPT_KINDS = {
+    'course': (COURSE_OUTLINE_INSTRUCTIONS, COURSE_OUTLINE_PROMPTS),
+    'lesson': (LESSON_PLAN_INSTRUCTIONS, LESSON_PLAN_PROMPTS),
+    'assessment': (ASSESSMENT_INSTRUCTIONS, ASSESSMENT_PROMPTS),
+}
+
+# Hash of every compiled template above; part of every response-cache key, so
+# editing any prompt stops cached responses to the old wording from being reused
+PROMPT_TEMPLATE_VERSION = template_version()
+
+
+# Prompt builders: no Streamlit here, so pages, background jobs and scripts all share them
+
+def format_course_outline(course_data):
+    """Format the per-request specifications of a course outline prompt"""
+    return COURSE_OUTLINE_SPEC.render(course_data, additional_reqs='None specified')
+
+
+def format_lesson_plan(lesson_data):
+    """Format the per-request specifications of a lesson plan prompt"""
+    specifications = LESSON_PLAN_SPEC.render(
+        lesson_data,
+        materials='Standard classroom materials',
+        prerequisites='None specified',
+        teaching_strategies='Mix of direct instruction and active learning'
+    )
+    return specifications + format_lesson_extras(lesson_data)
+
+
+def format_assessment(assessment_data):
+    """Format the per-request specifications of an assessment prompt"""
+    return ASSESSMENT_SPEC.render(
+        assessment_data,
+        num_essay=1,
+        question_types='Multiple choice, short answer, and essay',
+        requirements='Include a variety of question types and clear instructions'
+    )
+
+
+# Marker lines that separate the answer key and rubric in a combined assessment response
+COMPOSITE_SECTIONS = (('answer_key', 'ANSWER KEY'), ('rubric', 'SCORING RUBRIC'))
+COMPOSITE_MARKER = re.compile(r'^[ \t#*]*={3,}[ \t]*(ANSWER[ \t]+KEY|SCORING[ \t]+RUBRIC)[ \t]*={3,}[ \t*]*$',
+                              re.MULTILINE | re.IGNORECASE)
+
+
+def format_answer_key(assessment_type, topic, assessment):
+    """Format a prompt for the answer key of a generated assessment"""
+    return ANSWER_KEY_TEMPLATE.render(assessment_type=assessment_type, topic=topic, assessment=assessment)
+
+
+def format_rubric(assessment_type, topic, assessment):
+    """Format a prompt for the scoring rubric of a generated assessment"""
+    return RUBRIC_TEMPLATE.render(assessment_type=assessment_type, topic=topic, assessment=assessment)
+
+
+def format_composite_sections(assessment_type, topic):
+    """Format instructions that add the answer key and rubric to the assessment request itself"""
+    return COMPOSITE_TEMPLATE.render(assessment_type=assessment_type, topic=topic)
+
+
+def split_composite(text):
+    """Split a combined response into the assessment and the derived sections found in it
+
+    Returns (assessment, sections) where sections maps 'answer_key' and
+    'rubric' to their text; a part whose marker is missing is left out.
+    """
+    parts = COMPOSITE_MARKER.split(text)
+    names = {marker: name for name, marker in COMPOSITE_SECTIONS}
+    sections = {}
+    for marker, body in zip(parts[1::2], parts[2::2]):
+        name = names[' '.join(marker.upper().split())]
+        if body.strip() and name not in sections:
+            sections[name] = body.strip()
+    return parts[0].strip(), sections
+
+
+def format_project_based_learning(pbl_data):
+    """Format project-based learning activity data for prompt"""
+    return PROJECT_BASED_LEARNING_TEMPLATE.render(
+        pbl_data, skills='Critical thinking, collaboration, communication, creativity'
+    )
+
+
+def format_module_regeneration(course_data, module_text, module_number, instructions='', structured=False):
+    """Format a prompt that rewrites a single module of an existing course outline"""
+    output_format = (MODULE_JSON_FORMAT if structured else MODULE_MARKDOWN_FORMAT).render(module_number=module_number)
+    return MODULE_REGENERATION_TEMPLATE.render(
+        course_data,
+        module_text=module_text,
+        instructions=instructions or 'Improve clarity, depth and pacing while keeping the same scope',
+        output_format=output_format
+    )
+
+
+def format_course_skeleton(course_data, style, module_count):
+    """Format the first long-course request: course sections plus a compact module plan"""
+    return COURSE_SKELETON_TEMPLATE.render(
+        course_data,
+        additional_reqs='None specified',
+        style_prompt=COURSE_OUTLINE_PROMPTS[style],
+        module_count=module_count
+    )
+
+
+def format_module_expansion(course_data, style, skeleton, modules):
+    """Format a long-course request that expands a batch of skeleton modules"""
+    plan = "\n".join(f"{module['number']}. {module['title']}" for module in skeleton['modules'])
+    batch = "\n".join(f"Module {module['number']}: {module['title']} — objectives: {'; '.join(module['objectives']) or 'see title'}"
+                      for module in modules)
+    return MODULE_EXPANSION_TEMPLATE.render(course_data, style_prompt=COURSE_OUTLINE_PROMPTS[style],
+                                            plan=plan, batch=batch)
+
+
+def format_lesson_extras(lesson_data):
+    """Format the lesson's engagement features and standards request, if any"""
+    extras = ""
+    engagement_features = lesson_data.get('engagement_features') or []
+    if engagement_features:
+        extras += f"\n**ENGAGEMENT FEATURES TO INCLUDE:**\n"
+        for feature in engagement_features:
+            extras += f"• {feature}\n"
+    
+    if lesson_data.get('include_standards'):
+        extras += "\n**EDUCATIONAL STANDARDS:**\nAlign the lesson with Common Core or relevant educational standards and mention them explicitly.\n"
+    return extras
+
+
+def assemble_prompt(instructions, style_prompt, specifications):
+    """Lay out a prompt as its static prefix (instructions, style block) followed by the per-request fields"""
+    return f"{instructions}\n\n{style_prompt}\n\n{specifications}"
+
+
+def build_full_prompt(kind, data, style, structured=False):
+    """Combine the instructions for an artifact kind, its teaching-style prompt and the request's fields
+
+    kind is one of 'course', 'lesson' or 'assessment'; style is a key of the
+    matching *_PROMPTS dictionary. structured=True requests a JSON course
+    outline (see utils/course_model.py). Everything before the fields is the
+    same for every request of a kind and style.
+    """
+    if kind == 'course':
+        instructions = COURSE_OUTLINE_JSON_INSTRUCTIONS if structured else COURSE_OUTLINE_INSTRUCTIONS
+        style_prompt = COURSE_OUTLINE_PROMPTS[style]
+        specifications = format_course_outline(data)
+    elif kind == 'lesson':
+        instructions = LESSON_PLAN_INSTRUCTIONS
+        style_prompt = LESSON_PLAN_PROMPTS[style]
+        specifications = format_lesson_plan(data)
+    elif kind == 'assessment':
+        instructions = ASSESSMENT_INSTRUCTIONS
+        style_prompt = ASSESSMENT_PROMPTS[style]
+        specifications = format_assessment(data)
+    else:
+        raise ValueError(f"Unknown artifact kind: {kind}")
+    return assemble_prompt(instructions, style_prompt, specifications)
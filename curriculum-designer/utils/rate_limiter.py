@@ -0,0 +1,216 @@
+import os
+import re
+import threading
+import time
+
+# Starting budgets per model; replaced by the limits reported in response headers
+DEFAULT_RPM = int(os.getenv("OPENAI_RPM_LIMIT", 500))
+DEFAULT_TPM = int(os.getenv("OPENAI_TPM_LIMIT", 90000))
+# AIMD concurrency window bounds
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+MIN_CONCURRENCY = 1
+INITIAL_CONCURRENCY = int(os.getenv("OPENAI_INITIAL_CONCURRENCY", 4))
+# Used when a 429 carries no Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+# Several requests usually hit the same 429 burst; only shrink the window once per burst
+DECREASE_COOLDOWN = 1.0
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_SECONDS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value):
+    """Parse rate-limit reset durations such as '6m0s', '1.5s' or '20ms' into seconds"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def retry_after_from_headers(headers):
+    """Return the server-requested wait in seconds, if any"""
+    if not headers:
+        return None
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return parse_duration(headers.get('retry-after'))
+
+
+class TokenBucket:
+    """Per-minute budget that refills continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.available = min(self.capacity, self.available + elapsed * self.capacity / 60)
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be consumed (0 if it can be now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60 / self.capacity
+
+    def consume(self, amount):
+        self.available -= amount
+
+    def refund(self, amount):
+        self.available = min(self.capacity, self.available + amount)
+
+    def set_capacity(self, per_minute):
+        if per_minute and per_minute > 0:
+            self.capacity = float(per_minute)
+            self.available = min(self.available, self.capacity)
+
+    def sync_remaining(self, remaining):
+        """Trust the server's view of what is left when it is lower than ours"""
+        if remaining is not None:
+            self.available = min(self.available, float(remaining))
+
+
+class ModelRateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets plus an AIMD concurrency window
+
+    Callers block in acquire() until a slot and budget are free instead of
+    failing. A 429 halves the concurrency window and pauses the model for the
+    server's Retry-After; each success grows the window by about one request
+    per window's worth of completions.
+    """
+
+    def __init__(self, model, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = float(min(INITIAL_CONCURRENCY, MAX_CONCURRENCY))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited_count = 0
+        self.total_wait_seconds = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, estimated_tokens):
+        """Block until the request may be sent; returns the seconds spent waiting"""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self.in_flight >= int(self.concurrency):
+                    # Woken by release(); the timeout guards against missed notifications
+                    self._cond.wait(timeout=1.0)
+                    continue
+                wait = max(
+                    self.paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(estimated_tokens, now),
+                )
+                if wait <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(min(estimated_tokens, self.tokens.capacity))
+                    self.in_flight += 1
+                    waited = now - started
+                    self.total_wait_seconds += waited
+                    return waited
+                self._cond.wait(timeout=wait)
+
+    def release(self, estimated_tokens, actual_tokens=None, headers=None,
+                outcome='ok', retry_after=None):
+        """Return the slot, reconcile the token estimate and adapt the window
+
+        outcome is 'ok' (grow the window), 'rate_limited' (shrink it and pause)
+        or 'error' (leave it unchanged).
+        """
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+            if actual_tokens is not None:
+                self.tokens.refund(estimated_tokens - actual_tokens)
+            if headers:
+                self._apply_headers(headers, now)
+
+            if outcome == 'rate_limited':
+                self.rate_limited_count += 1
+                # The request never ran, so its tokens go back to the budget
+                self.tokens.refund(estimated_tokens)
+                if retry_after is None:
+                    retry_after = retry_after_from_headers(headers) or DEFAULT_RETRY_AFTER
+                self.paused_until = max(self.paused_until, now + retry_after)
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self.concurrency = max(MIN_CONCURRENCY, self.concurrency / 2)
+                    self._last_decrease = now
+            elif outcome == 'ok':
+                self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency)
+            self._cond.notify_all()
+
+    def _apply_headers(self, headers, now):
+        def header_float(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        self.requests.set_capacity(header_float('x-ratelimit-limit-requests'))
+        self.tokens.set_capacity(header_float('x-ratelimit-limit-tokens'))
+        remaining_requests = header_float('x-ratelimit-remaining-requests')
+        remaining_tokens = header_float('x-ratelimit-remaining-tokens')
+        self.requests.sync_remaining(remaining_requests)
+        self.tokens.sync_remaining(remaining_tokens)
+
+        # An exhausted budget pauses the model until the server says it resets
+        if remaining_requests == 0:
+            reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+            if reset:
+                self.paused_until = max(self.paused_until, now + reset)
+        if remaining_tokens == 0:
+            reset = parse_duration(headers.get('x-ratelimit-reset-tokens'))
+            if reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+    def snapshot(self):
+        """Return current limiter state for display or telemetry"""
+        with self._cond:
+            return {
+                'model': self.model,
+                'concurrency': round(self.concurrency, 2),
+                'in_flight': self.in_flight,
+                'rpm_capacity': self.requests.capacity,
+                'tpm_capacity': self.tokens.capacity,
+                'rate_limited': self.rate_limited_count,
+                'total_wait_seconds': round(self.total_wait_seconds, 3),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model):
+    """Return the process-wide limiter for a model"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = _limiters[model] = ModelRateLimiter(model)
+        return limiter
+
+
+def estimate_tokens(text):
+    """Rough token estimate (about four characters per token)"""
+    return len(text) // 4 + 1
@@ -0,0 +1,141 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# Single-pass index over generated Markdown. Every pattern below is matched
+# against one line at a time, so indexing is linear in the response length
+# and a response is only ever scanned once (results are memoized by content
+# hash).
+
+INDEX_CACHE_SIZE = 64
+
+HEADING_LINE = re.compile(r'(#{1,6})\s+(.+?)\s*#*\s*$')
+BOLD_LINE = re.compile(r'\*\*(.+?)\*\*:?\s*$')
+# "### Module 3: Title", "**Week 3 - Title**", "2. Module 3: Title"
+MODULE_LINE = re.compile(r'[\s*#>_-]*(?:\d+[.)]\s+)?[\s*_]*(?:Module|Week)\s+(\d+)\b[\s*_]*[:.\-–—]?\s*(.*)', re.IGNORECASE)
+# "10-15 minutes: Warm-up activity"
+TIMED_SEGMENT = re.compile(r'(\d+)[-–]\s*(\d+)?\s*minutes?[:\s]+(.+)', re.IGNORECASE)
+ACTIVITY_KINDS = (
+    ('opening', r'Opening|Hook|Warm-up'),
+    ('instruction', r'Direct Instruction|Lecture'),
+    ('guided', r'Guided Practice'),
+    ('independent', r'Independent Practice'),
+    ('closing', r'Closing|Exit Ticket'),
+)
+ACTIVITY = re.compile(
+    '|'.join(f'(?P<{kind}>(?:{labels})[:\\s]+(?P<{kind}_text>.+))' for kind, labels in ACTIVITY_KINDS),
+    re.IGNORECASE,
+)
+# Bold or plain module lines have no heading level; treat them like ### so # and ## headings close them
+PLAIN_MODULE_LEVEL = 3
+
+
+class SectionIndex:
+    """Headings, modules, timed segments and activity blocks of one response, with character offsets"""
+
+    __slots__ = ('digest', 'length', 'headings', 'modules', 'timeline', 'activities')
+
+    def __init__(self, digest, length, headings, modules, timeline, activities):
+        self.digest = digest
+        self.length = length
+        self.headings = headings
+        self.modules = modules
+        self.timeline = timeline
+        self.activities = activities
+
+    def activities_by_kind(self):
+        """Activity blocks grouped in ACTIVITY_KINDS order"""
+        return [activity for kind, _ in ACTIVITY_KINDS
+                for activity in self.activities if activity['kind'] == kind]
+
+
+def _close_module(text, module, end):
+    module['end'] = end
+    module['content'] = text[module['body_start']:end].strip()
+    del module['body_start']
+
+
+def _build_index(text, digest):
+    headings, modules, timeline, activities = [], [], [], []
+    seen_modules = set()
+    current = None  # module whose span is still open
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        start = offset
+        offset += len(line)
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        level = None
+        heading = HEADING_LINE.match(stripped)
+        if heading:
+            level = len(heading.group(1))
+            headings.append({'level': level, 'title': heading.group(2).strip('* '), 'start': start})
+        else:
+            bold = BOLD_LINE.match(stripped)
+            if bold:
+                headings.append({'level': None, 'title': bold.group(1).strip(), 'start': start})
+
+        module = MODULE_LINE.match(line)
+        if module and int(module.group(1)) not in seen_modules:
+            if current:
+                _close_module(text, current, start)
+            number = int(module.group(1))
+            seen_modules.add(number)
+            title = module.group(2).strip().strip(' *#:-_')
+            body_start = start + module.end(2) if title else start + len(line.rstrip('\r\n'))
+            current = {
+                'number': number,
+                'title': title,
+                'level': level or PLAIN_MODULE_LEVEL,
+                'start': start,
+                'body_start': body_start,
+            }
+            modules.append(current)
+            continue
+        if current and level is not None and level < current['level']:
+            # A parent heading ("## Assessment Methods") ends the module
+            _close_module(text, current, start)
+            current = None
+
+        segment = TIMED_SEGMENT.search(line)
+        if segment:
+            timeline.append({
+                'start_minute': int(segment.group(1)),
+                'end_minute': int(segment.group(2)) if segment.group(2) else None,
+                'activity': segment.group(3).strip(),
+                'start': start + segment.start(),
+            })
+        for match in ACTIVITY.finditer(line):
+            kind = match.lastgroup[:-5] if match.lastgroup.endswith('_text') else match.lastgroup
+            activities.append({
+                'kind': kind,
+                'text': match.group(f'{kind}_text').strip(' *_'),
+                'start': start + match.start(),
+            })
+
+    if current:
+        _close_module(text, current, len(text))
+    return SectionIndex(digest, len(text), headings, modules, timeline, activities)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def index_sections(text):
+    """Return the SectionIndex for text, building it at most once per distinct content"""
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+    with _cache_lock:
+        index = _cache.get(digest)
+        if index is not None:
+            _cache.move_to_end(digest)
+            return index
+    index = _build_index(text, digest)
+    with _cache_lock:
+        _cache[digest] = index
+        while len(_cache) > INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
@@ -0,0 +1,154 @@
+import threading
+
+# Coalesces concurrent identical upstream calls. The first caller for a key
+# starts the call; everyone who asks for the same key while it is in flight
+# attaches to it and receives the same result (or the same stream of deltas).
+# Finished flights are forgotten immediately: repeats after that are the
+# response cache's job.
+
+# Marks a flight whose leader was interrupted before func() returned (e.g. a
+# Streamlit rerun raising in the leader's script thread); followers start over
+_INTERRUPTED = object()
+
+
+class _Flight:
+    """One in-flight call: the items produced so far and how it ended"""
+
+    __slots__ = ('condition', 'items', 'done', 'error', 'context', 'subscribers')
+
+    def __init__(self, context):
+        self.condition = threading.Condition()
+        self.items = []
+        self.done = False
+        self.error = None
+        self.context = context
+        self.subscribers = 1
+
+
+class SingleFlight:
+    """Process-wide registry of in-flight calls keyed on the normalized request"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+
+    def _join(self, key, context):
+        """Return (flight, leader); leader is True if this caller must start the call"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.subscribers += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight(context)
+            self.started += 1
+            return flight, True
+
+    def _finish(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.condition:
+            flight.done = True
+            flight.error = error
+            flight.condition.notify_all()
+
+    def do(self, key, func, context=None):
+        """Call func() once for all concurrent callers with the same key
+
+        Returns (result, context, shared): context is the leader's context
+        object (e.g. its stats record, complete once the call returns) and
+        shared is True for callers that attached to another caller's call.
+        Errors raised by func() are re-raised in every caller. If the leader
+        is interrupted by anything else, the flight is still released and its
+        followers retry, one of them becoming the new leader.
+        """
+        while True:
+            flight, leader = self._join(key, context)
+            if leader:
+                error = _INTERRUPTED
+                try:
+                    result = func()
+                    flight.items.append(result)
+                    error = None
+                    return result, flight.context, False
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    self._finish(key, flight, error)
+
+            with flight.condition:
+                while not flight.done:
+                    flight.condition.wait()
+            if flight.error is _INTERRUPTED:
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.items[0], flight.context, True
+
+    def _pump(self, key, flight, start, on_finish, stopped_error):
+        error = _INTERRUPTED
+        try:
+            for item in start():
+                with flight.condition:
+                    flight.items.append(item)
+                    flight.condition.notify_all()
+            error = None
+        except Exception as e:
+            error = e
+        finally:
+            if error is _INTERRUPTED:
+                error = stopped_error("The upstream stream stopped unexpectedly")
+            try:
+                if on_finish is not None:
+                    on_finish(list(flight.items), error)
+            finally:
+                self._finish(key, flight, error)
+
+    def stream(self, key, start, context=None, on_finish=None, stopped_error=RuntimeError):
+        """Yield the items of start()'s iterator, sharing one run among concurrent callers
+
+        start() is only called for the first caller, on a background thread,
+        so the upstream call runs to completion even if a subscriber stops
+        reading (a closed tab or a rerun). on_finish(items, error) runs on
+        that thread once the call ends, so results are kept (cached,
+        recorded) even when nobody reads to the end. Late subscribers first
+        replay what has already arrived. The generator returns
+        (context, shared) like do(). If the upstream iterator stops without
+        finishing or raising an Exception, subscribers get
+        stopped_error(message) instead.
+        """
+        flight, leader = self._join(key, context)
+        if leader:
+            threading.Thread(target=self._pump, args=(key, flight, start, on_finish, stopped_error),
+                             daemon=True).start()
+
+        index = 0
+        while True:
+            with flight.condition:
+                while index == len(flight.items) and not flight.done:
+                    flight.condition.wait()
+                items = flight.items[index:]
+                done = flight.done
+            index += len(items)
+            yield from items
+            if done:
+                break
+        if flight.error is not None:
+            raise flight.error
+        return flight.context, not leader
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """Return the process-wide single-flight registry"""
+    return _single_flight
@@ -0,0 +1,119 @@
+import time
+import streamlit as st
+from utils.profiling import profile_section
+
+# Default flush thresholds: whichever is reached first triggers a render
+DEFAULT_FLUSH_INTERVAL = 0.25  # seconds
+DEFAULT_FLUSH_BYTES = 512
+
+
+class StreamRenderer:
+    """Throttled, append-only renderer for streamed markdown
+
+    Chunks are buffered and only flushed every `flush_interval` seconds or
+    `flush_bytes` characters. Completed paragraphs are written once into their
+    own element and never re-sent; only the unfinished tail is re-rendered on
+    each flush, so a long response costs a few dozen small updates instead of
+    one full re-render per token.
+
+    wrapper_html is an (opening, closing) pair of HTML strings, for output
+    that the page finally shows inside styled markup such as an
+    outline-container div. Markup cannot span several elements, so the
+    text is then rendered whole between the pair into a single element on
+    each flush, still throttled, and looks the same as the final render.
+    """
+
+    def __init__(self, container=None, header_html=None, wrapper_html=None,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, flush_bytes=DEFAULT_FLUSH_BYTES):
+        self.container = container if container is not None else st.container()
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.wrapper_html = wrapper_html
+        self.render_calls = 0
+        self.chunks = 0
+        self._parts = []
+        self._text = ""
+        self._committed = 0  # characters already rendered as permanent blocks
+        self._pending = 0  # characters received since the last flush
+        self._last_flush = time.monotonic()
+
+        if header_html:
+            self.container.markdown(header_html, unsafe_allow_html=True)
+            self.render_calls += 1
+        self._tail = self.container.empty()
+        if wrapper_html:
+            self._render_wrapped("")
+
+    @property
+    def text(self):
+        """Full text received so far"""
+        if self._parts:
+            self._text += "".join(self._parts)
+            self._parts = []
+        return self._text
+
+    def write(self, chunk):
+        """Buffer a chunk and flush if a threshold has been reached"""
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self._pending += len(chunk)
+        self.chunks += 1
+        if (self._pending >= self.flush_bytes
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Render buffered text: commit finished paragraphs, refresh the tail"""
+        text = self.text
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+        with profile_section("render", characters=len(text) - self._committed):
+            if self.wrapper_html:
+                self._render_wrapped(text)
+                return
+
+            split_at = self._commit_point(text)
+            if split_at > self._committed:
+                # The current tail element becomes a permanent block
+                self._tail.markdown(text[self._committed:split_at])
+                self.render_calls += 1
+                self._tail = self.container.empty()
+                self._committed = split_at
+
+            tail = text[self._committed:]
+            if tail.strip():
+                self._tail.markdown(tail)
+                self.render_calls += 1
+
+    def close(self):
+        """Flush whatever is left and return the full text"""
+        self.flush()
+        return self.text
+
+    def stats(self):
+        """Return render counters for display or telemetry"""
+        return {
+            'chunks': self.chunks,
+            'characters': len(self.text),
+            'render_calls': self.render_calls,
+        }
+
+    def _render_wrapped(self, text):
+        opening, closing = self.wrapper_html
+        self._tail.markdown(f"{opening}{text}{closing}", unsafe_allow_html=True)
+        self.render_calls += 1
+
+    def _commit_point(self, text):
+        """Offset just past the last paragraph break that is safe to commit
+
+        A break inside an open ``` code fence would split the fence across
+        elements, so those breaks are skipped.
+        """
+        split_at = text.rfind("\n\n", self._committed)
+        while split_at > self._committed:
+            if text.count("```", 0, split_at) % 2 == 0:
+                return split_at + 2
+            split_at = text.rfind("\n\n", self._committed, split_at)
+        return self._committed
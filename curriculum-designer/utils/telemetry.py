@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from utils.metrics import observe_call
+
+# Append-only record of every LLM call: one JSON object per line with the
+# model, token counts, timings, retries, cache outcome, error and the page
+# and artifact kind it was made for. The generation core writes it; the Ops
+# Dashboard page reads it back, and each event also updates the Prometheus
+# metrics in utils/metrics.py. Once the file passes TELEMETRY_MAX_BYTES it is
+# rotated to <path>.1, so at most two files' worth of events is kept.
+
+# Set TELEMETRY_PATH="" to keep events in memory only (lost on restart)
+TELEMETRY_PATH = os.getenv("TELEMETRY_PATH", os.path.join(tempfile.gettempdir(), "curriculum-designer-telemetry.jsonl"))
+# Events kept in memory when there is no file
+TELEMETRY_MEMORY_EVENTS = int(os.getenv("TELEMETRY_MEMORY_EVENTS", 10000))
+# Size at which the file is rotated, replacing the previous rotation; 0 keeps one ever-growing file
+TELEMETRY_MAX_BYTES = int(os.getenv("TELEMETRY_MAX_BYTES", 16 * 1024 * 1024))
+EVENT_FIELDS = ('model', 'prompt_tokens', 'cached_tokens', 'completion_tokens', 'ttft_ms', 'latency_ms',
+                'tokens_per_sec', 'retries', 'rate_limited', 'rate_limit_wait_ms', 'continuations', 'finish_reason')
+
+
+class TelemetryStore:
+    """Thread-safe append-only event log, in a JSON Lines file or in memory"""
+
+    def __init__(self, path=TELEMETRY_PATH, memory_events=TELEMETRY_MEMORY_EVENTS, max_bytes=TELEMETRY_MAX_BYTES):
+        self.path = path or None
+        self.max_bytes = max_bytes
+        self._events = deque(maxlen=memory_events)
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def append(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            if not self.path:
+                self._events.append(event)
+                return
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+                    size = f.tell()
+                if self.max_bytes and size >= self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+            except OSError:
+                # Telemetry must never fail a generation
+                pass
+
+    def read(self, since=None):
+        """All recorded events, oldest first; since is a Unix timestamp lower bound"""
+        if not self.path:
+            with self._lock:
+                events = list(self._events)
+        else:
+            events = []
+            for path in (f"{self.path}.1", self.path):
+                try:
+                    # A file last written before since holds nothing newer, so it is not parsed
+                    if since is not None and os.path.getmtime(path) < since:
+                        continue
+                    with open(path, encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                events.append(json.loads(line))
+                            except ValueError:
+                                continue  # a line cut short by a crash
+                except OSError:
+                    continue  # not rotated yet, or not written yet
+        if since is not None:
+            events = [event for event in events if event.get('ts', 0) >= since]
+        return events
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_telemetry_store():
+    """Return the process-wide telemetry store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TelemetryStore()
+    return _store
+
+
+def record_call(stats, cache_status, labels=None, error=None, streaming=False):
+    """Append one call's stats to the telemetry store and the /metrics counters
+
+    cache_status is 'hit', 'miss' or 'shared'; labels carries the 'page' and
+    'kind' the call was made for. Cache hits and shared calls made no request
+    of their own, so their token counts and timings are left empty.
+    """
+    labels = labels or {}
+    event = {
+        'ts': round(time.time(), 3),
+        'page': labels.get('page') or 'script',
+        'kind': labels.get('kind') or 'other',
+        'cache': cache_status,
+        'streaming': streaming,
+        'error': str(error) if error is not None else None,
+    }
+    upstream = cache_status == 'miss'
+    event.update({field: stats.get(field) if upstream or field == 'model' else None for field in EVENT_FIELDS})
+    get_telemetry_store().append(event)
+    observe_call(event)
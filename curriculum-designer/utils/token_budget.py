@@ -0,0 +1,197 @@
+import math
+import os
+from utils.generation import SYSTEM_MESSAGE
+from utils.prompt_templates import registered_templates
+from utils.prompts import PROMPT_KINDS
+from utils.rate_limiter import estimate_tokens
+
+# Context window and output cap per model; unknown models get the defaults
+MODEL_CONTEXT_WINDOWS = {
+    'gpt-3.5-turbo': 16385,
+    'gpt-4': 8192,
+    'gpt-4-turbo-preview': 128000,
+}
+MODEL_MAX_OUTPUT_TOKENS = {
+    'gpt-3.5-turbo': 4096,
+    'gpt-4': 8192,
+    'gpt-4-turbo-preview': 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+
+# Reserve this much more than the estimate so normal variation is not cut off
+OUTPUT_HEADROOM = 1.25
+MIN_MAX_TOKENS = 256
+# Role and formatting tokens added around each chat message
+MESSAGE_OVERHEAD_TOKENS = 8
+
+# Rough output sizes, measured on typical responses to the prompts in prompts.py
+COURSE_FIXED_TOKENS = 900
+TOKENS_PER_MODULE = 170
+MODULES_PER_UNIT = {'weeks': 1, 'days': 1, 'months': 4, 'sessions': 1}
+LESSON_FIXED_TOKENS = 1100
+TOKENS_PER_LESSON_SEGMENT = 60  # per 15 minutes of class time
+TOKENS_PER_ENGAGEMENT_FEATURE = 80
+STANDARDS_TOKENS = 200
+ASSESSMENT_FIXED_TOKENS = 400
+TOKENS_PER_QUESTION = 110
+TOKENS_PER_ESSAY = 250
+ANSWER_KEY_FIXED_TOKENS = 200
+TOKENS_PER_ANSWER = 90
+RUBRIC_FIXED_TOKENS = 700
+RUBRIC_TOKENS_PER_QUESTION = 20
+QUESTION_TOKENS = 250
+SKELETON_TOKENS_PER_MODULE = 45
+EXPANSION_TOKENS_PER_MODULE = 220
+
+
+def heuristic_token_count(text):
+    """Offline estimate used when no tokenizer is configured"""
+    return estimate_tokens(text)
+
+
+def tiktoken_token_count(model="gpt-3.5-turbo"):
+    """Exact counter backed by tiktoken (raises ImportError if it is not installed)"""
+    import tiktoken
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text))
+
+
+def _default_token_counter():
+    if os.getenv("TOKEN_COUNTER", "heuristic") == "tiktoken":
+        try:
+            return tiktoken_token_count()
+        except ImportError:
+            pass
+    return heuristic_token_count
+
+
+_token_counter = _default_token_counter()
+
+
+def set_token_counter(counter):
+    """Replace the function used to count prompt tokens (text -> int)"""
+    global _token_counter
+    _token_counter = counter or heuristic_token_count
+
+
+def count_tokens(text):
+    return _token_counter(text)
+
+
+def _as_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def module_count(spec):
+    """Number of modules a course spec asks for"""
+    units = MODULES_PER_UNIT.get(spec.get('duration_unit', 'weeks'), 1)
+    return max(1, _as_int(spec.get('duration'), 8) * units)
+
+
+def _course_tokens(spec):
+    return COURSE_FIXED_TOKENS + TOKENS_PER_MODULE * module_count(spec)
+
+
+def _skeleton_tokens(spec):
+    return COURSE_FIXED_TOKENS + SKELETON_TOKENS_PER_MODULE * module_count(spec)
+
+
+def _expansion_tokens(spec):
+    return EXPANSION_TOKENS_PER_MODULE * max(1, _as_int(spec.get('modules'), 1))
+
+
+def _lesson_tokens(spec):
+    segments = math.ceil(max(15, _as_int(spec.get('duration'), 60)) / 15)
+    features = len(spec.get('engagement_features') or [])
+    return (LESSON_FIXED_TOKENS + TOKENS_PER_LESSON_SEGMENT * segments
+            + TOKENS_PER_ENGAGEMENT_FEATURE * features
+            + (STANDARDS_TOKENS if spec.get('include_standards') else 0))
+
+
+def _assessment_tokens(spec):
+    return (ASSESSMENT_FIXED_TOKENS + TOKENS_PER_QUESTION * max(1, _as_int(spec.get('num_questions'), 10))
+            + TOKENS_PER_ESSAY * max(0, _as_int(spec.get('num_essay'), 1)))
+
+
+def _answer_key_tokens(spec):
+    return ANSWER_KEY_FIXED_TOKENS + TOKENS_PER_ANSWER * max(1, _as_int(spec.get('num_questions'), 10))
+
+
+def _rubric_tokens(spec):
+    return RUBRIC_FIXED_TOKENS + RUBRIC_TOKENS_PER_QUESTION * max(1, _as_int(spec.get('num_questions'), 10))
+
+
+OUTPUT_ESTIMATORS = {
+    'course': _course_tokens,
+    'lesson': _lesson_tokens,
+    'assessment': _assessment_tokens,
+    'answer_key': _answer_key_tokens,
+    'rubric': _rubric_tokens,
+    # Assessment, answer key and rubric in one response
+    'assessment_bundle': lambda spec: _assessment_tokens(spec) + _answer_key_tokens(spec) + _rubric_tokens(spec),
+    'question': lambda spec: QUESTION_TOKENS,
+    'skeleton': _skeleton_tokens,
+    'expansion': _expansion_tokens,
+}
+
+
+def estimate_output_tokens(kind, spec):
+    """Expected completion size for an artifact kind and its spec fields"""
+    return OUTPUT_ESTIMATORS[kind](spec or {})
+
+
+def plan_tokens(kind, spec, prompt, model="gpt-3.5-turbo", system_message=SYSTEM_MESSAGE):
+    """Size max_tokens for one request and check that the expected output fits
+
+    Returns a dict with prompt_tokens, expected_tokens, available_tokens,
+    max_tokens, fits and, when it does not fit, a warning message.
+    """
+    prompt_tokens = count_tokens(system_message) + count_tokens(prompt) + 2 * MESSAGE_OVERHEAD_TOKENS
+    expected_tokens = estimate_output_tokens(kind, spec)
+    context_window = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    available_tokens = max(0, min(MODEL_MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS),
+                                  context_window - prompt_tokens))
+    wanted = math.ceil(expected_tokens * OUTPUT_HEADROOM)
+    max_tokens = max(1, min(available_tokens, max(MIN_MAX_TOKENS, wanted)))
+
+    warning = None
+    if available_tokens < MIN_MAX_TOKENS:
+        warning = (f"The prompt uses about {prompt_tokens:,} of {model}'s {context_window:,}-token context, "
+                   f"leaving no room for a response. Shorten the inputs or choose a larger model.")
+    elif expected_tokens > available_tokens:
+        warning = (f"This {kind.replace('_', ' ')} needs about {expected_tokens:,} output tokens but {model} "
+                   f"can return at most {available_tokens:,}, so the response will likely be cut off. "
+                   f"Reduce its size or choose a larger model.")
+    return {
+        'prompt_tokens': prompt_tokens,
+        'expected_tokens': expected_tokens,
+        'available_tokens': available_tokens,
+        'max_tokens': max_tokens,
+        'fits': warning is None,
+        'warning': warning,
+    }
+
+
+def template_token_counts():
+    """Tokens in each registered prompt template, as compiled and as written in the source"""
+    return {name: {'tokens': count_tokens(template.text), 'source_tokens': count_tokens(template.source)}
+            for name, template in registered_templates().items()}
+
+
+def prefix_token_counts(system_message=SYSTEM_MESSAGE):
+    """Tokens in the static prefix of each (kind, style): system message, instructions and style block
+
+    This is the part of every prompt for that combination that a provider-side
+    prompt cache can reuse.
+    """
+    fixed = count_tokens(system_message) + 2 * MESSAGE_OVERHEAD_TOKENS
+    return {(kind, style): fixed + count_tokens(instructions) + count_tokens(style_prompt)
+            for kind, (instructions, style_prompts) in PROMPT_KINDS.items()
+            for style, style_prompt in style_prompts.items()}